@@ -1,10 +1,17 @@
+from contextlib import asynccontextmanager
+
 from agents import Agent, Runner, InputGuardrail, GuardrailFunctionOutput, InputGuardrailTripwireTriggered
+from agents.models import get_default_model
 from dotenv import load_dotenv
 from fastapi import FastAPI, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
 import uvicorn
 
+from llm.openai_client import AgentModel, close_openai_client, open_openai_client
+from llm.run_context import HooksContext, nested_run_kwargs
+from webhook.metrics import MetricsRunHooks, registry, span
+
 
 load_dotenv(override=True)
 
@@ -12,10 +19,25 @@ load_dotenv(override=True)
 # API
 # ---------------------------------------------------------------------------
 
+llm_hooks = MetricsRunHooks()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared OpenAI client at startup; close its connection pool on shutdown."""
+    try:
+        open_openai_client()
+    except Exception as e:
+        print(f"OpenAI client init failed: {e}")
+    yield
+    await close_openai_client()
+
+
 app = FastAPI(
     title="Visitor Registration API",
     description="Accepts a message, validates visitor intent and required fields, returns structured visitor data or user-friendly errors.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -66,7 +88,7 @@ async def VisitorInputGuardrails(ctx,agent,input_data):
     # print(ctx,"context")
     # print(input_data,"Input Data")
     # print(agent,"agent")
-    runner = await Runner.run(input_guardrail_agent,input_data, context = ctx.context)
+    runner = await Runner.run(input_guardrail_agent, input_data, **nested_run_kwargs(ctx))
     final_output = runner.final_output_as(VisitorGuardrailsOutputFormat)
     print(final_output,"final_output")
     block = not final_output.is_visitor_entry or len(final_output.missing_required_fields) > 0
@@ -135,13 +157,14 @@ input_guardrail_agent = Agent(
     name="Visitor input guardrail — validates visitor intent and required fields",
     instructions=GuardrailInstruction,
     output_type=VisitorGuardrailsOutputFormat,
+    model=AgentModel("visitor_guardrail", get_default_model()),
 )
 
 visitor_agent = Agent(
     name="Visitor registration extractor — maps messages to VisitorChatOutputFormat",
     instructions=Instruction,
     output_type=VisitorChatOutputFormat,
-    model="gpt-4o-mini",
+    model=AgentModel("visitor", "gpt-4o-mini"),
     input_guardrails=[
         InputGuardrail(guardrail_function=VisitorInputGuardrails)
     ]
@@ -159,6 +182,12 @@ async def get_health():
     return health_check()
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of agent latency and token metrics."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post(
     "/visit",
     response_model=None,
@@ -186,7 +215,8 @@ async def process_visitor(payload: VisitorRequest):
     - **422**: Input is about visiting but missing required fields → user-friendly message + list of missing fields.
     """
     try:
-        runner = await Runner.run(visitor_agent, payload.message)
+        with span("visitor_agent"):
+            runner = await Runner.run(visitor_agent, payload.message, context=HooksContext(llm_hooks), hooks=llm_hooks)
         result = runner.final_output_as(VisitorChatOutputFormat)
         return VisitorSuccessResponse(
             name=result.name,
@@ -0,0 +1 @@
+"""Load-test and benchmark harness for the webhook pipeline (fake LLM, fake Graph API, in-memory store)."""
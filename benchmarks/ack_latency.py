@@ -0,0 +1,142 @@
+"""
+Webhook ACK latency with and without background writes to a slow database.
+
+Runs main.app in-process on the benchmark fakes with MemoryStore(latency=--db-latency), then measures ACK latency
+of --probes probe payloads twice: on an idle app, and again right after --writers background messages were posted,
+while their replies and turns are still being written to the slow store. ACK latency should stay flat: the
+webhook handler only verifies and enqueues, and every store call is awaited off the request path. Reports ACK
+p50 / p95 / p99 for both phases, the loaded / idle p99 ratio, and how much background work overlapped the probes
+(store calls made and background messages still unfinished when the last probe was answered).
+
+    python -m benchmarks.ack_latency
+    python -m benchmarks.ack_latency --db-latency 0.5 --writers 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+from benchmarks.webhook_load import message_ids, summarize, synthetic_payloads
+
+
+# Phase -> sender number prefix, so no two phases share message ids or conversations.
+SENDER_PREFIXES = {"warmup": "9500000", "idle": "9200000", "writer": "9300000", "loaded": "9400000"}
+
+
+def payload_batch(count: int, phase: str) -> list[dict]:
+    """synthetic_payloads with one sender per message, renumbered for phase."""
+    payloads = synthetic_payloads(count, count)
+    for payload in payloads:
+        value = payload["entry"][0]["changes"][0]["value"]
+        message = value["messages"][0]
+        message["id"] = message["id"].replace("wamid.bench", f"wamid.{phase}")
+        message["from"] = message["from"].replace("9100000", SENDER_PREFIXES[phase], 1)
+        value["contacts"][0]["wa_id"] = message["from"]
+    return payloads
+
+
+async def run(args) -> dict:
+    import httpx
+
+    import main
+    from llm.openai_client import set_model_provider
+    from webhook.graph_api import GraphClient, set_graph_client
+    from webhook.storage import MemoryStore, set_store
+
+    from benchmarks.fakes import FakeGraphAPI, FakeModel
+
+    model = FakeModel(latency=args.llm_latency)
+    set_model_provider(lambda agent_key, model_name: model)
+    set_graph_client(GraphClient("bench", transport=FakeGraphAPI(latency=args.graph_latency).transport()))
+    store = MemoryStore(latency=args.db_latency)
+    set_store(store)
+
+    done: set[str] = set()
+    process_messages = main.process_messages
+
+    async def tracked_process_messages(msgs, **kwargs):
+        try:
+            return await process_messages(msgs, **kwargs)
+        finally:
+            done.update(msg.id for msg in msgs)
+
+    main.process_messages = tracked_process_messages
+    transport = httpx.ASGITransport(app=main.app)
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with main.lifespan(main.app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def post(payload: dict) -> float:
+                started = time.perf_counter()
+                response = await client.post("/", json=payload)
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+            async def probe(prefix: str) -> list[float]:
+                acks = []
+                for payload in payload_batch(args.probes, prefix):
+                    acks.append(await post(payload))
+                    await asyncio.sleep(args.probe_interval)
+                return acks
+
+            async def drain(ids: set[str]) -> None:
+                while not ids <= done:
+                    await asyncio.sleep(0.05)
+
+            warmup = payload_batch(10, "warmup")  # first-request setup stays out of the idle numbers
+            await asyncio.gather(*(post(p) for p in warmup))
+            idle = await probe("idle")
+            await drain({mid for p in warmup + payload_batch(args.probes, "idle") for mid in message_ids(p)})
+
+            background = payload_batch(args.writers, "writer")
+            await asyncio.gather(*(post(p) for p in background))
+            calls = store.calls
+            loaded = await probe("loaded")
+            overlap_calls = store.calls - calls
+            writer_ids = {mid for p in background for mid in message_ids(p)}
+            unfinished = len(writer_ids - done)
+            await drain(writer_ids)
+    main.process_messages = process_messages
+
+    report = {
+        "db_latency": args.db_latency,
+        "writers": args.writers,
+        "probes": args.probes,
+        "idle": summarize("ack", idle),
+        "loaded": summarize("ack", loaded),
+        "store_calls_during_probes": overlap_calls,
+        "writers_unfinished_after_probes": unfinished,
+    }
+    idle_p99 = report["idle"]["ack_p99_ms"]
+    report["p99_ratio"] = round(report["loaded"]["ack_p99_ms"] / idle_p99, 2) if idle_p99 else None
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=100, help="background messages posted before the probes")
+    parser.add_argument("--probes", type=int, default=200, help="probe payloads per phase")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="seconds between probes")
+    parser.add_argument("--db-latency", type=float, default=0.2, help="seconds per store call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake model time per call (s)")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="fake Graph API latency (s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ["REDIS_URL"] = ""
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["WEBHOOK_SIGNATURE_OPTIONAL"] = "1"
+    os.environ["WHATSAPP_APP_SECRET"] = ""
+    os.environ["JOB_BACKEND"] = "memory"
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
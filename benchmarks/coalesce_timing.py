@@ -0,0 +1,86 @@
+"""
+Deterministic timing check for the message coalescer (webhook.coalesce) on a fake clock: no sleeps, no event loop.
+
+Each scenario adds messages at given times and records when each batch is flushed and what it contains; the
+window reset, the max-wait cap, the max-messages cap and per-conversation isolation must hold exactly.
+
+    python -m benchmarks.coalesce_timing          # print scenarios; exit 1 on any mismatch
+"""
+import sys
+
+from webhook.coalesce import Coalescer
+
+WINDOW = 1.0
+MAX_WAIT = 3.0
+MAX_MESSAGES = 5
+STEP = 0.05
+
+# name -> (arrivals [(time, conversation, text)], expected flushes [(time, conversation, texts)])
+SCENARIOS = {
+    "single message flushes one window later": (
+        [(0.0, "a", "hi")],
+        [(1.0, "a", ["hi"])],
+    ),
+    "each message resets the window": (
+        [(0.0, "a", "spent 200"), (0.6, "a", "on bus"), (1.2, "a", "yesterday")],
+        [(2.2, "a", ["spent 200", "on bus", "yesterday"])],
+    ),
+    "gap longer than the window starts a new batch": (
+        [(0.0, "a", "200 for bus"), (1.5, "a", "450 dinner")],
+        [(1.0, "a", ["200 for bus"]), (2.5, "a", ["450 dinner"])],
+    ),
+    "max wait caps a steady trickle": (
+        [(0.0, "a", "1"), (0.8, "a", "2"), (1.6, "a", "3"), (2.4, "a", "4"), (3.2, "a", "5")],
+        [(3.0, "a", ["1", "2", "3", "4"]), (4.2, "a", ["5"])],
+    ),
+    "max messages flushes immediately": (
+        [(0.0, "a", "1"), (0.1, "a", "2"), (0.2, "a", "3"), (0.3, "a", "4"), (0.4, "a", "5"), (0.5, "a", "6")],
+        [(0.4, "a", ["1", "2", "3", "4", "5"]), (1.5, "a", ["6"])],
+    ),
+    "conversations are independent": (
+        [(0.0, "a", "a1"), (0.5, "b", "b1"), (0.8, "a", "a2"), (1.2, "b", "b2")],
+        [(1.8, "a", ["a1", "a2"]), (2.2, "b", ["b1", "b2"])],
+    ),
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def simulate(arrivals: list[tuple[float, str, str]]) -> list[tuple[float, str, list[str]]]:
+    """Replay arrivals on a fake clock, calling flush_due every STEP seconds like the background task would."""
+    clock = FakeClock()
+    flushed = []
+    coalescer = Coalescer(
+        lambda key, items: flushed.append((round(clock.now, 2), key, items)),
+        window=WINDOW, max_wait=MAX_WAIT, max_messages=MAX_MESSAGES, clock=clock,
+    )
+    pending = sorted(arrivals)
+    tick = 0
+    while pending or coalescer.pending:
+        clock.now = round(tick * STEP, 2)
+        while pending and pending[0][0] <= clock.now:
+            _, key, text = pending.pop(0)
+            coalescer.add(key, text)
+        coalescer.flush_due()
+        tick += 1
+    return flushed
+
+
+def main() -> int:
+    failures = 0
+    for name, (arrivals, expected) in SCENARIOS.items():
+        got = simulate(arrivals)
+        ok = got == expected
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {got}" + ("" if ok else f" (expected {expected})"))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
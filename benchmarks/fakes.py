@@ -0,0 +1,237 @@
+"""
+Fakes for benchmarks: an OpenAI-compatible Model with configurable latency and output size, and a Graph API transport.
+Nothing here touches the network; outputs are shaped like the real ones so the agent graph and reply path run unchanged.
+Install the model for every agent with llm.openai_client.set_model_provider(lambda key, name: model).
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from datetime import date
+
+import httpx
+import openai
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+
+EXPENSE_TEXT = re.compile(r"\d")
+
+
+def _last_user_text(input) -> str:
+    if isinstance(input, str):
+        return input
+    for item in reversed(input):
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def _sample(schema: dict, defs: dict, name: str = "", flag: bool = True):
+    """Smallest value that satisfies a (strict) JSON schema; enough for the app's output types. Booleans are flag."""
+    if "$ref" in schema:
+        return _sample(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, name, flag)
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _sample(sub, defs, key, flag) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_sample(schema.get("items", {}), defs, name, flag)]
+    if kind == "boolean":
+        return flag
+    if kind in ("number", "integer"):
+        return 120
+    if name == "date":
+        return date.today().isoformat()
+    return "food"
+
+
+class FakeModel(Model):
+    """
+    Deterministic stand-in for the OpenAI Responses model.
+    Latency is time to first token plus token_interval per output token. Routers hand off (expense-looking text
+    goes to the agent whose name mentions "expense"), structured agents return schema-valid JSON, others return
+    output_tokens words of text.
+    Faults: a rate_limit_rate fraction of calls raise openai.RateLimitError (429) after the latency; a spike_rate
+    fraction take spike_latency instead of latency. With capacity > 0, calls beyond capacity concurrent ones are
+    rejected with a 429, like a provider's rate limit. Seeded, so runs are repeatable.
+    off_topic=True plays an out-of-scope message: routers answer instead of handing off and structured boolean
+    fields (guardrail / router verdicts) are false.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.4,
+        token_interval: float = 0.0,
+        output_tokens: int = 24,
+        rate_limit_rate: float = 0.0,
+        spike_rate: float = 0.0,
+        spike_latency: float = 10.0,
+        capacity: int = 0,
+        seed: int = 7,
+        off_topic: bool = False,
+    ):
+        self.latency = latency
+        self.token_interval = token_interval
+        self.output_tokens = output_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.capacity = capacity
+        self.off_topic = off_topic
+        self.in_flight = 0
+        self.random = random.Random(seed)
+        self.ids = itertools.count()
+        self.calls = 0
+        self.rate_limited = 0
+        self.input_tokens = 0
+        self.output_tokens_total = 0
+
+    def _rate_limit_error(self) -> openai.RateLimitError:
+        self.rate_limited += 1
+        response = httpx.Response(429, request=httpx.Request("POST", "https://fake/v1/responses"))
+        return openai.RateLimitError("Rate limit reached (fake)", response=response, body=None)
+
+    async def _wait_and_maybe_fail(self) -> None:
+        if self.capacity and self.in_flight >= self.capacity:
+            await asyncio.sleep(0.01)
+            raise self._rate_limit_error()
+        spike = self.random.random() < self.spike_rate
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.spike_latency if spike else self.latency)
+        finally:
+            self.in_flight -= 1
+        if self.random.random() < self.rate_limit_rate:
+            raise self._rate_limit_error()
+
+    def _output(self, system_instructions, input, output_schema, handoffs) -> tuple[list, str]:
+        n = next(self.ids)
+        text = _last_user_text(input)
+        if handoffs and not self.off_topic:
+            wanted = "expense" if EXPENSE_TEXT.search(text) else ""
+            target = next((h for h in handoffs if wanted in h.agent_name.lower()), handoffs[0])
+            call = ResponseFunctionToolCall(
+                id=f"fc_{n}", call_id=f"call_{n}", name=target.tool_name, arguments="{}",
+                type="function_call", status="completed",
+            )
+            return [call], ""
+        if output_schema is not None and not output_schema.is_plain_text():
+            schema = output_schema.json_schema()
+            body = json.dumps(_sample(schema, schema.get("$defs", {}), flag=not self.off_topic))
+        else:
+            body = " ".join(["ok"] * self.output_tokens)
+        message = ResponseOutputMessage(
+            id=f"msg_{n}", role="assistant", status="completed", type="message",
+            content=[ResponseOutputText(text=body, type="output_text", annotations=[])],
+        )
+        return [message], body
+
+    def _usage(self, system_instructions, input, body: str) -> Usage:
+        input_tokens = (len(system_instructions or "") + len(json.dumps(input, default=str))) // 4
+        output_tokens = max(1, len(body) // 4)
+        self.calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens_total += output_tokens
+        return Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                     total_tokens=input_tokens + output_tokens)
+
+    async def get_response(
+        self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs
+    ) -> ModelResponse:
+        output, body = self._output(system_instructions, input, output_schema, handoffs)
+        usage = self._usage(system_instructions, input, body)
+        await self._wait_and_maybe_fail()
+        await asyncio.sleep(self.token_interval * usage.output_tokens)
+        return ModelResponse(output=output, usage=usage, response_id=None)
+
+    async def stream_response(
+        self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs
+    ):
+        output, body = self._output(system_instructions, input, output_schema, handoffs)
+        usage = self._usage(system_instructions, input, body)
+        await self._wait_and_maybe_fail()
+        seq = itertools.count()
+        if body and isinstance(output[0], ResponseOutputMessage):
+            words = body.split(" ")
+            for i in range(0, len(words), 4):
+                await asyncio.sleep(self.token_interval * 4)
+                yield ResponseTextDeltaEvent(
+                    type="response.output_text.delta", item_id=output[0].id, output_index=0, content_index=0,
+                    delta=" ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else ""),
+                    logprobs=[], sequence_number=next(seq),
+                )
+        response = Response(
+            id=f"resp_{next(self.ids)}", created_at=time.time(), model="fake", object="response", output=output,
+            parallel_tool_calls=False, tool_choice="auto", tools=[],
+            usage=ResponseUsage(
+                input_tokens=usage.input_tokens, output_tokens=usage.output_tokens, total_tokens=usage.total_tokens,
+                input_tokens_details=usage.input_tokens_details, output_tokens_details=usage.output_tokens_details,
+            ),
+        )
+        yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=next(seq))
+
+
+class FakeGraphAPI:
+    """
+    Graph API stand-in served through httpx.MockTransport; records sends with their monotonic time.
+    With rate_limit > 0, text sends above that many per second per phone_number_id get a 429 with Graph's
+    throughput error (code 130429), like the Cloud API.
+    """
+
+    def __init__(self, latency: float = 0.05, rate_limit: float = 0.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.ids = itertools.count()
+        self.sent: list[tuple[float, str, str]] = []  # (time, to, text)
+        self.sent_by_number: dict[str, int] = {}
+        self.last_sent_at: dict[str, float] = {}  # phone_number_id -> time of its latest accepted send
+        self.windows: dict[str, tuple[int, int]] = {}  # phone_number_id -> (second, sends in it)
+        self.throttled = 0
+        self.reads = 0
+
+    def _over_limit(self, phone_number_id: str) -> bool:
+        second = int(time.perf_counter())
+        window, count = self.windows.get(phone_number_id, (second, 0))
+        if window != second:
+            count = 0
+        if count >= self.rate_limit:
+            return True
+        self.windows[phone_number_id] = (second, count + 1)
+        return False
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency)
+        payload = json.loads(request.content or b"{}")
+        if payload.get("status") == "read":
+            self.reads += 1
+            return httpx.Response(200, json={"success": True})
+        to = payload.get("to", "")
+        phone_number_id = request.url.path.strip("/").split("/")[-2]
+        if self.rate_limit and self._over_limit(phone_number_id):
+            self.throttled += 1
+            return httpx.Response(429, json={"error": {
+                "message": "(#130429) Rate limit hit", "type": "OAuthException", "code": 130429,
+            }})
+        self.sent.append((time.perf_counter(), to, (payload.get("text") or {}).get("body", "")))
+        self.sent_by_number[phone_number_id] = self.sent_by_number.get(phone_number_id, 0) + 1
+        self.last_sent_at[phone_number_id] = time.perf_counter()
+        return httpx.Response(200, json={
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.fake{next(self.ids)}"}],
+        })
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
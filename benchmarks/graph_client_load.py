@@ -0,0 +1,217 @@
+"""
+Graph API client benchmark against a local stub server over real sockets (uvicorn in a separate process).
+
+Sends --sends read receipts / text messages, --concurrency at a time, either with a new httpx.AsyncClient per call
+(what mark_read_and_typing / response_to_whatsapp did before webhook.graph_api) or with the shared pooled
+GraphClient, and reports messages/sec, per-send latency percentiles and the TCP connections the stub accepted.
+--tls serves HTTPS with a throwaway self-signed certificate (needs the openssl CLI), so each new connection also
+pays a TLS handshake, as it does against graph.facebook.com. The stub speaks HTTP/1.1 only (uvicorn), so the
+pooled client is measured with keep-alive, without HTTP/2 multiplexing. Without --tls, per_call still builds a
+default certifi SSL context for every client, exactly as the old code did.
+
+    python -m benchmarks.graph_client_load --mode per_call
+    python -m benchmarks.graph_client_load --mode pooled --tls
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.webhook_load import summarize
+
+
+class StubGraphServer:
+    """
+    ASGI app answering POST /{phone_number_id}/messages after latency seconds. GET /stats returns the requests
+    served and the distinct client connections (address, port) they arrived on.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.connections: set[tuple] = set()
+        self.requests = 0
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET":
+            data = {"requests": self.requests, "connections": len(self.connections)}
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+            return
+        self.connections.add(tuple(scope.get("client") or ()))
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        payload = json.loads(body or b"{}")
+        if payload.get("status") == "read":
+            data = {"success": True}
+        else:
+            data = {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.stub{self.requests}"}]}
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+
+
+def self_signed_cert(directory: Path) -> tuple[str, str]:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1", "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return str(cert), str(key)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(latency: float, port: int, cert: str | None, key: str | None) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        StubGraphServer(latency), host="127.0.0.1", port=port, log_level="warning", ssl_certfile=cert,
+        ssl_keyfile=key, backlog=4096, timeout_keep_alive=30,
+    )
+
+
+def start_server(latency: float, port: int, cert: str | None, key: str | None) -> multiprocessing.Process:
+    """Run the stub in its own process, so it does not compete with the client for the event loop / GIL."""
+    process = multiprocessing.Process(target=serve, args=(latency, port, cert, key), daemon=True)
+    process.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return process
+        time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("stub Graph server did not start")
+
+
+def server_stats(base_url: str, verify) -> dict:
+    import httpx
+
+    return httpx.get(f"{base_url}/stats", verify=verify).json()
+
+
+def payload_for(i: int) -> dict:
+    if i % 2 == 0:
+        return {"messaging_product": "whatsapp", "status": "read", "message_id": f"wamid.in{i}",
+                "typing_indicator": {"type": "text"}}
+    return {"messaging_product": "whatsapp", "recipient_type": "individual", "to": f"91{i:08d}", "type": "text",
+            "text": {"body": f"reply {i}"}}
+
+
+async def run_sends(args, base_url: str, verify) -> tuple[list[float], int, float]:
+    import httpx
+
+    from webhook.graph_api import (
+        GRAPH_KEEPALIVE_EXPIRY,
+        GRAPH_MAX_CONNECTIONS,
+        GRAPH_MAX_KEEPALIVE,
+        GraphClient,
+    )
+
+    headers = {"Authorization": "Bearer bench", "Content-Type": "application/json"}
+    pooled = None
+    if args.mode == "pooled":
+        # Same pool settings as the app's client; the transport only adds the stub's certificate.
+        transport = httpx.AsyncHTTPTransport(
+            verify=verify,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=GRAPH_MAX_CONNECTIONS,
+                max_keepalive_connections=GRAPH_MAX_KEEPALIVE,
+                keepalive_expiry=GRAPH_KEEPALIVE_EXPIRY,
+            ),
+        )
+        pooled = GraphClient("bench", base_url=base_url, transport=transport)
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def send(i: int) -> None:
+        nonlocal failures
+        async with slots:
+            started = time.perf_counter()
+            try:
+                if pooled is not None:
+                    data = await pooled.send_messages("BENCH_PHONE", payload_for(i))
+                else:
+                    async with httpx.AsyncClient(verify=verify) as client:
+                        r = await client.post(f"{base_url}/BENCH_PHONE/messages", json=payload_for(i), headers=headers)
+                        data = r.json() if r.content else {}
+            except Exception:
+                data = {}
+            latencies.append(time.perf_counter() - started)
+            failures += not (data.get("success") or data.get("messages"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(args.sends)))
+    elapsed = time.perf_counter() - started
+    if pooled is not None:
+        await pooled.close()
+    return latencies, failures, elapsed
+
+
+def run(args) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        cert = key = None
+        verify = True
+        if args.tls:
+            cert, key = self_signed_cert(Path(tmp))
+            verify = ssl.create_default_context(cafile=cert)
+        server = start_server(args.latency, port, cert, key)
+        try:
+            base_url = f"{'https' if args.tls else 'http'}://localhost:{port}"
+            latencies, failures, elapsed = asyncio.run(run_sends(args, base_url, verify))
+            stats = server_stats(base_url, verify)
+        finally:
+            server.terminate()
+            server.join(timeout=5)
+    return {
+        "mode": args.mode,
+        "tls": args.tls,
+        "sends": args.sends,
+        "failures": failures,
+        "seconds": round(elapsed, 2),
+        "msgs_per_sec": round(args.sends / elapsed, 1) if elapsed else 0.0,
+        **summarize("send", latencies),
+        "connections_opened": stats["connections"] - 1,  # minus the /stats request's own connection
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("per_call", "pooled"), default="pooled")
+    parser.add_argument("--sends", type=int, default=2000, help="requests to send (half read receipts, half texts)")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once (GRAPH_MAX_KEEPALIVE is 20)")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub processing time per request (s)")
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    report = run(parse_args(argv))
+    print(json.dumps(report, indent=2))
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
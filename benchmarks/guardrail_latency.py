@@ -0,0 +1,90 @@
+"""
+Mocked-latency comparison of the router guardrail modes (ROUTER_GUARDRAIL_MODE: parallel / blocking / merged).
+
+Every agent runs on benchmarks.fakes.FakeModel with a fixed delay per call (--latency; --guardrail-latency for the
+scope guardrail), so the reply latency of each mode is its critical path of LLM round trips. For in-scope messages
+(handed off to the Classify Expense Agent) and off-topic ones (FakeModel off_topic: the guardrail / merged router
+verdict says out of scope) it reports per mode: p50 / p95 reply latency, LLM calls per message and the share of
+messages answered with the guardrail_blocked route. The fast path and the response cache are off.
+
+    python -m benchmarks.guardrail_latency
+    python -m benchmarks.guardrail_latency --latency 0.3 --guardrail-latency 0.15 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from benchmarks.webhook_load import summarize
+
+MODES = ("parallel", "blocking", "merged")
+
+
+async def run_mode(args, mode: str, off_topic: bool) -> dict:
+    from benchmarks.fakes import FakeModel
+    from llm.agents import config
+    from llm.expense_agent import ROUTE_GUARDRAIL_BLOCKED, get_route, run_application_agent
+    from llm.openai_client import set_model_provider
+
+    config.GUARDRAIL_MODES["router"] = mode
+    agent_model = FakeModel(latency=args.latency, off_topic=off_topic)
+    guardrail_model = FakeModel(latency=args.guardrail_latency, off_topic=off_topic)
+    set_model_provider(
+        lambda agent_key, model_name: guardrail_model if agent_key.endswith("_guardrail") else agent_model
+    )
+    text = "what's the weather in Chennai" if off_topic else "bought groceries for 450 and paid 200 for the cab"
+    latencies, blocked = [], 0
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal blocked
+        async with slots:
+            started = time.perf_counter()
+            result = await run_application_agent(f"{text} #{i}", "Asha")
+            latencies.append(time.perf_counter() - started)
+            blocked += get_route(result) == ROUTE_GUARDRAIL_BLOCKED
+
+    await asyncio.gather(*(one(i) for i in range(args.messages)))
+    set_model_provider(None)
+    calls = agent_model.calls + guardrail_model.calls
+    return {
+        "mode": mode,
+        "messages": "off_topic" if off_topic else "in_scope",
+        **summarize("reply", latencies),
+        "llm_calls_per_message": round(calls / args.messages, 2),
+        "blocked_rate": round(blocked / args.messages, 2),
+    }
+
+
+async def run(args) -> list[dict]:
+    report = []
+    for off_topic in (False, True):
+        for mode in args.modes.split(","):
+            report.append(await run_mode(args, mode, off_topic))
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated guardrail modes to compare")
+    parser.add_argument("--messages", type=int, default=20, help="messages per mode and message kind")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per router / agent LLM call")
+    parser.add_argument("--guardrail-latency", type=float, default=0.2, help="seconds per guardrail LLM call")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["FAST_PATH_ENABLED"] = "0"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
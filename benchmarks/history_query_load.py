@@ -0,0 +1,203 @@
+"""
+Latency of the conversation history query (last N turns, keyset-paginated) on a seeded conversation_message table.
+
+Applies the user_conservation and conversation_message migrations, seeds --rows messages (default 10M) spread over
+--conversations users and the last --months monthly partitions, then times conversation_messages_page (what
+webhook.conversation_log.last_messages calls) for random conversations from --concurrency connections. Reports
+p50 / p95 / p99 of the first page (the last --limit messages) and, with --pages > 1, of the older pages reached by
+following the (created_at, id) cursor. --explain prints one query's plan.
+
+Needs asyncpg (pip install asyncpg) and a scratch database. Seeding is the slow part (minutes for 10M rows), so a
+table already seeded with the same --rows / --conversations is reused; --reset truncates conversation_message and
+reseeds. Seeding is repeatable for a given --seed.
+
+    python -m benchmarks.history_query_load --dsn postgresql://postgres@localhost/bench --reset
+    python -m benchmarks.history_query_load --rows 1000000 --conversations 10000 --pages 3 --explain
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.webhook_load import percentile
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "supabase" / "migrations"
+MIGRATIONS = [
+    "20260307114400_create_user_conservation.sql",
+    "20260307121000_create_conversation_table.sql",
+    "20260314100000_create_conversation_message.sql",
+    "20260318100000_conversation_message_partitions_ahead.sql",
+]
+BENCH_ENTITY = "BENCH_HISTORY"
+SEED_CHUNK = 1_000_000
+PAGE_SQL = "select id, created_at from public.conversation_messages_page($1, $2, $3, $4)"
+SEED_SQL = """
+insert into public.conversation_message (conversation_id, user_conversation_id, message_id, role, text, created_at)
+select u.converstion_id, u.id, 'bench.' || s.g, case when s.g % 2 = 0 then 'user' else 'assistant' end,
+       'seeded message ' || s.g, now() - s.age
+from (
+    select g, 1 + floor(random() * $3::integer)::bigint as n, random() * make_interval(days => $4::integer) as age
+    from generate_series($1::bigint, $2::bigint) g
+) s
+join bench_users u using (n)
+"""
+
+
+async def seeded(conn, args) -> bool:
+    users = await conn.fetchval("select count(*) from public.user_conservation where entity_id = $1", BENCH_ENTITY)
+    messages = await conn.fetchval("select count(*) from public.conversation_message")
+    if users == args.conversations and messages == args.rows:
+        return True
+    if messages and not args.reset:
+        raise SystemExit(
+            f"conversation_message has {messages} rows, not a --rows {args.rows} seed; "
+            "use a scratch database and pass --reset"
+        )
+    return False
+
+
+async def prepare(args) -> list:
+    """Apply the migrations, seed unless an identical seed is present, and return the seeded conversation ids."""
+    import asyncpg
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        for name in MIGRATIONS:
+            await conn.execute((MIGRATIONS_DIR / name).read_text())
+        if not await seeded(conn, args):
+            await seed(conn, args)
+        return [
+            row["converstion_id"]
+            for row in await conn.fetch(
+                "select converstion_id from public.user_conservation where entity_id = $1", BENCH_ENTITY
+            )
+        ]
+    finally:
+        await conn.close()
+
+
+async def seed(conn, args) -> None:
+    started = time.perf_counter()
+    await conn.execute("truncate public.conversation_message")
+    await conn.execute("delete from public.user_conservation where entity_id = $1", BENCH_ENTITY)
+    await conn.execute("select setseed($1)", args.seed / 2**31)
+    for m in range(args.months + 1):
+        await conn.execute(
+            "select public.create_conversation_message_partition((now() - make_interval(months => $1))::date)", m
+        )
+    await conn.execute(
+        "insert into public.user_conservation (entity_id, phone_number_id, phone_number, profile_name) "
+        "select $1, 'PHONE', 'bench' || g, 'user ' || g from generate_series(1, $2) g",
+        BENCH_ENTITY, args.conversations,
+    )
+    await conn.execute(  # CREATE TABLE AS takes no bind parameters
+        "create temp table bench_users as "
+        "select row_number() over (order by phone_number) as n, id, converstion_id "
+        f"from public.user_conservation where entity_id = '{BENCH_ENTITY}'"
+    )
+    await conn.execute("create index on bench_users (n)")
+    days = args.months * 30
+    for start in range(1, args.rows + 1, SEED_CHUNK):
+        end = min(args.rows, start + SEED_CHUNK - 1)
+        await conn.execute(SEED_SQL, start, end, args.conversations, days)
+        print(f"seeded {end}/{args.rows} rows ({time.perf_counter() - started:.0f}s)", file=sys.stderr)
+    await conn.execute("vacuum analyze public.conversation_message")
+
+
+async def query_loop(args, conversations: list, count: int, rng: random.Random, first: list, older: list) -> None:
+    import asyncpg
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        statement = await conn.prepare(PAGE_SQL)
+        for _ in range(count):
+            cursor = (None, None)
+            conversation_id = rng.choice(conversations)
+            for page in range(args.pages):
+                started = time.perf_counter()
+                rows = await statement.fetch(conversation_id, args.limit, *cursor)
+                (first if page == 0 else older).append(time.perf_counter() - started)
+                if len(rows) < args.limit:
+                    break
+                cursor = (rows[-1]["created_at"], rows[-1]["id"])
+    finally:
+        await conn.close()
+
+
+async def run(args) -> dict:
+    import asyncpg
+
+    conversations = await prepare(args)
+    if args.explain:
+        conn = await asyncpg.connect(args.dsn)
+        try:
+            plan = await conn.fetch(
+                "explain (analyze, buffers) select * from public.conversation_messages_page($1, $2)",
+                conversations[0], args.limit,
+            )
+            print("\n".join(row[0] for row in plan), file=sys.stderr)
+        finally:
+            await conn.close()
+    first: list[float] = []
+    older: list[float] = []
+    rng = random.Random(args.seed)
+    per_loop = [
+        args.queries // args.concurrency + (i < args.queries % args.concurrency) for i in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        query_loop(args, conversations, n, random.Random(rng.random()), first, older) for n in per_loop
+    ))
+    elapsed = time.perf_counter() - started
+    report = {
+        "rows": args.rows,
+        "conversations": args.conversations,
+        "rows_per_conversation": round(args.rows / args.conversations, 1),
+        "limit": args.limit,
+        "queries": len(first),
+        "concurrency": args.concurrency,
+        "queries_per_sec": round((len(first) + len(older)) / elapsed, 1),
+    }
+    report.update({f"last_n_p{p}_ms": round(percentile(first, p) * 1000, 3) for p in (50, 95, 99)})
+    if older:
+        report["older_pages"] = len(older)
+        report.update({f"older_page_p{p}_ms": round(percentile(older, p) * 1000, 3) for p in (50, 95, 99)})
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dsn", default=os.environ.get("PG_DSN", ""), help="Postgres DSN (default: $PG_DSN)")
+    parser.add_argument("--reset", action="store_true", help="truncate conversation_message and reseed")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="conversation_message rows to seed")
+    parser.add_argument("--conversations", type=int, default=100_000, help="distinct conversations")
+    parser.add_argument("--months", type=int, default=6, help="seeded rows span this many past months")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=20, help="messages per page (the last-N history size)")
+    parser.add_argument("--pages", type=int, default=1, help="pages per conversation, following the cursor")
+    parser.add_argument("--queries", type=int, default=5000, help="conversations to query")
+    parser.add_argument("--concurrency", type=int, default=8, help="connections querying at once")
+    parser.add_argument("--explain", action="store_true", help="print EXPLAIN ANALYZE of one query")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.dsn:
+        print("No DSN: pass --dsn or set PG_DSN (a scratch Postgres database).")
+        return 2
+    try:
+        import asyncpg  # noqa: F401
+    except ImportError:
+        print("asyncpg is required: pip install asyncpg")
+        return 2
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
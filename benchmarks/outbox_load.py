@@ -0,0 +1,160 @@
+"""
+Sustained WhatsApp send throughput against a Graph stub that enforces a per-number rate limit.
+
+Queues --sends replies per business number (--numbers, weighted by --weights) at once and sends them either
+directly (GraphClient with its own 429 retries, --concurrency sends at a time; what response_to_whatsapp did before
+the outbox) or through webhook.outbox.Outbox. Reports sends/sec, 429s received, replies lost, duplicate sends, and
+when each number's last reply went out (weighted fair scheduling finishes heavier numbers first).
+--pods N runs N outboxes (worker ids) on one MemoryStore, each sweeping for expired leases, with the sends spread
+over them; status updates go through a write-behind buffer as in main.py. --restart-after stops the first pod part way
+through (a crash: its rows stay leased); the other pods, or a fresh one when --pods 1, send them once the lease
+(--lease) expires.
+
+    python -m benchmarks.outbox_load --mode direct
+    python -m benchmarks.outbox_load --mode outbox --weights 3,1,1
+    python -m benchmarks.outbox_load --mode outbox --pods 3 --restart-after 2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+
+async def run_direct(args, graph_api, numbers) -> dict:
+    from webhook.graph_api import GraphClient
+
+    client = GraphClient("bench", transport=graph_api.transport())
+    slots = asyncio.Semaphore(args.concurrency)
+    lost = 0
+
+    async def send(number: str, i: int) -> None:
+        nonlocal lost
+        async with slots:
+            payload = {
+                "messaging_product": "whatsapp", "to": f"91{i:08d}", "type": "text", "text": {"body": f"{number}:r{i}"},
+            }
+            data = await client.send_messages(number, payload)
+            lost += data.get("messages") is None
+
+    await asyncio.gather(*(send(number, i) for i in range(args.sends) for number in numbers))
+    await client.close()
+    return {"lost": lost}
+
+
+async def run_outbox(args, graph_api, numbers) -> dict:
+    from webhook.graph_api import GraphClient
+    from webhook.outbox import STATUS_PENDING, Outbox
+    from webhook.storage import MemoryStore
+    from webhook.write_behind import WriteBehindBuffer
+
+    client = GraphClient("bench", transport=graph_api.transport())
+    store = MemoryStore(latency=args.db_latency)
+    weights = dict(zip(numbers, args.weights)) if args.weights else {}
+
+    async def flush(batch):
+        await store.rpc("record_conversation_batch", {"p_outbox": [payload for _, payload in batch]})
+
+    write_behind = WriteBehindBuffer(flush)
+    write_behind.start()
+
+    async def new_outbox() -> Outbox:
+        outbox = Outbox(
+            lambda: client, lambda: store, record_status=lambda update: write_behind.add("outbox", update),
+            rate=args.rate, burst=args.burst, concurrency=args.concurrency, weights=weights,
+            lease_seconds=args.lease, sweep_interval=args.sweep_interval,
+        )
+        await outbox.start()
+        return outbox
+
+    pods = [await new_outbox() for _ in range(args.pods)]
+    sends = [
+        asyncio.create_task(pods[(i * len(numbers) + n) % len(pods)].send(number, f"91{i:08d}", f"{number}:r{i}"))
+        for i in range(args.sends) for n, number in enumerate(numbers)
+    ]
+    if args.restart_after:
+        await asyncio.sleep(args.restart_after)
+        await pods[0].stop(timeout=0)  # simulated crash: its rows stay pending and leased
+        for task in sends:
+            task.cancel()
+        pods = pods[1:] or [await new_outbox()]
+        while any(r["status"] == STATUS_PENDING for r in store.tables.get("whatsapp_outbox", [])):
+            await asyncio.sleep(0.05)
+    else:
+        await asyncio.gather(*sends)
+    stats = [pod.stats() for pod in pods]
+    for pod in pods:
+        await pod.stop()
+    await write_behind.stop()
+    await client.close()
+    rows = store.tables.get("whatsapp_outbox", [])
+    return {
+        "lost": sum(1 for r in rows if r["status"] != "sent"),
+        "pending_rows": sum(1 for r in rows if r["status"] == STATUS_PENDING),
+        "recovered": sum(s["recovered"] for s in stats),
+        "db_calls_per_send": round(store.calls / len(rows), 2) if rows else 0.0,
+        "outbox": stats,
+    }
+
+
+async def run(args) -> dict:
+    from benchmarks.fakes import FakeGraphAPI
+
+    graph_api = FakeGraphAPI(latency=args.graph_latency, rate_limit=args.limit)
+    numbers = [f"PHONE_{n}" for n in range(args.numbers)]
+    start = time.perf_counter()
+    result = await (run_direct if args.mode == "direct" else run_outbox)(args, graph_api, numbers)
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": args.mode,
+        "requested": args.sends * len(numbers),
+        "delivered": len(graph_api.sent),
+        "duplicates": len(graph_api.sent) - len({(to, text) for _, to, text in graph_api.sent}),
+        "throttled_429": graph_api.throttled,
+        "seconds": round(elapsed, 2),
+        "sends_per_sec": round(len(graph_api.sent) / elapsed, 1) if elapsed else 0.0,
+        "stub_limit_per_sec": args.limit * len(numbers),
+        "delivered_by_number": {n: graph_api.sent_by_number.get(n, 0) for n in numbers},
+        "finished_after_s": {
+            n: round(graph_api.last_sent_at[n] - start, 2) for n in numbers if n in graph_api.last_sent_at
+        },
+        **result,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("direct", "outbox"), default="outbox")
+    parser.add_argument("--numbers", type=int, default=3, help="business phone_number_ids")
+    parser.add_argument("--sends", type=int, default=300, help="replies queued per number")
+    parser.add_argument("--weights", type=lambda s: [float(w) for w in s.split(",")], default=None,
+                        help="outbox weight per number, e.g. 3,1,1")
+    parser.add_argument("--limit", type=float, default=50, help="stub: sends/sec allowed per number")
+    parser.add_argument("--rate", type=float, default=48, help="outbox: token bucket rate per number")
+    parser.add_argument("--burst", type=float, default=12, help="outbox: token bucket burst per number")
+    parser.add_argument("--concurrency", type=int, default=32, help="sends in flight at once")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="stub latency per request (s)")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="MemoryStore latency per call (s)")
+    parser.add_argument("--pods", type=int, default=1, help="outbox: processes sharing the outbox table")
+    parser.add_argument("--lease", type=int, default=2, help="outbox: row lease (s)")
+    parser.add_argument("--sweep-interval", type=float, default=0.5, help="outbox: expired-lease sweep interval (s)")
+    parser.add_argument("--restart-after", type=float, default=0, help="outbox: crash the first pod after this many seconds")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ.setdefault("OUTBOX_BACKOFF_BASE", "0.25")
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log if not args.verbose else sys.stdout):
+        report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
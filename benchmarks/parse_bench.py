@@ -0,0 +1,117 @@
+"""
+Webhook parse micro-benchmark: webhook.parser (raw bytes -> slotted records, every entry / change) against the legacy
+dict-walking parse it replaced (json.loads, then entry[0] / changes[0] / contacts[0] into nested dicts).
+
+Two workloads: the recorded bodies in benchmarks/payloads.jsonl (one message each) and a synthetic batched body
+(--entries x --changes x --messages). Reports microseconds per body and per message, and messages found; the legacy
+parse drops everything past the first entry / change, which is why it looks cheap on batched bodies.
+
+    python -m benchmarks.parse_bench
+    python -m benchmarks.parse_bench --entries 4 --changes 3 --messages 10
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from webhook.parser import WHATSAPP_OBJECT, parse_webhook_bytes
+
+PAYLOADS = Path(__file__).resolve().parent / "payloads.jsonl"
+
+
+def legacy_parse(data: dict) -> dict:
+    """main.parse_webhook_payload before webhook/parser.py: first entry / change / contact only."""
+    if not data or data.get("object") != WHATSAPP_OBJECT:
+        return {}
+    entry = (data.get("entry") or [{}])[0]
+    changes = entry.get("changes") or [{}]
+    value = (changes[0] if changes else {}).get("value") or {}
+    metadata = value.get("metadata") or {}
+    contacts = value.get("contacts") or [{}]
+    contact = contacts[0] if contacts else {}
+    profile = contact.get("profile") or {}
+    messages = []
+    for m in value.get("messages") or []:
+        text_obj = m.get("text") or {}
+        messages.append({
+            "from": m.get("from"),
+            "id": m.get("id"),
+            "timestamp": m.get("timestamp"),
+            "text": text_obj.get("body", ""),
+            "type": m.get("type"),
+        })
+    return {
+        "object": data.get("object"),
+        "entity_id": entry.get("id"),
+        "display_phone_number": metadata.get("display_phone_number"),
+        "phone_number_id": metadata.get("phone_number_id"),
+        "profile_name": profile.get("name"),
+        "wa_id": contact.get("wa_id"),
+        "messages": messages,
+    }
+
+
+def batched_body(entries: int, changes: int, messages: int) -> bytes:
+    """One POST carrying entries x changes x messages text messages, each change from its own contacts."""
+    body = {"object": WHATSAPP_OBJECT, "entry": []}
+    for e in range(entries):
+        entry = {"id": f"WABA_{e}", "changes": []}
+        for c in range(changes):
+            users = [f"91{e:02d}{c:02d}{m:04d}" for m in range(messages)]
+            entry["changes"].append({"field": "messages", "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "15550000000", "phone_number_id": f"PHONE_{c}"},
+                "contacts": [{"wa_id": u, "profile": {"name": f"user {u}"}} for u in users],
+                "messages": [
+                    {"from": u, "id": f"wamid.{u}", "timestamp": "1773500000", "type": "text", "text": {"body": "200 for bus"}}
+                    for u in users
+                ],
+            }})
+        body["entry"].append(entry)
+    return json.dumps(body).encode()
+
+
+def time_per_call(fn, bodies: list[bytes], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for body in bodies:
+            fn(body)
+    return (time.perf_counter() - start) / (iterations * len(bodies))
+
+
+def compare(bodies: list[bytes], iterations: int) -> dict:
+    new = time_per_call(parse_webhook_bytes, bodies, iterations)
+    legacy = time_per_call(lambda b: legacy_parse(json.loads(b)), bodies, iterations)
+    messages_new = sum(len(parse_webhook_bytes(b)[0].messages) for b in bodies)
+    messages_legacy = sum(len(legacy_parse(json.loads(b)).get("messages", [])) for b in bodies)
+    return {
+        "bodies": len(bodies),
+        "us_per_body_new": round(new * 1e6, 2),
+        "us_per_body_legacy": round(legacy * 1e6, 2),
+        "us_per_message_new": round(new * len(bodies) / max(1, messages_new) * 1e6, 2),
+        "us_per_message_legacy": round(legacy * len(bodies) / max(1, messages_legacy) * 1e6, 2),
+        "messages_new": messages_new,
+        "messages_legacy": messages_legacy,
+    }
+
+
+def main(argv=None, quiet: bool = False) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--entries", type=int, default=2)
+    parser.add_argument("--changes", type=int, default=2)
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args(argv)
+    recorded = [line.encode() for line in PAYLOADS.read_text().splitlines() if line.strip()]
+    batched = [batched_body(args.entries, args.changes, args.messages)]
+    report = {
+        "recorded": compare(recorded, args.iterations),
+        "batched": compare(batched, max(1, args.iterations // 10)),
+    }
+    if not quiet:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
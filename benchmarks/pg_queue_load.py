@@ -0,0 +1,168 @@
+"""
+Multi-process throughput test for the Postgres job queue (JOB_BACKEND=postgres) against a real database.
+
+Applies supabase/migrations/20260317100000_create_webhook_jobs.sql, enqueues --jobs messages spread over
+--conversations conversations with enqueue_webhook_jobs, then drains them with N worker processes (each running
+--concurrency claim loops on their own connections) calling claim_webhook_jobs / complete_webhook_jobs, with
+--work-latency seconds of simulated agent work per batch. Repeats for every N in --processes and checks that every
+job ran exactly once and that no conversation ever ran on two workers at once or out of order.
+
+Needs asyncpg (pip install asyncpg) and a scratch database: webhook_jobs is truncated when --reset is given.
+
+    python -m benchmarks.pg_queue_load --dsn postgresql://postgres@localhost/bench --reset --processes 1,2,4,8
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+MIGRATION = Path(__file__).resolve().parent.parent / "supabase/migrations/20260317100000_create_webhook_jobs.sql"
+CLAIM_SQL = "select message_id, conversation_key, seq from public.claim_webhook_jobs($1, $2, $3)"
+COMPLETE_SQL = "select public.complete_webhook_jobs($1, $2)"
+UNFINISHED_SQL = "select count(*) from public.webhook_jobs where status in ('pending', 'running')"
+
+
+async def prepare(args) -> None:
+    import asyncpg
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute(MIGRATION.read_text())
+        if args.reset:
+            await conn.execute("truncate public.webhook_jobs")
+        elif await conn.fetchval("select count(*) from public.webhook_jobs"):
+            raise SystemExit("webhook_jobs is not empty; use a scratch database and pass --reset")
+        jobs = [
+            {
+                "message_id": f"bench.{uuid.uuid4().hex}",
+                "conversation_key": f"BENCH:{i % args.conversations}",
+                "payload": {"text": f"m{i}"},
+            }
+            for i in range(args.jobs)
+        ]
+        for start in range(0, len(jobs), 100):  # one webhook payload carries at most a handful of messages
+            await conn.fetchval("select public.enqueue_webhook_jobs($1::jsonb)", json.dumps(jobs[start:start + 100]))
+    finally:
+        await conn.close()
+
+
+async def worker_loops(args, worker_id: str) -> list[tuple]:
+    """Run --concurrency claim loops until no unfinished job is left; returns the runs they performed."""
+    import asyncpg
+
+    runs = []
+
+    async def loop(n: int) -> None:
+        conn = await asyncpg.connect(args.dsn)
+        name = f"{worker_id}.{n}"
+        try:
+            while True:
+                rows = await conn.fetch(CLAIM_SQL, name, 1, args.visibility)
+                if not rows:
+                    if not await conn.fetchval(UNFINISHED_SQL):
+                        return
+                    await asyncio.sleep(args.poll_interval)
+                    continue
+                started = time.perf_counter()
+                await asyncio.sleep(args.work_latency)  # the agent turn
+                ended = time.perf_counter()
+                ids = [row["message_id"] for row in rows]
+                await conn.execute(COMPLETE_SQL, name, ids)
+                runs.extend(
+                    (row["message_id"], row["conversation_key"], row["seq"], started, ended, name) for row in rows
+                )
+        finally:
+            await conn.close()
+
+    await asyncio.gather(*(loop(n) for n in range(args.concurrency)))
+    return runs
+
+
+def process_main(args, worker_id: str, results) -> None:
+    results.put(asyncio.run(worker_loops(args, worker_id)))
+
+
+def verify(runs: list[tuple], expected: int) -> list[str]:
+    """Exactly-once, one worker per conversation at a time, and seq order within a conversation."""
+    problems = []
+    ids = [run[0] for run in runs]
+    if len(ids) != expected or len(set(ids)) != expected:
+        problems.append(f"{len(set(ids))} distinct / {len(ids)} runs for {expected} jobs")
+    batches: dict[tuple, list] = {}
+    for message_id, conversation, seq, started, ended, worker in runs:
+        batches.setdefault((conversation, worker, started, ended), []).append(seq)
+    by_conversation: dict[str, list] = {}
+    for (conversation, worker, started, ended), seqs in batches.items():
+        by_conversation.setdefault(conversation, []).append((started, ended, min(seqs), max(seqs)))
+    for conversation, spans in by_conversation.items():
+        spans.sort()
+        for (s1, e1, lo1, hi1), (s2, e2, lo2, hi2) in zip(spans, spans[1:]):
+            if s2 < e1:
+                problems.append(f"{conversation}: overlapping batches")
+            if lo2 < hi1:
+                problems.append(f"{conversation}: ran out of order")
+    return problems
+
+
+def run_once(args, processes: int) -> dict:
+    asyncio.run(prepare(args))
+    results = multiprocessing.Queue()
+    started = time.perf_counter()
+    workers = [
+        multiprocessing.Process(target=process_main, args=(args, f"p{i}", results)) for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    runs = [run for _ in workers for run in results.get()]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    batches = len({(r[1], r[5], r[3]) for r in runs})
+    return {
+        "processes": processes,
+        "claim_loops": processes * args.concurrency,
+        "jobs": len(runs),
+        "batches": batches,
+        "seconds": round(elapsed, 2),
+        "jobs_per_sec": round(len(runs) / elapsed, 1),
+        "batches_per_sec": round(batches / elapsed, 1),
+        "problems": verify(runs, args.jobs),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dsn", default=os.environ.get("PG_DSN", ""), help="Postgres DSN (default: $PG_DSN)")
+    parser.add_argument("--reset", action="store_true", help="truncate webhook_jobs before each run")
+    parser.add_argument("--processes", default="1,2,4", help="comma-separated worker process counts to compare")
+    parser.add_argument("--concurrency", type=int, default=8, help="claim loops (connections) per process")
+    parser.add_argument("--jobs", type=int, default=2000, help="messages to enqueue per run")
+    parser.add_argument("--conversations", type=int, default=500, help="distinct conversations")
+    parser.add_argument("--work-latency", type=float, default=0.05, help="simulated agent seconds per batch")
+    parser.add_argument("--visibility", type=int, default=300, help="lease seconds passed to claim_webhook_jobs")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="sleep when nothing is claimable (s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.dsn:
+        print("No DSN: pass --dsn or set PG_DSN (a scratch Postgres database).")
+        return 2
+    try:
+        import asyncpg  # noqa: F401
+    except ImportError:
+        print("asyncpg is required: pip install asyncpg")
+        return 2
+    report = [run_once(args, int(n)) for n in args.processes.split(",")]
+    print(json.dumps(report, indent=2))
+    return 1 if any(r["problems"] for r in report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
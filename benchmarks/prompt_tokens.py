@@ -0,0 +1,106 @@
+"""
+Offline prompt-size benchmark for the agent graph (no LLM calls).
+
+For a set of sample requests (different users, days, messages, with and without history) it assembles what each
+agent would be sent, then reports per agent: estimated tokens per segment, tokens per request, and how many leading
+tokens two requests share (the part a provider-side prefix cache can reuse). It also reports the preamble shared by
+every agent's instructions.
+
+    python -m benchmarks.prompt_tokens            # report
+    python -m benchmarks.prompt_tokens --check    # exit 1 if any agent's static prefix differs between requests
+"""
+import argparse
+import json
+import os
+import sys
+
+from llm.memory import CHARS_PER_TOKEN
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "spent 1800 on shopping and 700 for food",
+    "paid the plumber 1500 yesterday",
+    "hello there, can you help me track my spending?",
+]
+SAMPLE_USERS = ["Asha", "Ravi", ""]
+SAMPLE_DAYS = ["2026-03-14", "2026-03-15"]
+SAMPLE_HISTORY = [
+    {"role": "user", "content": "200 for bus"},
+    {"role": "assistant", "content": "Got it, I've noted that. 👍\n• Amount: *200*\n• Date: *2026-03-14*\n• Purpose: *bus*"},
+]
+
+
+def graph_agents():
+    from llm.agents.welcome_agent import welcomeInputGuardrailsAgent
+    from llm.expense_agent import applicationAgent, applicationMergedAgent
+
+    agents = [applicationAgent, applicationMergedAgent, *applicationAgent.handoffs, welcomeInputGuardrailsAgent]
+    return [a for a in agents if hasattr(a, "instructions")]
+
+
+def common_prefix_len(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def sample_requests():
+    from llm.prompt import build_input
+
+    for message in SAMPLE_MESSAGES:
+        for user in SAMPLE_USERS:
+            for day in SAMPLE_DAYS:
+                for history in (None, SAMPLE_HISTORY):
+                    yield (message, user, day, history is not None), build_input(message, user, day, history)
+
+
+def measure() -> dict:
+    from llm.prompt import segment_tokens, tool_schemas
+
+    report = {"agents": {}, "static_prefix_identical": True}
+    agents = graph_agents()
+    for agent in agents:
+        prefixes, requests, segments = set(), {}, []
+        for key, items in sample_requests():
+            # Rebuilt per request on purpose (static_prefix() caches): catches instructions that vary per call.
+            prefix = f"{agent.instructions}\n{json.dumps(tool_schemas(agent), sort_keys=True)}"
+            prefixes.add(prefix)
+            requests[key] = prefix + json.dumps(items, ensure_ascii=False)
+            segments.append(segment_tokens(agent, agent.instructions, items))
+        identical = len(prefixes) == 1
+        report["static_prefix_identical"] &= identical
+        # Same user and message on two consecutive days: the provider can reuse at most their common prefix.
+        reuse = [
+            common_prefix_len(requests[(m, u, SAMPLE_DAYS[0], h)], requests[(m, u, SAMPLE_DAYS[1], h)])
+            for (m, u, d, h) in requests if d == SAMPLE_DAYS[0]
+        ]
+        total = [len(r) for r in requests.values()]
+        report["agents"][agent.name] = {
+            "static_prefix_identical": identical,
+            "segments_avg": {k: round(sum(s[k] for s in segments) / len(segments), 1) for k in segments[0]},
+            "request_tokens_avg": round(sum(total) / len(total) / CHARS_PER_TOKEN, 1),
+            "reusable_prefix_tokens_avg": round(sum(reuse) / len(reuse) / CHARS_PER_TOKEN, 1),
+        }
+    shared = min(common_prefix_len(agents[0].instructions, a.instructions) for a in agents[1:])
+    report["shared_instruction_prefix_tokens"] = round(shared / CHARS_PER_TOKEN, 1)
+    report["request_tokens_total_avg"] = round(sum(a["request_tokens_avg"] for a in report["agents"].values()), 1)
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="exit 1 if a static prefix varies between requests")
+    args = parser.parse_args(argv)
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    report = measure()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.check and not report["static_prefix_identical"]:
+        print("Static prompt prefix differs between requests.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Replayable load test for the webhook pipeline.
+
+Posts WhatsApp webhook payloads to main.app through an in-process ASGI client at a fixed rate, with the LLM,
+Graph API and Supabase replaced by fakes (benchmarks.fakes, webhook.storage.MemoryStore). Reports ACK latency
+percentiles, end-to-end latency (POST to reply sent and process_messages done), time to the reply's first WhatsApp
+message (ttfm, the reply_first_message_seconds metric), messages/sec and peak RSS.
+
+    python -m benchmarks.webhook_load --messages 500 --rate 100
+    python -m benchmarks.webhook_load --payloads benchmarks/payloads.jsonl --loops 20
+    python -m benchmarks.webhook_load --check                 # regression gate against benchmarks/baseline.json
+    python -m benchmarks.webhook_load --write-baseline        # record a new baseline
+
+Payload files are JSONL: one webhook body per line (or {"body": {...}} records). Message ids are suffixed per loop
+so replays are not dropped as duplicates. Timings and RSS are machine-specific: record the baseline on the machine
+that runs the gate. tests/test_benchmark_gate.py runs --check on a reduced scenario against baseline_smoke.json;
+re-record both baselines in the commit that changes what they measure. App feature flags (FAST_PATH_ENABLED, STREAMING_ENABLED, ...) are read
+from the environment as usual; --no-fast-path, --no-response-cache, --no-streaming and --coalesce-window set them
+before main is imported; compare ttfm with and without --no-streaming (and with --token-interval) for streaming. --burst N sends N consecutive messages per user (rapid-fire bursts for the coalescer).
+--job-backend postgres runs the webhook_jobs path (webhook.pg_jobs) on MemoryStore's implementation of the queue
+functions, with one in-process PostgresJobWorker; benchmarks.pg_queue_load measures real Postgres with processes.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+# Gated metrics: name -> (direction that counts as better, absolute slack so millisecond jitter does not fail the gate).
+GATES = {
+    "ack_p95_ms": ("lower", 5.0),
+    "e2e_p95_ms": ("lower", 50.0),
+    "msgs_per_sec": ("higher", 1.0),
+    "peak_rss_mb": ("lower", 10.0),
+}
+
+SYNTHETIC_TEXTS = [
+    "hi",
+    "200 for bus",
+    "spent 1800 on shopping and 700 for food",
+    "how much did I spend this month",
+    "paid the plumber 1500 yesterday",
+    "hello there, can you help me track my spending?",
+    "what's a good way to save on groceries",
+    "450 dinner with friends",
+]
+
+
+def synthetic_payloads(count: int, users: int, burst: int = 1) -> list[dict]:
+    """One single-message payload per message, round-robin over users (burst messages each) and SYNTHETIC_TEXTS."""
+    payloads = []
+    for i in range(count):
+        user = (i // burst) % users
+        wa_id = f"9100000{user:05d}"
+        payloads.append({
+            "object": "whatsapp_business_account",
+            "entry": [{"id": "BENCH", "changes": [{"field": "messages", "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "15550000000", "phone_number_id": "BENCH_PHONE"},
+                "contacts": [{"wa_id": wa_id, "profile": {"name": f"User {user}"}}],
+                "messages": [{
+                    "from": wa_id, "id": f"wamid.bench{i}", "timestamp": str(int(time.time())),
+                    "type": "text", "text": {"body": SYNTHETIC_TEXTS[i % len(SYNTHETIC_TEXTS)]},
+                }],
+            }}]}],
+        })
+    return payloads
+
+
+def load_payloads(path: Path, loops: int) -> list[dict]:
+    """Read a JSONL capture and repeat it loops times with per-loop message ids."""
+    captured = []
+    for line in path.read_text().splitlines():
+        if line.strip():
+            record = json.loads(line)
+            captured.append(record["body"] if isinstance(record.get("body"), dict) else record)
+    payloads = []
+    for loop in range(loops):
+        for body in captured:
+            body = json.loads(json.dumps(body))
+            for entry in body.get("entry", []):
+                for change in entry.get("changes", []):
+                    for message in change.get("value", {}).get("messages", []):
+                        message["id"] = f"{message.get('id', '')}.{loop}"
+            payloads.append(body)
+    return payloads
+
+
+def message_ids(payload: dict) -> list[str]:
+    return [
+        message.get("id", "")
+        for entry in payload.get("entry", [])
+        for change in entry.get("changes", [])
+        for message in change.get("value", {}).get("messages", [])
+    ]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name: str, values: list[float]) -> dict:
+    return {f"{name}_p{p}_ms": round(percentile(values, p) * 1000, 2) for p in (50, 95, 99)}
+
+
+async def run(args) -> dict:
+    import main
+    from llm.expense_agent import LLM_FALLBACK_REPLY
+    from llm.openai_client import set_model_provider
+    from webhook.graph_api import GraphClient, set_graph_client
+    from webhook.signature import SIGNATURE_HEADER, sign
+    from webhook.storage import MemoryStore, set_store
+
+    from benchmarks.fakes import FakeGraphAPI, FakeModel
+
+    model = FakeModel(
+        latency=args.llm_latency, token_interval=args.token_interval, output_tokens=args.output_tokens,
+        rate_limit_rate=args.fake_429_rate, spike_rate=args.fake_spike_rate, spike_latency=args.fake_spike_latency,
+        capacity=args.fake_capacity,
+    )
+    set_model_provider(lambda agent_key, model_name: model)
+    graph = FakeGraphAPI(latency=args.graph_latency)
+    set_graph_client(GraphClient("bench", transport=graph.transport()))
+    store = MemoryStore(latency=args.db_latency)
+    set_store(store)
+
+    if args.payloads:
+        payloads = load_payloads(Path(args.payloads), args.loops)
+    else:
+        payloads = synthetic_payloads(args.messages, args.users, args.burst)
+    expected = sum(len(message_ids(p)) for p in payloads)
+
+    posted_at: dict[str, float] = {}
+    done_at: dict[str, float] = {}
+    all_done = asyncio.Event()
+    process_messages = main.process_messages
+
+    async def timed_process_messages(msgs, **kwargs):
+        try:
+            return await process_messages(msgs, **kwargs)
+        finally:
+            for msg in msgs:
+                done_at[msg.id] = time.perf_counter()
+            if len(done_at) >= expected:
+                all_done.set()
+
+    main.process_messages = timed_process_messages
+    ttfm: list[float] = []
+    observe_first_message = main.FIRST_MESSAGE_SECONDS.observe
+
+    def timed_first_message(value: float, **labels) -> None:
+        ttfm.append(value)
+        observe_first_message(value, **labels)
+
+    main.FIRST_MESSAGE_SECONDS.observe = timed_first_message
+    ack: list[float] = []
+    statuses: dict[int, int] = {}
+
+    import httpx
+
+    transport = httpx.ASGITransport(app=main.app)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log if not args.verbose else sys.stdout):
+        async with main.lifespan(main.app):
+            worker = worker_task = None
+            if args.job_backend == "postgres":
+                from webhook.pg_jobs import PostgresJobWorker
+                from webhook.storage import get_store
+
+                worker = PostgresJobWorker(get_store, main.process_claimed_messages, poll_interval=0.05)
+                worker_task = asyncio.create_task(worker.run())
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+                async def post(payload: dict) -> None:
+                    raw = json.dumps(payload).encode()
+                    headers = {"content-type": "application/json"}
+                    if args.app_secret:
+                        headers[SIGNATURE_HEADER] = sign(raw, args.app_secret)
+                    sent = time.perf_counter()
+                    for mid in message_ids(payload):
+                        posted_at[mid] = sent
+                    response = await client.post("/", content=raw, headers=headers)
+                    ack.append(time.perf_counter() - sent)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+                start = time.perf_counter()
+                tasks = []
+                for i, payload in enumerate(payloads):
+                    if args.rate > 0:
+                        delay = start + i / args.rate - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    tasks.append(asyncio.create_task(post(payload)))
+                await asyncio.gather(*tasks)
+                try:
+                    await asyncio.wait_for(all_done.wait(), timeout=args.timeout)
+                except asyncio.TimeoutError:
+                    pass
+                elapsed = time.perf_counter() - start
+                health = (await client.get("/health")).json()
+            if worker is not None:
+                worker.stop()
+                await worker_task
+                health["pg_worker"] = worker.stats()
+    main.process_messages = process_messages
+    del main.FIRST_MESSAGE_SECONDS.observe
+
+    e2e = [done_at[mid] - posted_at[mid] for mid in done_at if mid in posted_at]
+    return {
+        "messages": expected,
+        "completed": len(done_at),
+        "http_status": {str(k): v for k, v in sorted(statuses.items())},
+        **summarize("ack", ack),
+        **summarize("e2e", e2e),
+        **summarize("ttfm", ttfm),
+        "msgs_per_sec": round(len(done_at) / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "llm_calls": model.calls,
+        "llm_rate_limited": model.rate_limited,
+        "fallback_replies": sum(1 for _, _, text in graph.sent if text == LLM_FALLBACK_REPLY),
+        "llm_input_tokens": model.input_tokens,
+        "llm_output_tokens": model.output_tokens_total,
+        "graph_sends": len(graph.sent),
+        "graph_reads": graph.reads,
+        "router": health.get("router", {}),
+        "queue": health.get("queue", {}),
+        "llm_guard": health.get("llm", {}),
+        "coalesce": health.get("coalesce", {}),
+        "outbox": health.get("outbox", {}),
+        **({"pg_worker": health["pg_worker"]} if "pg_worker" in health else {}),
+    }
+
+
+def scenario(args) -> dict:
+    """Parameters that must match for two reports to be comparable."""
+    keys = ("payloads", "loops", "messages", "users", "burst", "rate", "llm_latency", "token_interval", "output_tokens",
+            "graph_latency", "db_latency", "no_fast_path", "no_response_cache", "no_streaming", "app_secret",
+            "fake_429_rate", "fake_spike_rate", "fake_spike_latency", "fake_capacity", "coalesce_window", "job_backend")
+    return {k: getattr(args, k) for k in keys}
+
+
+def check(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions beyond tolerance (fraction) and the metric's slack for each gated metric in the baseline."""
+    failures = []
+    for metric, (better, slack) in GATES.items():
+        if metric not in baseline.get("report", {}):
+            continue
+        base, now = baseline["report"][metric], report[metric]
+        if better == "lower" and now > max(base * (1 + tolerance), base + slack):
+            failures.append(f"{metric}: {now} > {base} (+{tolerance:.0%})")
+        if better == "higher" and now < min(base * (1 - tolerance), base - slack):
+            failures.append(f"{metric}: {now} < {base} (-{tolerance:.0%})")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--payloads", help="JSONL capture to replay (default: synthetic payloads)")
+    parser.add_argument("--loops", type=int, default=1, help="replay the capture this many times")
+    parser.add_argument("--messages", type=int, default=300, help="synthetic messages to send")
+    parser.add_argument("--users", type=int, default=50, help="distinct senders for synthetic messages")
+    parser.add_argument("--burst", type=int, default=1, help="consecutive synthetic messages per user")
+    parser.add_argument("--rate", type=float, default=100, help="payloads per second (0 = as fast as possible)")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="fake model time to first token (s)")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="fake model seconds per output token")
+    parser.add_argument("--output-tokens", type=int, default=24, help="fake model words per text reply")
+    parser.add_argument("--fake-429-rate", type=float, default=0.0, help="fraction of LLM calls failing with 429")
+    parser.add_argument("--fake-spike-rate", type=float, default=0.0, help="fraction of LLM calls with a latency spike")
+    parser.add_argument("--fake-spike-latency", type=float, default=10.0, help="latency of a spiked LLM call (s)")
+    parser.add_argument("--fake-capacity", type=int, default=0, help="concurrent LLM calls before 429s (0 = unlimited)")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="fake Graph API latency (s)")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="in-memory store latency per call (s)")
+    parser.add_argument("--no-fast-path", action="store_true", help="send every message to the agent")
+    parser.add_argument("--no-response-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--no-streaming", action="store_true", help="send each reply in one message when it is done")
+    parser.add_argument("--coalesce-window", type=float, default=0.0, help="set COALESCE_WINDOW (0 = off, the default)")
+    parser.add_argument("--job-backend", choices=("memory", "postgres"), default="memory", help="set JOB_BACKEND")
+    parser.add_argument("--app-secret", default="", help="set WHATSAPP_APP_SECRET and sign every payload (unset: unsigned, WEBHOOK_SIGNATURE_OPTIONAL=1)")
+    parser.add_argument("--timeout", type=float, default=60, help="max seconds to wait for processing to finish")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline JSON for --check/--write-baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 when a gated metric regresses")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression as a fraction")
+    parser.add_argument("--write-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ["REDIS_URL"] = ""
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")  # the shared client is opened at startup but never called
+    if args.no_fast_path:
+        os.environ["FAST_PATH_ENABLED"] = "0"
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    if args.no_streaming:
+        os.environ["STREAMING_ENABLED"] = "0"
+    os.environ["WHATSAPP_APP_SECRET"] = args.app_secret
+    os.environ["WEBHOOK_SIGNATURE_OPTIONAL"] = "0" if args.app_secret else "1"
+    os.environ["COALESCE_WINDOW"] = str(args.coalesce_window)
+    os.environ["JOB_BACKEND"] = args.job_backend
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    baseline_path = Path(args.baseline)
+    if args.write_baseline:
+        baseline_path.write_text(json.dumps({"scenario": scenario(args), "report": report}, indent=2) + "\n")
+        print(f"Baseline written to {baseline_path}")
+    if args.check:
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get("scenario") != scenario(args):
+            print(f"Scenario differs from baseline: {baseline.get('scenario')}")
+            return 2
+        failures = check(report, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,19 @@
 """Expense app agents: welcome and classify expense."""
 
 from llm.agents.welcome_agent import welcomeAgents
-from llm.agents.classify_expense_agent import classifyExpenseAgent
+from llm.agents.classify_expense_agent import (
+    ClassifyExpenseAgentOutputFormat,
+    ClassifyExpenseBatchOutputFormat,
+    classifyExpenseAgent,
+    format_expense_reply,
+    format_expenses_reply,
+)
 
-__all__ = ["welcomeAgents", "classifyExpenseAgent"]
+__all__ = [
+    "welcomeAgents",
+    "classifyExpenseAgent",
+    "ClassifyExpenseAgentOutputFormat",
+    "ClassifyExpenseBatchOutputFormat",
+    "format_expense_reply",
+    "format_expenses_reply",
+]
@@ -1,64 +1,71 @@
-"""Classify expense agent: extract amount, date, purpose and reply in user-friendly format."""
+"""Classify expense agent: extract amount, date, purpose as structured output; reply format for the user."""
 
-from agents import Agent, InputGuardrail, Runner, GuardrailFunctionOutput
+import random
+
+from agents import Agent
 from pydantic import BaseModel
 
-from llm.agents.config import APPLICATION_INSTRUCTION, MODEL_NAME
+from llm.agents.config import agent_instructions, agent_model
 
 # ---------------------------------------------------------------------------
 # Classify Expense Agent
 # ---------------------------------------------------------------------------
 
 CLASSIFY_EXPENSE_AGENT_NAME = "Classify Expense Agent"
-CLASSIFY_EXPENSE_AGENT_INSTRUCTIONS = (
-    f"Expense agent. Extract amount (number), date (YYYY-MM-DD), purpose (one word). Scope: {APPLICATION_INSTRUCTION}\n"
-    "Date: use 'Current date: YYYY-MM-DD' in context for today; yesterday = previous day. Never invent date.\n\n"
-    "Your reply to the user must be user-friendly and in two parts:\n"
-    "1. First, write one or two short, natural sentences acknowledging their expense (e.g. 'Got it, I've noted that.', 'Recorded! Here's what I saved.', 'Done! Here's the summary.'). Vary the wording each time.\n"
-    "2. Then show the spending as a clear list. Use exactly this format (WhatsApp bold is *text*):\n"
-    "   • Amount: *<value>*\n"
-    "   • Date: *<YYYY-MM-DD>*\n"
-    "   • Purpose: *<value>*\n"
-    "Output this full message as your reply—no raw key=value lines. Example for '300 for snacks today': "
-    "'Got it, I've noted that. 👍 Here's what I saved:\n• Amount: *300*\n• Date: *2026-02-15*\n• Purpose: *snacks*'"
+CLASSIFY_EXPENSE_AGENT_INSTRUCTIONS = agent_instructions(
+    "Role: expense extractor. One `expenses` item per spend, in message order, never merged or summed "
+    "('1800 shopping and 700 food' → 2). date: YYYY-MM-DD from Current date (yesterday = day before), never "
+    "invented. purpose: one word."
 )
 
+# Reply shown to the user for a recorded expense (WhatsApp bold is *text*).
+EXPENSE_ACKS = ["Got it, I've noted that.", "Recorded! Here's what I saved.", "Done! Here's the summary."]
 
-class ClassifyExpenseAgentOutputFormat(BaseModel):
-    amount: float
-    date: str  # YYYY-MM-DD
-    purpose: str
 
+def format_amount(amount: float) -> str:
+    return str(int(amount)) if amount == int(amount) else f"{amount:.2f}"
 
-class ClassifyExpenseGuardrailOutputFormat(BaseModel):
-    is_expense_entry: bool
-    reason: str = ""
 
+def format_expense_reply(expense: dict) -> str:
+    """Short varied acknowledgement, then the expense as a bulleted list."""
+    return (
+        f"{random.choice(EXPENSE_ACKS)} 👍\n"
+        f"• Amount: *{format_amount(expense['amount'])}*\n"
+        f"• Date: *{expense['date']}*\n"
+        f"• Purpose: *{expense['purpose']}*"
+    )
 
-CLASSIFY_EXPENSE_GUARDRAIL_INSTRUCTIONS = (
-    "Is this expense logging (user says they spent money + on what)? "
-    "Output: is_expense_entry (bool), reason (str). Greeting/weather/other → false."
-)
 
+NO_EXPENSE_REPLY = "I couldn't find an amount and purpose in that. Try something like '200 for bus today'."
 
-classifyExpenseInputGuardrailsAgent = Agent(
-    name="Expense guardrail: expense entry?",
-    instructions=CLASSIFY_EXPENSE_GUARDRAIL_INSTRUCTIONS,
-    model=MODEL_NAME,
-)
+
+def format_expenses_reply(expenses: list[dict]) -> str:
+    """One reply for all expenses of a message: one line per item plus the total."""
+    if not expenses:
+        return NO_EXPENSE_REPLY
+    if len(expenses) == 1:
+        return format_expense_reply(expenses[0])
+    lines = [f"{random.choice(EXPENSE_ACKS)} 👍"]
+    for e in expenses:
+        lines.append(f"• *{format_amount(e['amount'])}* for *{e['purpose']}* on *{e['date']}*")
+    lines.append(f"Total: *{format_amount(sum(e['amount'] for e in expenses))}*")
+    return "\n".join(lines)
+
+
+class ClassifyExpenseAgentOutputFormat(BaseModel):
+    amount: float
+    date: str  # YYYY-MM-DD
+    purpose: str
 
 
-async def classifyExpenseInputGuardrails(ctx, agent, input_data):
-    res = await Runner.run(classifyExpenseInputGuardrailsAgent, input_data, context=ctx)
-    out = res.final_output_as(ClassifyExpenseGuardrailOutputFormat)
-    block = not out.is_expense_entry
-    return GuardrailFunctionOutput(output_info=out, tripwire_triggered=block)
+class ClassifyExpenseBatchOutputFormat(BaseModel):
+    expenses: list[ClassifyExpenseAgentOutputFormat]
 
 
 classifyExpenseAgent = Agent(
     name=CLASSIFY_EXPENSE_AGENT_NAME,
     instructions=CLASSIFY_EXPENSE_AGENT_INSTRUCTIONS,
-    model=MODEL_NAME,
-    input_guardrails=[InputGuardrail(guardrail_function=classifyExpenseInputGuardrails)],
+    model=agent_model("classify_expense"),
+    output_type=ClassifyExpenseBatchOutputFormat,
     handoff_description="User logs expense: spent X on Y, bought Z.",
 )
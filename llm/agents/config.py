@@ -1,6 +1,50 @@
-"""Shared config for expense app agents (scope, model)."""
+"""Shared config for expense app agents (scope preamble, model, guardrail mode)."""
 
+import os
+
+from agents import InputGuardrail
+
+from llm.openai_client import AgentModel
+
+# Shared preamble: every agent's instructions start with these exact bytes (see agent_instructions), so requests
+# to different agents share a cacheable prompt prefix. Keep it free of per-request values.
 APPLICATION_INSTRUCTION = (
-    "Monthly expense app. User logs spends; you extract amount, date, purpose. Stay in scope."
+    "WhatsApp monthly expense app (greetings, logging spends); stay in scope. "
+    "Input: optional Profile name / Current date lines, then 'User: <message>'."
 )
 MODEL_NAME = "gpt-4o-mini"
+
+
+def agent_model(agent_key: str) -> AgentModel:
+    """MODEL_NAME on the shared OpenAI client, with the agent's timeout / retry settings (llm.openai_client)."""
+    return AgentModel(agent_key, MODEL_NAME)
+
+
+def agent_instructions(role: str) -> str:
+    """Static instructions for one agent: the shared preamble first, then the agent's role."""
+    return f"{APPLICATION_INSTRUCTION}\n\n{role}"
+
+# Input guardrail mode of the Application Agent (router) run. Guardrails only run for a run's starting agent, so the
+# scope check is attached to the router run (RunConfig.input_guardrails), not to the handoff targets.
+# - "parallel": optimistic; guardrail LLM call runs alongside the router, whose output is discarded if the tripwire fires.
+# - "blocking": guardrail finishes before the router's first LLM call (one extra serial round trip).
+# - "merged": no separate guardrail call; the router's structured output carries the scope verdict (RouterVerdict).
+GUARDRAIL_MODE_PARALLEL = "parallel"
+GUARDRAIL_MODE_BLOCKING = "blocking"
+GUARDRAIL_MODE_MERGED = "merged"
+GUARDRAIL_MODES = {
+    "router": os.environ.get("ROUTER_GUARDRAIL_MODE", GUARDRAIL_MODE_PARALLEL),
+}
+
+
+def input_guardrails_for(agent_key: str, guardrail_function) -> list[InputGuardrail]:
+    """Build a run's input_guardrails list according to GUARDRAIL_MODES[agent_key] (read per call)."""
+    mode = GUARDRAIL_MODES.get(agent_key, GUARDRAIL_MODE_PARALLEL)
+    if mode == GUARDRAIL_MODE_MERGED:
+        return []
+    return [
+        InputGuardrail(
+            guardrail_function=guardrail_function,
+            run_in_parallel=mode != GUARDRAIL_MODE_BLOCKING,
+        )
+    ]
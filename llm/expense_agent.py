@@ -1,9 +1,30 @@
 import os
-from agents import Agent, Runner
+import openai
+from agents import Agent, InputGuardrailTripwireTriggered, RunConfig, Runner
 
 from dotenv import load_dotenv
-from llm.agents import welcomeAgents, classifyExpenseAgent
-from llm.agents.config import APPLICATION_INSTRUCTION, MODEL_NAME
+from openai.types.responses import ResponseTextDeltaEvent
+from pydantic import BaseModel
+from llm.agents import (
+    ClassifyExpenseAgentOutputFormat,
+    ClassifyExpenseBatchOutputFormat,
+    classifyExpenseAgent,
+    format_expenses_reply,
+    welcomeAgents,
+)
+from llm.agents.config import (
+    GUARDRAIL_MODE_MERGED,
+    GUARDRAIL_MODES,
+    agent_instructions,
+    agent_model,
+    input_guardrails_for,
+)
+from llm.agents.welcome_agent import welcomeInputGuardrails
+from llm.fast_router import ROUTE_AGENT, FastPathResult, fast_route
+from llm.limiter import LLMUnavailable
+from llm.prompt import build_input
+from llm.response_cache import RESPONSE_CACHE_ENABLED, cache_key, response_cache
+from llm.run_context import HooksContext
 
 load_dotenv(override=True)
 ENV = os.environ.get("ENV", "")
@@ -12,30 +33,193 @@ ENV = os.environ.get("ENV", "")
 # Application Agent (router: handoffs to Welcome and ClassifyExpense)
 # ---------------------------------------------------------------------------
 
-applicationAgentInst = (
-    f"Router. Use handoff tools only. Do not answer in place of agents. Scope: {APPLICATION_INSTRUCTION}\n"
-    "Greeting (hi, hello) → Welcome Agent. Expense (spent X on Y) → Classify Expense Agent. "
-    "Out-of-scope → one short line: this app is for expenses; I can greet or log expenses."
+applicationAgentInst = agent_instructions(
+    "Role: router. Only call a handoff: greeting → Welcome Agent; spend → Classify Expense Agent. "
+    "Off-topic → one line: I can greet you or log expenses."
+)
+
+OUT_OF_SCOPE_REPLY = "This app is for expenses; I can greet you or log your expenses."
+ROUTE_GUARDRAIL_BLOCKED = "guardrail_blocked"
+# Sent when the LLM provider is throttling / down (breaker open, no call slot, provider error after retries).
+LLM_FALLBACK_REPLY = (
+    "Sorry, I'm a little overloaded right now and couldn't process that. Please send it again in a minute. 🙏"
 )
+ROUTE_LLM_FALLBACK = "llm_fallback"
+LLM_FALLBACK_RESULT = FastPathResult(final_output=LLM_FALLBACK_REPLY, route=ROUTE_LLM_FALLBACK)
 
 applicationAgent = Agent(
     name="Application Agent",
     instructions=applicationAgentInst,
-    model=MODEL_NAME,
+    model=agent_model("router"),
     handoffs=[welcomeAgents, classifyExpenseAgent],
 )
 
 
-async def run_application_agent(user_message: str, profile_name: str = ""):
-    """Run applicationAgent; returns Runner result. Prepends profile name and current date for LLM context."""
+class RouterVerdict(BaseModel):
+    in_scope: bool
+    reply: str
+
+
+# "merged" guardrail mode: the router either hands off or answers with its own scope verdict, so no separate
+# guardrail LLM call is made.
+applicationMergedAgent = applicationAgent.clone(
+    instructions=agent_instructions(
+        "Role: router. Greeting → Welcome Agent; spend → Classify Expense Agent. Anything else: no handoff, "
+        "in_scope = false and reply = one short polite line saying you can greet or log expenses."
+    ),
+    output_type=RouterVerdict,
+)
+
+
+def router_agent() -> Agent:
+    """The Application Agent for the configured router guardrail mode."""
+    if GUARDRAIL_MODES["router"] == GUARDRAIL_MODE_MERGED:
+        return applicationMergedAgent
+    return applicationAgent
+
+
+def router_run_config() -> RunConfig:
+    """Scope guardrail for the router run; input guardrails only run for the run's starting agent."""
+    return RunConfig(input_guardrails=input_guardrails_for("router", welcomeInputGuardrails))
+
+
+def _guardrail_blocked(e: InputGuardrailTripwireTriggered) -> FastPathResult:
+    """Optimistic guardrails: the agent's output is discarded and the user gets the guardrail's reason."""
+    info = e.guardrail_result.output.output_info
+    return FastPathResult(
+        final_output=getattr(info, "welcome_msg", "") or OUT_OF_SCOPE_REPLY,
+        route=ROUTE_GUARDRAIL_BLOCKED,
+    )
+
+
+def _router_verdict(runner):
+    """Merged mode: the router's own out-of-scope answer as a guardrail_blocked result, else the runner."""
+    out = getattr(runner, "final_output", None)
+    if isinstance(out, RouterVerdict):
+        text = out.reply or OUT_OF_SCOPE_REPLY
+        return FastPathResult(final_output=text, route=ROUTE_AGENT if out.in_scope else ROUTE_GUARDRAIL_BLOCKED)
+    return runner
+
+
+def _precomputed_result(user_message: str, profile_name: str, now, history: list[dict] | None):
+    """
+    Fast-path or cached result, else None. Returns (result, cache key); the key is "" when the reply must not be
+    cached. A message with history is answered in that context (e.g. "and 50 more for tea"), which the key does not
+    cover, so it bypasses the response cache both ways.
+    """
+    fast = fast_route(user_message, now.date(), profile_name=profile_name)
+    if fast is not None:
+        return fast, ""
+    if history:
+        return None, ""
+    key = cache_key(user_message, now.strftime("%Y-%m-%d"))
+    if RESPONSE_CACHE_ENABLED:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached, key
+    return None, key
+
+
+async def run_application_agent(
+    user_message: str,
+    profile_name: str = "",
+    history: list[dict] | None = None,
+    hooks=None,
+):
+    """
+    Answer greetings / simple expenses via the fast path, then the response cache (first messages only, no
+    history); otherwise run applicationAgent.
+    Returns a Runner result (or FastPathResult / CachedResult). Input is laid out by llm.prompt.build_input:
+    history (prior {role, content} items, already fitted to a token budget), then profile name and current date,
+    then the current message;
+    hooks are Agents SDK RunHooks (e.g. per-LLM-call metrics); they also see the scope guardrail's own LLM call.
+    Returns LLM_FALLBACK_RESULT when the provider is unavailable (llm.limiter breaker / limit, or API errors).
+    """
     from datetime import datetime
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    parts = [f"Current date: {today}"]
-    if profile_name and profile_name.strip():
-        parts.append(f"Profile name: {profile_name.strip()}")
-    parts.append(f"User: {user_message}")
-    input_with_context = "\n\n".join(parts)
-    return await Runner.run(applicationAgent, input_with_context)
+    now = datetime.utcnow()
+    result, key = _precomputed_result(user_message, profile_name, now, history)
+    if result is not None:
+        return result
+    agent_input = build_input(user_message, profile_name, now.strftime("%Y-%m-%d"), history)
+    try:
+        runner = await Runner.run(
+            router_agent(), agent_input, context=HooksContext(hooks), hooks=hooks, run_config=router_run_config()
+        )
+    except InputGuardrailTripwireTriggered as e:
+        return _guardrail_blocked(e)
+    except (LLMUnavailable, openai.APIError) as e:
+        print(f"LLM unavailable, sending fallback reply: {e}")
+        return LLM_FALLBACK_RESULT
+    result = _router_verdict(runner)
+    if RESPONSE_CACHE_ENABLED and key:
+        response_cache.put(key, runner, get_response_text(result), get_expenses(result))
+    return result
+
+
+async def run_application_agent_streamed(
+    user_message: str,
+    profile_name: str = "",
+    on_delta=None,
+    history: list[dict] | None = None,
+    hooks=None,
+):
+    """
+    Streamed variant of run_application_agent: awaits on_delta(text) for every output text chunk as the
+    model produces it, then returns the finished RunResultStreaming (final_output set).
+    Fast-path and cached results are returned at once without deltas; agents with structured output
+    (output_type: Classify Expense, Welcome) emit no deltas either, since their JSON is formatted only at the end, so
+    expense replies never get an early segment (webhook/streaming.py).
+    """
+    from datetime import datetime
+    now = datetime.utcnow()
+    result, key = _precomputed_result(user_message, profile_name, now, history)
+    if result is not None:
+        return result
+    agent_input = build_input(user_message, profile_name, now.strftime("%Y-%m-%d"), history)
+    try:
+        current_agent = router_agent()
+        runner = Runner.run_streamed(
+            current_agent, agent_input, context=HooksContext(hooks), hooks=hooks, run_config=router_run_config()
+        )
+        async for event in runner.stream_events():
+            if event.type == "agent_updated_stream_event":
+                current_agent = event.new_agent
+            elif (
+                on_delta is not None
+                and current_agent.output_type is None
+                and event.type == "raw_response_event"
+                and isinstance(event.data, ResponseTextDeltaEvent)
+            ):
+                await on_delta(event.data.delta)
+    except InputGuardrailTripwireTriggered as e:
+        return _guardrail_blocked(e)
+    except (LLMUnavailable, openai.APIError) as e:
+        print(f"LLM unavailable, sending fallback reply: {e}")
+        return LLM_FALLBACK_RESULT
+    result = _router_verdict(runner)
+    if RESPONSE_CACHE_ENABLED and key:
+        response_cache.put(key, runner, get_response_text(result), get_expenses(result))
+    return result
+
+
+def get_route(runner) -> str:
+    """Which path produced the result: fast_greeting / fast_expense / cache / guardrail_blocked / llm_fallback, or agent."""
+    return getattr(runner, "route", ROUTE_AGENT)
+
+
+def get_expenses(runner) -> list[dict]:
+    """Expenses ({amount, date, purpose}) extracted by the fast path or the Classify Expense Agent."""
+    if runner is None:
+        return []
+    expenses = getattr(runner, "expenses", None)
+    if expenses is not None:
+        return list(expenses)
+    out = getattr(runner, "final_output", None)
+    if isinstance(out, ClassifyExpenseBatchOutputFormat):
+        return [e.model_dump() for e in out.expenses]
+    if isinstance(out, ClassifyExpenseAgentOutputFormat):
+        return [out.model_dump()]
+    return []
 
 
 def get_response_text(runner) -> str:
@@ -43,6 +227,8 @@ def get_response_text(runner) -> str:
     if runner is None:
         return ""
     out = getattr(runner, "final_output", None)
+    if isinstance(out, (ClassifyExpenseBatchOutputFormat, ClassifyExpenseAgentOutputFormat)):
+        return format_expenses_reply(get_expenses(runner))
     if out is not None:
         return out if isinstance(out, str) else str(out)
     if hasattr(runner, "final_output") and callable(runner.final_output):
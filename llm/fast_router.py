@@ -0,0 +1,165 @@
+"""
+Deterministic pre-router: answers greetings and well-formed "amount for purpose [date]" expenses
+without calling the agent graph (router + guardrail + target agent = 3+ LLM calls), and recognises
+monthly-summary questions, which are answered from the expense rollups (webhook/expenses.py).
+Anything that does not match exactly goes to the agent graph.
+"""
+import os
+import random
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from llm.agents import format_expense_reply
+
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "1") == "1"
+
+ROUTE_GREETING = "fast_greeting"
+ROUTE_EXPENSE = "fast_expense"
+ROUTE_SUMMARY = "fast_summary"
+ROUTE_AGENT = "agent"
+
+# LLM calls the agent graph makes for a greeting or single expense (router, guardrail, target agent).
+AGENT_GRAPH_LLM_CALLS = 3
+
+_GREETING_RE = re.compile(
+    r"^(?:hi+|hello+|hey+|hola|namaste|good\s+(?:morning|afternoon|evening))(?:\s+there)?[\s!.,👋🙂😊]*$",
+    re.IGNORECASE,
+)
+_AMOUNT = r"(?P<currency>rs\.?|inr|₹)?\s*(?P<amount>\d+(?:\.\d{1,2})?)\s*(?P<unit>rs\.?|rupees|inr|₹)?"
+_PURPOSE = r"(?P<purpose>[a-z]+)"
+_DATE = r"(?:\s+(?P<date>today|yesterday|\d{4}-\d{2}-\d{2}))?"
+# "200 for bus", "spent 200 on bus yesterday", "rs 150 for tea 2026-03-01"
+_AMOUNT_FOR_PURPOSE_RE = re.compile(rf"^(?:spent\s+)?{_AMOUNT}\s+(?:for|on)\s+{_PURPOSE}{_DATE}[\s.!]*$", re.IGNORECASE)
+# "bus 200", "tea 50 today", "paid auto ₹80": "<word> <number>" is also "call 911" or "room 204", so this form
+# needs a currency marker, a spend verb or a purpose from _KNOWN_PURPOSES.
+_PURPOSE_AMOUNT_RE = re.compile(rf"^(?:(?P<verb>spent|paid)\s+(?:for\s+)?)?{_PURPOSE}\s+{_AMOUNT}{_DATE}[\s.!]*$", re.IGNORECASE)
+_EXPENSE_RES = [_AMOUNT_FOR_PURPOSE_RE, _PURPOSE_AMOUNT_RE]
+_KNOWN_PURPOSES = {
+    "auto", "bike", "breakfast", "bus", "cab", "chai", "clothes", "coffee", "dinner", "electricity", "food",
+    "fruits", "fuel", "gas", "groceries", "grocery", "gym", "internet", "juice", "lunch", "medicine", "metro",
+    "milk", "movie", "parking", "petrol", "recharge", "rent", "salon", "shopping", "snacks", "taxi", "tea",
+    "ticket", "toll", "train", "uber", "vegetables", "water",
+}
+_SUMMARY_RE = re.compile(
+    r"^(?:how much (?:did|have) i (?:spend|spent)|what did i spend|(?:show )?(?:my )?(?:monthly|month) (?:summary|total)|total (?:spend|spent|expenses?))\b(?P<rest>.*)$",
+    re.IGNORECASE,
+)
+# What may follow the summary opener: this / last month, with an optional purpose before or after it. Any other period
+# ("yesterday", "in the first week") is not a month rollup and goes to the agent.
+_SUMMARY_REST_RE = re.compile(
+    r"^(?:(?:on|for)\s+(?:the\s+)?(?P<purpose>[a-z]+)\s+)?(?:(?:in|for|during)\s+)?(?P<period>this|last)\s+month"
+    r"(?:\s+(?:on|for)\s+(?:the\s+)?(?P<purpose_after>[a-z]+))?$",
+    re.IGNORECASE,
+)
+_NOT_PURPOSE = {"spent", "paid", "today", "yesterday", "for", "on", "rs", "inr", "rupees"}
+
+_GREETING_OPENERS = ["Hey", "Hi", "Hello there", "Hey there"]
+_GREETING_BODIES = [
+    "Ready to log an expense? Just send something like '200 for bus'.",
+    "Tell me what you spent and on what, and I'll note it down.",
+    "Good to see you! Send me your spends anytime, e.g. '150 for lunch today'.",
+]
+_GREETING_EMOJIS = ["👋", "😊", "🙌", "✨", "👍"]
+
+_route_counts = {ROUTE_GREETING: 0, ROUTE_EXPENSE: 0, ROUTE_SUMMARY: 0, ROUTE_AGENT: 0}
+
+
+@dataclass(slots=True)
+class FastPathResult:
+    """Stand-in for the agent RunResult: get_response_text reads final_output."""
+
+    final_output: str
+    route: str
+    expenses: list[dict] = field(default_factory=list)
+
+
+def _resolve_date(value: str | None, today: date) -> str | None:
+    if not value or value.lower() == "today":
+        return today.isoformat()
+    if value.lower() == "yesterday":
+        return (today - timedelta(days=1)).isoformat()
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        return None
+
+
+def match_expense(text: str, today: date) -> dict | None:
+    """Return {amount, date, purpose} for a single well-formed expense, else None."""
+    for pattern in _EXPENSE_RES:
+        m = pattern.match(text)
+        if not m:
+            continue
+        purpose = m.group("purpose").lower()
+        amount = float(m.group("amount"))
+        expense_date = _resolve_date(m.group("date"), today)
+        if purpose in _NOT_PURPOSE or amount <= 0 or expense_date is None:
+            return None
+        if pattern is _PURPOSE_AMOUNT_RE and not (
+            m.group("currency") or m.group("unit") or m.group("verb") or purpose in _KNOWN_PURPOSES
+        ):
+            return None
+        return {"amount": amount, "date": expense_date, "purpose": purpose}
+    return None
+
+
+def match_summary_query(text: str, today: date) -> dict | None:
+    """
+    'how much did I spend this month on food' -> {month: first day of month, purpose or None}; else None.
+    Only this-month / last-month questions (a bare 'monthly summary' means this month) are answered from the rollup.
+    """
+    m = _SUMMARY_RE.match(" ".join((text or "").split()).rstrip("?!. "))
+    if not m:
+        return None
+    rest = m.group("rest").strip().lower()
+    if not rest and "month" in m.group(0).lower():
+        return {"month": today.replace(day=1), "purpose": None}
+    period = _SUMMARY_REST_RE.match(rest)
+    if not period:
+        return None
+    month = today.replace(day=1)
+    if period.group("period") == "last":
+        month = (month - timedelta(days=1)).replace(day=1)
+    purpose = period.group("purpose") or period.group("purpose_after")
+    if purpose in _NOT_PURPOSE or purpose in ("this", "last", "month"):
+        return None
+    return {"month": month, "purpose": purpose}
+
+
+def is_self_contained(text: str, today: date) -> bool:
+    """True for a message answered on its own (greeting, simple expense, month summary): never coalesced with others."""
+    text = " ".join((text or "").split())
+    return bool(_GREETING_RE.match(text) or match_expense(text, today) or match_summary_query(text, today))
+
+
+def greeting_reply(profile_name: str = "") -> str:
+    name = f" {profile_name.strip()}" if profile_name and profile_name.strip() else ""
+    return f"{random.choice(_GREETING_OPENERS)}{name}! {random.choice(_GREETING_EMOJIS)} {random.choice(_GREETING_BODIES)}"
+
+
+def fast_route(user_message: str, today: date, profile_name: str = "") -> FastPathResult | None:
+    """Answer greetings / simple expenses locally; None means send to the agent graph."""
+    if not FAST_PATH_ENABLED:
+        _route_counts[ROUTE_AGENT] += 1
+        return None
+    text = " ".join((user_message or "").split())
+    if _GREETING_RE.match(text):
+        _route_counts[ROUTE_GREETING] += 1
+        return FastPathResult(final_output=greeting_reply(profile_name), route=ROUTE_GREETING)
+    expense = match_expense(text, today)
+    if expense:
+        _route_counts[ROUTE_EXPENSE] += 1
+        return FastPathResult(final_output=format_expense_reply(expense), route=ROUTE_EXPENSE, expenses=[expense])
+    _route_counts[ROUTE_AGENT] += 1
+    return None
+
+
+def count_route(route: str) -> None:
+    _route_counts[route] = _route_counts.get(route, 0) + 1
+
+
+def route_stats() -> dict:
+    """Messages per route and the LLM calls the fast path avoided."""
+    fast = _route_counts[ROUTE_GREETING] + _route_counts[ROUTE_EXPENSE] + _route_counts[ROUTE_SUMMARY]
+    return {**_route_counts, "llm_calls_saved": fast * AGENT_GRAPH_LLM_CALLS}
@@ -0,0 +1,177 @@
+"""
+Adaptive concurrency limit and circuit breaker shared by every LLM call (see AgentModel in llm.openai_client).
+- AdaptiveLimiter (AIMD): the limit grows by ~1 per limit's worth of healthy calls and halves on a 429 / timeout /
+  5xx or a call slower than LLM_LATENCY_TARGET, so under throttling fewer calls pile onto the provider at once.
+  Callers wait for a slot at most LLM_ACQUIRE_TIMEOUT seconds.
+- CircuitBreaker: after LLM_BREAKER_FAILURES consecutive provider failures it opens and calls fail immediately
+  with LLMUnavailable; after LLM_BREAKER_RESET seconds one probe call is let through (half-open) to close it again.
+Callers turn LLMUnavailable into a precomputed fallback reply instead of leaving the user without an answer.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import openai
+
+LLM_LIMITER_ENABLED = os.environ.get("LLM_LIMITER_ENABLED", "1") == "1"
+LLM_CONCURRENCY_INITIAL = int(os.environ.get("LLM_CONCURRENCY_INITIAL", 16))
+LLM_CONCURRENCY_MIN = int(os.environ.get("LLM_CONCURRENCY_MIN", 1))
+LLM_CONCURRENCY_MAX = int(os.environ.get("LLM_CONCURRENCY_MAX", 64))
+LLM_LATENCY_TARGET = float(os.environ.get("LLM_LATENCY_TARGET", 8))
+LLM_ACQUIRE_TIMEOUT = float(os.environ.get("LLM_ACQUIRE_TIMEOUT", 30))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", 30))
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class LLMUnavailable(Exception):
+    """The provider is considered unhealthy (breaker open) or no call slot freed up in time."""
+
+
+def is_overload(error: BaseException) -> bool:
+    """Errors that mean the provider is throttling or unhealthy (as opposed to a bad request)."""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: additive increase on healthy calls, multiplicative decrease on overload."""
+
+    def __init__(
+        self,
+        initial: int = LLM_CONCURRENCY_INITIAL,
+        min_limit: int = LLM_CONCURRENCY_MIN,
+        max_limit: int = LLM_CONCURRENCY_MAX,
+        latency_target: float = LLM_LATENCY_TARGET,
+        decrease_factor: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        self.last_decrease = 0.0
+        self.decreases = 0
+        self.timeouts = 0
+
+    async def acquire(self, timeout: float = LLM_ACQUIRE_TIMEOUT) -> None:
+        async with self.condition:
+            try:
+                await asyncio.wait_for(self.condition.wait_for(lambda: self.in_flight < int(self.limit)), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise LLMUnavailable(f"no LLM call slot within {timeout}s (limit={int(self.limit)})") from None
+            self.in_flight += 1
+
+    async def release(self, latency: float, overloaded: bool) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded or latency > self.latency_target:
+                # At most one decrease per latency window: calls already in flight report the same congestion.
+                if now - self.last_decrease >= min(latency, self.latency_target):
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "decreases": self.decreases,
+            "acquire_timeouts": self.timeouts,
+        }
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open (fail fast) → half-open (one probe) → closed."""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = BREAKER_HALF_OPEN
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, ok: bool) -> None:
+        self.probing = False
+        if ok:
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != BREAKER_OPEN:
+                self.opened += 1
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+
+class LLMGuard:
+    """Breaker check + limiter slot around one LLM call; the call's outcome feeds both."""
+
+    def __init__(self, limiter: AdaptiveLimiter | None = None, breaker: CircuitBreaker | None = None):
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+
+    @asynccontextmanager
+    async def call(self):
+        if not LLM_LIMITER_ENABLED:
+            yield
+            return
+        if not self.breaker.allow():
+            raise LLMUnavailable("LLM circuit breaker is open")
+        try:
+            await self.limiter.acquire()
+        except LLMUnavailable:
+            self.breaker.probing = False
+            raise
+        started = time.monotonic()
+        outcome = True  # True: healthy, False: overload, None: cancelled (no verdict)
+        try:
+            yield
+        except asyncio.CancelledError:
+            outcome = None
+            raise
+        except BaseException as e:
+            outcome = not is_overload(e)
+            raise
+        finally:
+            await self.limiter.release(time.monotonic() - started, overloaded=outcome is False)
+            if outcome is None:
+                self.breaker.probing = False
+            else:
+                self.breaker.record(ok=outcome)
+
+    def stats(self) -> dict:
+        return {"limiter": self.limiter.stats(), "breaker": self.breaker.stats()}
+
+
+llm_guard = LLMGuard()
@@ -0,0 +1,116 @@
+"""
+Per-conversation memory for the agent graph.
+- Recent sessions live in an in-process LRU; a miss loads the last MEMORY_MAX_MESSAGES messages from the store.
+  max_sessions=0 turns the LRU off, so every history() loads from the store (several processes share a conversation).
+- history() fits the messages to MEMORY_TOKEN_BUDGET (newest kept, oldest dropped, long messages clipped),
+  so prompt size stays bounded however long the conversation grows.
+"""
+import os
+from collections import OrderedDict, deque
+
+MEMORY_ENABLED = os.environ.get("MEMORY_ENABLED", "1") == "1"
+MEMORY_MAX_SESSIONS = int(os.environ.get("MEMORY_MAX_SESSIONS", 2000))
+MEMORY_MAX_MESSAGES = int(os.environ.get("MEMORY_MAX_MESSAGES", 10))
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", 600))
+
+# Rough tokenizer-free estimate (~4 chars/token for English) plus per-message framing overhead.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def fit_to_budget(messages: list[tuple[str, str]], budget: int) -> list[dict]:
+    """Newest-first fill of (role, text) messages into budget tokens; returns chronological input items."""
+    items = []
+    used = 0
+    max_chars = max(0, (budget // 2 - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN)
+    for role, text in reversed(messages):
+        if len(text) > max_chars:
+            text = text[:max_chars].rstrip() + "…"
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            break
+        used += cost
+        items.append({"role": role, "content": text})
+    items.reverse()
+    return items
+
+
+class ConversationMemory:
+    """
+    LRU of conversation key -> recent (role, text) messages.
+    loader(key) -> list[(role, text)] fetches chronological history from the store on a cache miss.
+    """
+
+    def __init__(
+        self,
+        loader=None,
+        max_sessions: int = MEMORY_MAX_SESSIONS,
+        max_messages: int = MEMORY_MAX_MESSAGES,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+    ):
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.sessions: OrderedDict[object, deque] = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+        self.requests = 0
+        self.history_tokens_total = 0
+        self.input_tokens_total = 0
+        self.input_tokens_max = 0
+
+    async def _session(self, key) -> deque:
+        session = self.sessions.get(key)
+        if session is not None:
+            self.hits += 1
+            self.sessions.move_to_end(key)
+            return session
+        loaded = []
+        if self.loader is not None:
+            self.loads += 1
+            try:
+                loaded = await self.loader(key)
+            except Exception as e:
+                print(f"Conversation memory load failed: {e}")
+        session = deque(loaded[-self.max_messages:], maxlen=self.max_messages)
+        self.sessions[key] = session
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return session
+
+    async def history(self, key) -> list[dict]:
+        """Prior messages as Runner input items ({role, content}), within the token budget."""
+        return fit_to_budget(list(await self._session(key)), self.token_budget)
+
+    async def append(self, key, user_text: str, reply: str) -> None:
+        """Add a turn to the cached session; without one, the next history() loads the turn from the store."""
+        session = self.sessions.get(key)
+        if session is None:
+            return
+        session.append(("user", user_text))
+        session.append(("assistant", reply))
+
+    def record_request(self, history: list[dict], runner) -> None:
+        """Track history tokens sent and LLM input tokens billed for one request."""
+        usage = getattr(getattr(runner, "context_wrapper", None), "usage", None)
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        self.requests += 1
+        self.history_tokens_total += sum(estimate_tokens(item["content"]) for item in history)
+        self.input_tokens_total += input_tokens
+        self.input_tokens_max = max(self.input_tokens_max, input_tokens)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "hits": self.hits,
+            "loads": self.loads,
+            "requests": self.requests,
+            "history_tokens_avg": round(self.history_tokens_total / self.requests, 1) if self.requests else 0.0,
+            "input_tokens_avg": round(self.input_tokens_total / self.requests, 1) if self.requests else 0.0,
+            "input_tokens_max": self.input_tokens_max,
+        }
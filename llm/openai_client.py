@@ -0,0 +1,130 @@
+"""
+Shared OpenAI client and model provider for every agent (llm/agents, llm/expense_agent, app.py).
+- One AsyncOpenAI client over a pooled httpx client (keep-alive, optional HTTP/2) lives for the app lifetime;
+  open/close it from the FastAPI lifespan. Agents get per-agent timeout / retry copies that share its pool.
+- Agents are built with model=AgentModel(key, name): the model is resolved per call, so the client opened at startup
+  (or a provider injected with set_model_provider, e.g. a benchmark fake) is used without rebuilding agents.
+- Every call goes through llm_guard (llm.limiter): adaptive concurrency limit plus circuit breaker.
+"""
+import os
+
+import httpx
+from agents import OpenAIResponsesModel, set_default_openai_client
+from agents.models.interface import Model
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from llm.limiter import llm_guard
+
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None  # e.g. a local fake server for load tests
+OPENAI_HTTP2 = os.environ.get("OPENAI_HTTP2", "1") == "1"
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", 100))
+OPENAI_MAX_KEEPALIVE = int(os.environ.get("OPENAI_MAX_KEEPALIVE", 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", 30))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", 5))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 20))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+
+# Per-agent (timeout seconds, max retries); override with LLM_TIMEOUT_<KEY> / LLM_MAX_RETRIES_<KEY>.
+# Guardrails and the router are short classification calls, so they fail fast.
+AGENT_LLM_DEFAULTS = {
+    "router": (10.0, 1),
+    "welcome": (LLM_TIMEOUT, LLM_MAX_RETRIES),
+    "welcome_guardrail": (10.0, 1),
+    "classify_expense": (LLM_TIMEOUT, LLM_MAX_RETRIES),
+    "visitor": (LLM_TIMEOUT, LLM_MAX_RETRIES),
+    "visitor_guardrail": (10.0, 1),
+}
+
+_client: AsyncOpenAI | None = None
+_provider = None  # callable (agent_key, model_name) -> Model, or None for the shared OpenAI client
+_models: dict[tuple[str, str], Model] = {}  # (agent_key, model_name) -> model built from the current client
+
+
+def agent_llm_settings(agent_key: str) -> tuple[float, int]:
+    """(timeout, max_retries) for one agent's LLM calls."""
+    timeout, retries = AGENT_LLM_DEFAULTS.get(agent_key, (LLM_TIMEOUT, LLM_MAX_RETRIES))
+    suffix = agent_key.upper()
+    return (
+        float(os.environ.get(f"LLM_TIMEOUT_{suffix}", timeout)),
+        int(os.environ.get(f"LLM_MAX_RETRIES_{suffix}", retries)),
+    )
+
+
+def open_openai_client(**kwargs) -> AsyncOpenAI:
+    """Create the shared client once (startup, or lazily on first LLM call); keeps an already injected client."""
+    global _client
+    if _client is None:
+        http_client = DefaultAsyncHttpxClient(
+            http2=OPENAI_HTTP2,
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        )
+        kwargs.setdefault("base_url", OPENAI_BASE_URL)
+        _client = AsyncOpenAI(http_client=http_client, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, **kwargs)
+        set_default_openai_client(_client, use_for_tracing=False)
+        _models.clear()
+    return _client
+
+
+def get_openai_client() -> AsyncOpenAI | None:
+    return _client
+
+
+def set_openai_client(client: AsyncOpenAI | None) -> None:
+    global _client
+    _client = client
+    if client is not None:
+        set_default_openai_client(client, use_for_tracing=False)
+    _models.clear()
+
+
+async def close_openai_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _models.clear()
+
+
+def set_model_provider(provider) -> None:
+    """Route every agent's calls to provider(agent_key, model_name) -> Model (None restores the shared client)."""
+    global _provider
+    _provider = provider
+    _models.clear()
+
+
+def _resolve(agent_key: str, model_name: str) -> Model:
+    model = _models.get((agent_key, model_name))
+    if model is None:
+        if _provider is not None:
+            model = _provider(agent_key, model_name)
+        else:
+            timeout, retries = agent_llm_settings(agent_key)
+            client = open_openai_client().with_options(timeout=timeout, max_retries=retries)
+            model = OpenAIResponsesModel(model=model_name, openai_client=client)
+        _models[(agent_key, model_name)] = model
+    return model
+
+
+class AgentModel(Model):
+    """
+    An agent's model: delegates each call to the model resolved for (agent_key, model_name) at call time,
+    inside llm_guard (raises LLMUnavailable when the breaker is open or no call slot frees up).
+    """
+
+    def __init__(self, agent_key: str, model_name: str):
+        self.agent_key = agent_key
+        self.model_name = model_name
+
+    async def get_response(self, *args, **kwargs):
+        async with llm_guard.call():
+            return await _resolve(self.agent_key, self.model_name).get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs):
+        async with llm_guard.call():
+            async for event in _resolve(self.agent_key, self.model_name).stream_response(*args, **kwargs):
+                yield event
@@ -0,0 +1,98 @@
+"""
+Prompt assembly for the agent graph, ordered from static to volatile so provider-side prefix caching reuses as
+much of each request as possible:
+  instructions (shared preamble first) → handoff / output schemas → conversation history → context → user message.
+- Agent instructions are constant strings (no dates, names or ids), so static_prefix(agent) is byte-identical
+  across requests; per-request context (profile name, then date) only appears in the final input item.
+- segment_tokens() estimates each segment's size per LLM call; MetricsRunHooks records it next to the provider's
+  cached-token counts, so the cache hit rate can be read from /metrics.
+"""
+import json
+
+from agents import Agent
+from agents.agent_output import AgentOutputSchema
+from agents.handoffs import handoff
+
+from llm.memory import estimate_tokens
+
+USER_MARKER = "User: "
+
+_static_cache: dict[int, tuple[str, str]] = {}  # id(agent) -> (instructions, serialized tool schemas)
+
+
+def context_block(profile_name: str, today: str) -> str:
+    """Per-request context, least volatile first: profile name (per user), then current date (per day)."""
+    parts = []
+    if profile_name and profile_name.strip():
+        parts.append(f"Profile name: {profile_name.strip()}")
+    parts.append(f"Current date: {today}")
+    return "\n".join(parts)
+
+
+def build_input(user_message: str, profile_name: str, today: str, history: list[dict] | None = None):
+    """Runner input: prior conversation items (append-only, cache-friendly), then context + the current message."""
+    current = f"{context_block(profile_name, today)}\n\n{USER_MARKER}{user_message}"
+    if not history:
+        return current
+    return [*history, {"role": "user", "content": current}]
+
+
+def tool_schemas(agent: Agent) -> list[dict]:
+    """Handoff tools and structured-output schema the SDK sends with every call to agent, in a stable order."""
+    schemas = []
+    for target in agent.handoffs:
+        h = handoff(target) if isinstance(target, Agent) else target
+        schemas.append({"name": h.tool_name, "description": h.tool_description, "parameters": h.input_json_schema})
+    if agent.output_type is not None and agent.output_type is not str:
+        schemas.append({"output": AgentOutputSchema(agent.output_type).json_schema()})
+    return schemas
+
+
+def _static_parts(agent: Agent) -> tuple[str, str]:
+    parts = _static_cache.get(id(agent))
+    if parts is None:
+        instructions = agent.instructions if isinstance(agent.instructions, str) else ""
+        parts = _static_cache[id(agent)] = (instructions, json.dumps(tool_schemas(agent), sort_keys=True))
+    return parts
+
+
+def static_prefix(agent: Agent) -> str:
+    """Instructions plus tool/output schemas: the part of every request to agent that must never vary."""
+    instructions, tools = _static_parts(agent)
+    return f"{instructions}\n{tools}"
+
+
+def _content_text(item) -> str:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        content = item.get("content")
+        return content if isinstance(content, str) else json.dumps(item, default=str)
+    return json.dumps(item, default=str)
+
+
+def _role(item) -> str | None:
+    return item.get("role") if isinstance(item, dict) else getattr(item, "role", None)
+
+
+def segment_tokens(agent: Agent, system_prompt: str | None, input_items) -> dict[str, int]:
+    """
+    Estimated tokens per prompt segment of one LLM call: instructions, tools, history (every item but the last
+    user message, including earlier agents' handoff items), context and user.
+    """
+    items = [input_items] if isinstance(input_items, str) else list(input_items or [])
+    last_user = next(
+        (i for i in range(len(items) - 1, -1, -1) if isinstance(items[i], str) or _role(items[i]) == "user"), None
+    )
+    current = _content_text(items[last_user]) if last_user is not None else ""
+    context, marker, user = current.rpartition(USER_MARKER)
+    if not marker:
+        context, user = "", current
+    instructions, tools = _static_parts(agent)
+    return {
+        "instructions": estimate_tokens(system_prompt if system_prompt is not None else instructions),
+        "tools": estimate_tokens(tools),
+        "history": sum(estimate_tokens(_content_text(item)) for i, item in enumerate(items) if i != last_user),
+        "context": estimate_tokens(context.strip()) if context.strip() else 0,
+        "user": estimate_tokens(user),
+    }
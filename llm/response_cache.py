@@ -0,0 +1,121 @@
+"""
+Response cache around run_application_agent.
+- Key: routing decision, then normalized user text. The route is decided before the agent graph runs (route_for):
+  expense-like text (amounts, relative dates) is keyed on today's date as well, other text is not.
+- Only replies whose final agent is in RESPONSE_CACHE_AGENTS are stored (Welcome Agent varies wording on purpose),
+  and an extraction reply (dates resolved from Current date) only under an expense route key.
+- Bounded: TTL + LRU eviction. stats() reports hit rate and estimated tokens saved.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 5000))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+RESPONSE_CACHE_AGENTS = {
+    name.strip()
+    for name in os.environ.get("RESPONSE_CACHE_AGENTS", "Application Agent,Classify Expense Agent").split(",")
+    if name.strip()
+}
+
+ROUTE_CACHE = "cache"
+CACHE_ROUTE_EXPENSE = "expense"
+CACHE_ROUTE_CHAT = "chat"
+# Final agents whose replies depend on Current date, so they are cached only under a date-keyed expense route.
+DATE_DEPENDENT_AGENTS = {"Classify Expense Agent"}
+
+# Relative dates and amounts make a reply depend on "Current date".
+_DATE_SENSITIVE_RE = re.compile(
+    r"\d|\b(?:today|yesterday|tomorrow|tonight|last|this|next|week|month|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE,
+)
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+@dataclass(slots=True)
+class CachedResult:
+    """Stand-in for the agent RunResult on a cache hit: get_response_text reads final_output."""
+
+    final_output: str
+    agent_name: str
+    route: str = ROUTE_CACHE
+    expenses: list[dict] = field(default_factory=list)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", (text or "").lower()).split())
+
+
+def route_for(text: str) -> str:
+    """Routing decision for normalized text: expense-like (reply depends on Current date) or chat."""
+    return CACHE_ROUTE_EXPENSE if _DATE_SENSITIVE_RE.search(text) else CACHE_ROUTE_CHAT
+
+
+def cache_key(user_message: str, today: str) -> str:
+    text = normalize_text(user_message)
+    route = route_for(text)
+    return f"{route}|{today}|{text}" if route == CACHE_ROUTE_EXPENSE else f"{route}|{text}"
+
+
+def run_tokens(runner) -> int:
+    """Total tokens spent by an agent run (0 if usage is unavailable)."""
+    usage = getattr(getattr(runner, "context_wrapper", None), "usage", None)
+    return getattr(usage, "total_tokens", 0) or 0
+
+
+class ResponseCache:
+    """TTL/LRU map of cache key -> (reply, agent name, tokens the run cost, extracted expenses)."""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL, agents: set[str] = RESPONSE_CACHE_AGENTS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.agents = agents
+        self.entries: OrderedDict[str, tuple[float, str, str, int, list[dict]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.hits_by_route: dict[str, int] = {}
+
+    def get(self, key: str) -> CachedResult | None:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        _, reply, agent_name, tokens, expenses = entry
+        self.hits += 1
+        route = key.split("|", 1)[0]
+        self.hits_by_route[route] = self.hits_by_route.get(route, 0) + 1
+        self.tokens_saved += tokens
+        return CachedResult(final_output=reply, agent_name=agent_name, expenses=[dict(e) for e in expenses])
+
+    def put(self, key: str, runner, reply: str, expenses: list[dict] | None = None) -> None:
+        """Store the run's reply text (and extracted expenses) if its final agent is cacheable."""
+        agent_name = getattr(getattr(runner, "last_agent", None), "name", "")
+        if agent_name not in self.agents or not reply:
+            return
+        if agent_name in DATE_DEPENDENT_AGENTS and not key.startswith(f"{CACHE_ROUTE_EXPENSE}|"):
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, reply, agent_name, run_tokens(runner), list(expenses or []))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "hits_by_route": dict(self.hits_by_route),
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+response_cache = ResponseCache()
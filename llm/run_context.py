@@ -0,0 +1,16 @@
+"""Run context shared by an agent run and the runs its guardrails start for their own agents."""
+from dataclasses import dataclass
+
+from agents import RunHooks
+
+
+@dataclass
+class HooksContext:
+    """Runner.run context carrying the run's hooks, so a guardrail agent's nested run reports to the same hooks."""
+
+    hooks: RunHooks | None = None
+
+
+def nested_run_kwargs(ctx) -> dict:
+    """Runner.run context / hooks for a run started inside a guardrail (ctx: its RunContextWrapper)."""
+    return {"context": ctx.context, "hooks": getattr(ctx.context, "hooks", None)}
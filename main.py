@@ -1,40 +1,126 @@
 """
 Simple webhook listener for WhatsApp (or similar) API.
 - GET: verification (hub.mode, hub.challenge, hub.verify_token)
-- POST: receive events, log body, respond 200
+- POST: verify the signature, enqueue the raw body for background workers, respond 200
+  (401 on a bad signature, 503 when the queue is full). With JOB_BACKEND=postgres the messages are stored as
+  webhook_jobs rows instead and run by worker.py processes (503 when the insert fails).
 """
-import json
+import asyncio
 import os
+import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 from datetime import timezone
 
-import httpx
-from supabase import Client, create_client
-from llm.expense_agent import get_response_text, run_application_agent
-from fastapi import BackgroundTasks, FastAPI, Request
-from fastapi.responses import PlainTextResponse
-
-app = FastAPI(title="Webhook LLM", description="Webhook listener for WhatsApp API", version="1.0.0")
+from llm.expense_agent import (
+    LLM_FALLBACK_REPLY,
+    ROUTE_LLM_FALLBACK,
+    get_expenses,
+    get_response_text,
+    get_route,
+    run_application_agent,
+    run_application_agent_streamed,
+)
+from llm.fast_router import (
+    ROUTE_SUMMARY,
+    FastPathResult,
+    count_route,
+    is_self_contained,
+    match_summary_query,
+    route_stats,
+)
+from llm.limiter import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, llm_guard
+from llm.memory import MEMORY_ENABLED, MEMORY_MAX_SESSIONS, ConversationMemory
+from llm.openai_client import close_openai_client, open_openai_client
+from llm.response_cache import response_cache
+from fastapi import FastAPI, Request, status
+from fastapi.responses import PlainTextResponse, Response
+from webhook.coalesce import Coalescer
+from webhook.conversation_log import last_messages, run_partition_maintenance, turn_rows
+from webhook.dedup import DedupCache, open_shared_cache, run_dedup_purge
+from webhook.expenses import format_summary, monthly_summary, normalize_expenses, record_expenses
+from webhook.graph_api import close_graph_client, get_graph_client, may_have_been_sent, open_graph_client
+from webhook.jobs import JobQueue
+from webhook.outbox import OUTBOX_ENABLED, OUTBOX_TABLE, STATUS_PENDING, Outbox
+from webhook.pg_jobs import JOB_BACKEND, enqueue_messages
+from webhook.metrics import (
+    COALESCED,
+    FIRST_MESSAGE_SECONDS,
+    MESSAGES,
+    MetricsRunHooks,
+    debug_payload,
+    registry,
+    span,
+)
+from webhook.parser import InboundMessage, ParsedWebhook, parse_webhook_bytes
+from webhook.signature import SIGNATURE_HEADER, WEBHOOK_SIGNATURE_OPTIONAL, WHATSAPP_APP_SECRET, verify_signature
+from webhook.storage import close_store, get_store, open_store
+from webhook.streaming import STREAMING_ENABLED, StreamingReply
+from webhook.write_behind import WRITE_BEHIND_ENABLED, WriteBehindBuffer
 
 PORT = int(os.environ.get("PORT", 3000))
 VERIFY_TOKEN = os.environ.get("VERIFY_TOKEN", "")
 WHATSAPP_ACCESS_TOKEN = VERIFY_TOKEN
-GRAPH_API_BASE = "https://graph.facebook.com/v22.0"
+ACK_OK = b'{"ok":true}'
+ACK_REJECTED = b'{"ok":false}'
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase: Client | None = None
-SUPABASE_CONNECTED = False
 
-try:
-    if SUPABASE_URL and SUPABASE_KEY:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        SUPABASE_CONNECTED = True
-except Exception as e:
-    print(f"Supabase client init failed: {e}")
-    supabase = None
-    SUPABASE_CONNECTED = False
+job_queue = JobQueue()
+llm_hooks = MetricsRunHooks()
+dedup_cache = DedupCache()
+shared_dedup = None  # optional cross-pod tier (REDIS_URL), opened in lifespan
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open storage, Graph API and OpenAI clients and job workers at startup; drain and close them on shutdown."""
+    global shared_dedup
+    store = await open_store(SUPABASE_URL, SUPABASE_KEY)
+    print(f"Supabase DB connection established: {store is not None}")
+    if not WHATSAPP_APP_SECRET:
+        if WEBHOOK_SIGNATURE_OPTIONAL:
+            print("WHATSAPP_APP_SECRET not set; WEBHOOK_SIGNATURE_OPTIONAL=1, so unsigned webhooks are accepted.")
+        else:
+            print("WHATSAPP_APP_SECRET not set; webhook POSTs are rejected unless WEBHOOK_SIGNATURE_OPTIONAL=1.")
+    if JOB_BACKEND == "postgres" and store is None:
+        print("JOB_BACKEND=postgres needs the Supabase store; using the in-process job queue.")
+    open_graph_client(WHATSAPP_ACCESS_TOKEN)
+    try:
+        open_openai_client()
+    except Exception as e:
+        print(f"OpenAI client init failed: {e}")
+    shared_dedup = shared_dedup or open_shared_cache()
+    job_queue.start()
+    coalescer.start()
+    write_behind.start()
+    if OUTBOX_ENABLED:
+        await outbox.start()
+    purge_task = asyncio.create_task(run_dedup_purge(get_store))
+    partition_task = asyncio.create_task(run_partition_maintenance(get_store))
+    yield
+    purge_task.cancel()
+    partition_task.cancel()
+    await coalescer.stop()
+    await job_queue.stop()
+    await outbox.stop()
+    await write_behind.stop()
+    if shared_dedup is not None:
+        await shared_dedup.close()
+        shared_dedup = None
+    await close_graph_client()
+    await close_openai_client()
+    await close_store()
+
+
+app = FastAPI(
+    title="Webhook LLM",
+    description="Webhook listener for WhatsApp API",
+    version="1.0.0",
+    lifespan=lifespan,
+)
 
 
 def _parse_wa_timestamp(ts: str | None) -> str:
@@ -47,63 +133,76 @@ def _parse_wa_timestamp(ts: str | None) -> str:
         return datetime.now(timezone.utc).isoformat()
 
 
+async def _select_then_upsert_user(store, key: dict, profile_name: str, initiated_at: str) -> dict:
+    """Pre-RPC fallback: SELECT, then UPDATE or INSERT (two round trips, racy)."""
+    lookup = await store.select("user_conservation", "id,user_id,converstion_id", key, limit=1)
+    existing = (lookup or [None])[0]
+
+    if existing:
+        await store.update(
+            "user_conservation",
+            {
+                "profile_name": profile_name,
+                "msg_initated_at": initiated_at,
+            },
+            {"id": existing["id"]},
+        )
+        return existing
+
+    payload = {
+        "user_id": str(uuid.uuid4()),
+        "converstion_id": str(uuid.uuid4()),
+        **key,
+        "profile_name": profile_name,
+        "msg_initated_at": initiated_at,
+    }
+    created = await store.insert("user_conservation", payload)
+    return (created or [None])[0] or {}
+
+
 async def upsert_user_conservation(
-    parsed: dict,
-    msg: dict,
+    msg: InboundMessage,
     user_text: str,
     llm_response: str,
 ) -> dict:
     """
-    Find existing user_conservation by entity/phone IDs; otherwise insert.
-    Also updates latest message fields for existing row.
+    Insert or update user_conservation for (entity_id, phone_number_id, phone_number) in one round trip
+    via the upsert_user_conservation Postgres function (INSERT ... ON CONFLICT DO UPDATE RETURNING).
+    Returns {id, user_id, converstion_id}.
     """
-    if not SUPABASE_CONNECTED or not supabase:
+    store = get_store()
+    if store is None:
         return {}
 
-    entity_id = parsed.get("entity_id") or ""
-    phone_number_id = parsed.get("phone_number_id") or ""
-    phone_number = msg.get("from") or parsed.get("wa_id") or ""
-    profile_name = parsed.get("profile_name") or ""
-    initiated_at = _parse_wa_timestamp(msg.get("timestamp"))
+    key = {
+        "entity_id": msg.entity_id,
+        "phone_number_id": msg.phone_number_id,
+        "phone_number": msg.sender,
+    }
+    profile_name = msg.profile_name
+    initiated_at = _parse_wa_timestamp(msg.timestamp)
 
     try:
-        lookup = (
-            supabase.table("user_conservation")
-            .select("id,user_id,converstion_id")
-            .eq("entity_id", entity_id)
-            .eq("phone_number_id", phone_number_id)
-            .eq("phone_number", phone_number)
-            .limit(1)
-            .execute()
+        rows = await store.rpc(
+            "upsert_user_conservation",
+            {
+                "p_entity_id": key["entity_id"],
+                "p_phone_number_id": key["phone_number_id"],
+                "p_phone_number": key["phone_number"],
+                "p_profile_name": profile_name,
+                "p_msg_initated_at": initiated_at,
+            },
         )
-        existing = (lookup.data or [None])[0]
-
-        if existing:
-            (
-                supabase.table("user_conservation")
-                .update(
-                    {
-                        "profile_name": profile_name,
-                        "msg_initated_at": initiated_at,
-                    }
-                )
-                .eq("id", existing["id"])
-                .execute()
-            )
-            return existing
-
-        payload = {
-            "user_id": str(uuid.uuid4()),
-            "converstion_id": str(uuid.uuid4()),
-            "entity_id": entity_id,
-            "phone_number_id": phone_number_id,
-            "phone_number": phone_number,
-            "profile_name": profile_name,
-            "msg_initated_at": initiated_at,
-        }
-        created = supabase.table("user_conservation").insert(payload).execute()
-        return (created.data or [None])[0] or {}
+        return (rows or [None])[0] or {}
     except Exception as e:
+        err = str(e).lower()
+        if "pgrst202" in err or "could not find the function" in err:
+            print("upsert_user_conservation function missing in Supabase schema cache; using select + upsert.")
+            try:
+                return await _select_then_upsert_user(store, key, profile_name, initiated_at)
+            except Exception as fallback_error:
+                print(f"Supabase upsert_user_conservation failed: {fallback_error}")
+                return {}
         print(f"Supabase upsert_user_conservation failed: {e}")
         return {}
 
@@ -114,29 +213,25 @@ async def insert_conversation_history(
     user_text: str,
     llm_response: str,
     initiated_at_iso: str,
+    message_id: str | None = None,
 ) -> None:
-    """Insert one JSONB conversation history record into conversation table."""
-    if not SUPABASE_CONNECTED or not supabase:
+    """Append the user and assistant rows of one turn to the conversation_message log (one insert)."""
+    store = get_store()
+    if store is None:
         return
     if not user_conservation_id or not converstion_id:
         return
     try:
-        conversation_json = {
-            initiated_at_iso: {
-                "user_msg": user_text,
-                "llm_response": llm_response,
-            }
-        }
-        (
-            supabase.table("conversation")
-            .insert(
-                {
-                    "user_conversation_id": user_conservation_id,
-                    "conversation_id": converstion_id,
-                    "conversation": conversation_json,
-                }
-            )
-            .execute()
+        await store.insert(
+            "conversation_message",
+            turn_rows(
+                user_conservation_id,
+                converstion_id,
+                user_text,
+                llm_response,
+                sent_at=initiated_at_iso,
+                message_id=message_id,
+            ),
         )
     except Exception as e:
         print(f"Supabase insert_conversation_history failed: {e}")
@@ -144,44 +239,53 @@ async def insert_conversation_history(
 
 async def update_msg_delivered_at(user_conservation_id: str) -> None:
     """Set delivery timestamp after WhatsApp send succeeds."""
-    if not SUPABASE_CONNECTED or not supabase:
+    store = get_store()
+    if store is None:
         return
     if not user_conservation_id:
         return
     try:
-        (
-            supabase.table("user_conservation")
-            .update({"msg_delivered_at": datetime.now(timezone.utc).isoformat()})
-            .eq("id", user_conservation_id)
-            .execute()
+        await store.update(
+            "user_conservation",
+            {"msg_delivered_at": datetime.now(timezone.utc).isoformat()},
+            {"id": user_conservation_id},
         )
     except Exception as e:
         print(f"Supabase update_msg_delivered_at failed: {e}")
 
 
-async def claim_message_once(parsed: dict, msg: dict) -> bool:
+async def claim_message_once(msg: InboundMessage) -> bool:
     """
     Deduplicate webhook retries by WhatsApp message ID.
     Returns True only for the first claim, False for duplicates.
+    Checks the in-process cache, then the optional shared cache, then the webhook_message_dedup table (authority).
     """
-    message_id = (msg.get("id") or "").strip()
+    message_id = msg.id.strip()
     if not message_id:
         return False
-    if not SUPABASE_CONNECTED or not supabase:
+    if not dedup_cache.claim(message_id):
+        print(f"Duplicate webhook skipped (cache) for message_id={message_id}")
+        return False
+    if shared_dedup is not None:
+        try:
+            if not await shared_dedup.set_nx(f"wa-dedup:{message_id}", dedup_cache.ttl):
+                print(f"Duplicate webhook skipped (shared cache) for message_id={message_id}")
+                return False
+        except Exception as e:
+            print(f"Shared dedup cache failed: {e}")
+    store = get_store()
+    if store is None:
         return True
 
     try:
-        (
-            supabase.table("webhook_message_dedup")
-            .insert(
-                {
-                    "message_id": message_id,
-                    "entity_id": parsed.get("entity_id") or "",
-                    "phone_number_id": parsed.get("phone_number_id") or "",
-                    "phone_number": msg.get("from") or parsed.get("wa_id") or "",
-                }
-            )
-            .execute()
+        await store.insert(
+            "webhook_message_dedup",
+            {
+                "message_id": message_id,
+                "entity_id": msg.entity_id,
+                "phone_number_id": msg.phone_number_id,
+                "phone_number": msg.sender,
+            },
         )
         return True
     except Exception as e:
@@ -198,35 +302,194 @@ async def claim_message_once(parsed: dict, msg: dict) -> bool:
         return True
 
 
+async def flush_conversation_batch(batch: list[tuple[str, dict]]) -> None:
+    """Write-behind flush: persist buffered turns, expenses, delivery timestamps and outbox statuses with one RPC."""
+    store = get_store()
+    if store is None:
+        return
+    with span("write_behind_flush"):
+        await store.rpc(
+            "record_conversation_batch",
+            {
+                "p_turns": [payload for kind, payload in batch if kind == "turn"],
+                "p_deliveries": [payload for kind, payload in batch if kind == "delivered"],
+                "p_expenses": [payload for kind, payload in batch if kind == "expense"],
+                "p_outbox": [payload for kind, payload in batch if kind == "outbox"],
+            },
+        )
+
+
+async def write_conversation_op(store, kind: str, payload: dict) -> None:
+    """One buffered operation through the per-row write path (the tables record_conversation_batch writes)."""
+    key = {k: payload[k] for k in ("entity_id", "phone_number_id", "phone_number")} if kind != "outbox" else {}
+    if kind == "turn":
+        rows = await store.rpc(
+            "upsert_user_conservation",
+            {
+                "p_entity_id": key["entity_id"],
+                "p_phone_number_id": key["phone_number_id"],
+                "p_phone_number": key["phone_number"],
+                "p_profile_name": payload.get("profile_name"),
+                "p_msg_initated_at": payload.get("msg_initated_at"),
+            },
+        )
+        user = rows[0]
+        await store.insert(
+            "conversation_message",
+            turn_rows(
+                user["id"],
+                user["converstion_id"],
+                payload["user_msg"],
+                payload["llm_response"],
+                sent_at=payload.get("msg_initated_at"),
+                message_id=payload.get("message_id"),
+            ),
+        )
+    elif kind == "expense":
+        users = await store.select("user_conservation", "user_id", key, limit=1)
+        if not users:
+            raise LookupError(f"no user_conservation row for {key}")
+        await record_expenses(store, users[0]["user_id"], payload["message_id"], [payload])
+    elif kind == "delivered":
+        await store.update("user_conservation", {"msg_delivered_at": payload["delivered_at"]}, key)
+    elif kind == "outbox":
+        values = {k: v for k, v in payload.items() if k != "id"}
+        await store.update(OUTBOX_TABLE, values, {"id": payload["id"], "status": STATUS_PENDING})
+
+
+async def write_conversation_ops(batch: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    """
+    Write-behind fallback once the batch RPC keeps failing (or is missing): the same operations one by one, in order,
+    so one bad row or a missing function cannot lose the rest. Returns the operations that still failed.
+    """
+    store = get_store()
+    if store is None:
+        return []
+    failed = []
+    for kind, payload in batch:
+        try:
+            await write_conversation_op(store, kind, payload)
+        except Exception as e:
+            print(f"Write-behind fallback {kind} write failed: {e}")
+            failed.append((kind, payload))
+    return failed
+
+
+write_behind = WriteBehindBuffer(flush_conversation_batch, write_conversation_ops)
+
+
+async def load_conversation_history(key: tuple[str, str, str]) -> list[tuple[str, str]]:
+    """Conversation memory loader: last messages of (entity_id, phone_number_id, wa_id) from conversation_message."""
+    store = get_store()
+    if store is None:
+        return []
+    entity_id, phone_number_id, phone_number = key
+    users = await store.select(
+        "user_conservation",
+        "converstion_id",
+        {"entity_id": entity_id, "phone_number_id": phone_number_id, "phone_number": phone_number},
+        limit=1,
+    )
+    if not users:
+        return []
+    messages = await last_messages(store, users[0]["converstion_id"], conversation_memory.max_messages)
+    return [(m.role, m.text) for m in messages]
+
+
+# With JOB_BACKEND=postgres any worker process may answer a conversation's next message, so an in-process session
+# would miss turns answered elsewhere: history is reloaded from the store for every message instead.
+conversation_memory = ConversationMemory(
+    load_conversation_history,
+    max_sessions=0 if JOB_BACKEND == "postgres" else MEMORY_MAX_SESSIONS,
+)
+
+registry.gauge("job_queue_depth", "Jobs queued or parked.", lambda: job_queue.depth)
+registry.gauge("job_queue_in_flight", "Jobs currently running.", lambda: job_queue.in_flight)
+registry.gauge("job_queue_shed", "Jobs rejected because the queue was full.", lambda: job_queue.shed)
+registry.gauge("coalesce_open_batches", "Conversations waiting for their coalescing window to close.", lambda: len(coalescer.pending))
+registry.gauge("outbox_depth", "WhatsApp sends queued or waiting to retry.", lambda: outbox.depth)
+registry.gauge("outbox_throttled", "Sends rejected by Graph throttling.", lambda: outbox.throttled)
+registry.gauge("write_behind_buffer_depth", "Operations waiting for a write-behind flush.", lambda: len(write_behind.buffer))
+registry.gauge("dedup_cache_hits", "Retries rejected by the in-process dedup cache.", lambda: dedup_cache.hits)
+registry.gauge("response_cache_hits", "Agent runs answered from the response cache.", lambda: response_cache.hits)
+registry.gauge("llm_concurrency_limit", "Current adaptive limit on concurrent LLM calls.", lambda: int(llm_guard.limiter.limit))
+registry.gauge("llm_in_flight", "LLM calls currently running.", lambda: llm_guard.limiter.in_flight)
+registry.gauge(
+    "llm_breaker_state",
+    "LLM circuit breaker: 0 closed, 1 half-open, 2 open.",
+    lambda: {BREAKER_CLOSED: 0, BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}[llm_guard.breaker.state],
+)
+
+
+async def answer_monthly_summary(msg: InboundMessage, query: dict) -> FastPathResult:
+    """Answer 'how much did I spend this month (on X)' from expense_monthly_rollup; no LLM call."""
+    store = get_store()
+    rows = []
+    users = await store.select(
+        "user_conservation",
+        "user_id",
+        {"entity_id": msg.entity_id, "phone_number_id": msg.phone_number_id, "phone_number": msg.sender},
+        limit=1,
+    )
+    if users:
+        rows = await monthly_summary(store, users[0]["user_id"], query["month"], query["purpose"])
+    count_route(ROUTE_SUMMARY)
+    return FastPathResult(final_output=format_summary(rows, query["month"], query["purpose"]), route=ROUTE_SUMMARY)
+
+
 async def mark_read_and_typing(phone_number_id: str, message_id: str) -> bool:
     """POST to Graph API: mark message as read and send typing indicator. Returns True if success."""
-    if not WHATSAPP_ACCESS_TOKEN or not phone_number_id or not message_id:
+    graph = get_graph_client()
+    if graph is None or not phone_number_id or not message_id:
         return False
-    url = f"{GRAPH_API_BASE}/{phone_number_id}/messages"
     payload = {
         "messaging_product": "whatsapp",
         "status": "read",
         "message_id": message_id,
         "typing_indicator": {"type": "text"},
     }
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.post(url, json=payload, headers=headers)
-            data = r.json() if r.content else {}
-            return data.get("success") is True
+        with span("mark_read"):
+            data = await graph.send_messages(phone_number_id, payload)
+        return data.get("success") is True
     except Exception:
         return False
 
 
-async def response_to_whatsapp(phone_number_id: str, to_wa_id: str, text: str) -> bool:
-    """POST to Graph API: send text message to WhatsApp user. Same URL/headers as mark_read."""
-    if not WHATSAPP_ACCESS_TOKEN or not phone_number_id or not to_wa_id or not text:
+async def record_delivery(delivery: dict) -> None:
+    """After a reply was actually sent: set msg_delivered_at directly, or buffer it for the write-behind flush."""
+    if delivery.get("user_conservation_id"):
+        await update_msg_delivered_at(delivery["user_conservation_id"])
+    elif delivery.get("phone_number"):
+        write_behind.add("delivered", {**delivery, "delivered_at": datetime.now(timezone.utc).isoformat()})
+
+
+def record_outbox_status(update: dict) -> None:
+    """Outbox row status after a send (sent / retry / failed), applied by the next write-behind flush."""
+    write_behind.add("outbox", update)
+
+
+outbox = Outbox(
+    get_graph_client,
+    get_store,
+    on_sent=record_delivery,
+    record_status=record_outbox_status if WRITE_BEHIND_ENABLED else None,
+)
+
+
+async def response_to_whatsapp(phone_number_id: str, to_wa_id: str, text: str, delivery: dict | None = None) -> bool:
+    """
+    Send a text message to a WhatsApp user through the outbox (rate limited, durable, retried).
+    delivery, if given, is recorded as delivered once the send succeeds (see record_delivery).
+    Returns False only when the message certainly was not sent (see webhook.outbox); an unknown outcome counts as
+    sent, so the turn is not answered twice.
+    """
+    graph = get_graph_client()
+    if graph is None or not phone_number_id or not to_wa_id or not text:
         return False
-    url = f"{GRAPH_API_BASE}/{phone_number_id}/messages"
+    if OUTBOX_ENABLED:
+        with span("whatsapp_send"):
+            return await outbox.send(phone_number_id, to_wa_id, text, delivery)
     payload = {
         "messaging_product": "whatsapp",
         "recipient_type": "individual",
@@ -234,97 +497,236 @@ async def response_to_whatsapp(phone_number_id: str, to_wa_id: str, text: str) -
         "type": "text",
         "text": {"body": text},
     }
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.post(url, json=payload, headers=headers)
-            data = r.json() if r.content else {}
-            return data.get("messages") is not None  # success returns messages array
+        with span("whatsapp_send"):
+            data = await graph.send_messages(phone_number_id, payload)
     except Exception:
         return False
+    sent = data.get("messages") is not None  # success returns messages array
+    if sent and delivery:
+        await record_delivery(delivery)
+    return may_have_been_sent(data)
+
+
+def conversation_key(msg: InboundMessage) -> tuple[str, str]:
+    """Job queue ordering key: one WhatsApp conversation = (phone_number_id, sender wa_id)."""
+    return (msg.phone_number_id, msg.sender)
+
+
+def submit_turn(key: tuple[str, str], msgs: list[InboundMessage]) -> None:
+    """Coalescer flush: one job per batch, keyed by conversation. The payloads were already ACKed (force)."""
+    job_queue.submit(process_messages, msgs, key=key, force=True)
+
 
+coalescer = Coalescer(submit_turn)
 
-def parse_webhook_payload(data: dict) -> dict:
+
+def coalesce_stats() -> dict:
+    """Coalescer counters plus LLM calls saved, estimated from the average LLM calls per agent turn."""
+    stats = coalescer.stats()
+    coalesced = COALESCED.total()
+    turns = MESSAGES.total() - coalesced
+    per_turn = llm_hooks.calls / turns if turns else 0.0
+    stats["llm_calls_per_turn"] = round(per_turn, 2)
+    stats["llm_calls_saved_est"] = round(coalesced * per_turn)
+    return stats
+
+
+async def process_messages(msgs: list[InboundMessage], dedup: bool = True) -> bool:
     """
-    Extract needed fields from WhatsApp webhook body into a simple flat structure.
-    No nested access needed: one call gives object, entity_id, metadata, contact, messages.
+    Answer one conversation's messages (a single message or a coalesced burst) with one agent run.
+    Every message is deduped (unless the caller already did, e.g. the webhook_jobs table) and marked read; texts are
+    joined in order and the turn is stored under the first claimed message (id, timestamp).
+    Returns False when a reply was due but certainly not delivered (Graph unreachable, send rejected), True otherwise
+    (including duplicates, messages with nothing to answer, and replies still pending in the outbox).
+    The turn and its expenses are stored only after the reply went out (or may have), so a job retried for an
+    undelivered reply stores them once; expense inserts are idempotent per (message_id, item_index) besides.
     """
-    if not data or data.get("object") != "whatsapp_business_account":
-        return {}
-    entry = (data.get("entry") or [{}])[0]
-    entry_id = entry.get("id")
-    changes = entry.get("changes") or [{}]
-    value = (changes[0] if changes else {}).get("value") or {}
-    metadata = value.get("metadata") or {}
-    contacts = value.get("contacts") or [{}]
-    contact = contacts[0] if contacts else {}
-    profile = contact.get("profile") or {}
-    messages_raw = value.get("messages") or []
-    messages = []
-    for m in messages_raw:
-        text_obj = m.get("text") or {}
-        messages.append({
-            "from": m.get("from"),
-            "id": m.get("id"),
-            "timestamp": m.get("timestamp"),
-            "text": text_obj.get("body", ""),
-            "type": m.get("type"),
-        })
-    return {
-        "object": data.get("object"),
-        "entity_id": entry_id,
-        "display_phone_number": metadata.get("display_phone_number"),
-        "phone_number_id": metadata.get("phone_number_id"),
-        "profile_name": profile.get("name"),
-        "wa_id": contact.get("wa_id"),
-        "messages": messages,
-    }
+    if dedup:
+        with span("dedup"):
+            claimed = [m for m in msgs if await claim_message_once(m)]
+    else:
+        claimed = [m for m in msgs if m.id.strip()]
+    if not claimed:
+        return True
 
+    read = await asyncio.gather(*(mark_read_and_typing(m.phone_number_id, m.id) for m in claimed))
+    if not any(read):
+        return False
+
+    texts = [m.text.strip() for m in claimed if m.text.strip()]
+    if not texts:
+        return True
 
-async def process_parsed_messages(parsed: dict) -> None:
-    """Background worker to process incoming messages after immediate webhook ACK."""
-    phone_number_id = parsed.get("phone_number_id")
-    for msg in parsed.get("messages", []) or []:
-        should_process = await claim_message_once(parsed, msg)
-        if not should_process:
-            continue
-
-        message_id = msg.get("id")
-        success = await mark_read_and_typing(phone_number_id or "", message_id or "")
-        if not success:
-            continue
-
-        user_text = (msg.get("text") or "").strip()
-        if not user_text:
-            continue
-
-        profile_name = parsed.get("profile_name") or ""
-        runner = await run_application_agent(user_text, profile_name=profile_name)
-        response = get_response_text(runner)
-        print("message text:", user_text)
-        print("response:", response)
-        if not response:
-            continue
-
-        to_wa_id = msg.get("from") or parsed.get("wa_id") or ""
-        user_row = await upsert_user_conservation(parsed, msg, user_text, response)
-        print('User insert or exisiting collection:',user_row)
-        if user_row:
-            initiated_at_iso = _parse_wa_timestamp(msg.get("timestamp"))
+    msg = claimed[0]
+    latest_id = claimed[-1].id
+    user_text = "\n".join(texts)
+    phone_number_id = msg.phone_number_id
+    to_wa_id = msg.sender
+    key = (msg.entity_id, msg.phone_number_id, msg.sender)
+    history = await conversation_memory.history(key) if MEMORY_ENABLED else []
+    summary_query = match_summary_query(user_text, datetime.now(timezone.utc).date())
+    stream = None
+    delivery: dict = {}  # filled once the user row exists; streamed segments sent before that record nothing
+    started = time.monotonic()
+    with span("agent"):
+        if summary_query is not None and get_store() is not None:
+            runner = await answer_monthly_summary(msg, summary_query)
+        elif STREAMING_ENABLED:
+            stream = StreamingReply(
+                send=lambda text: response_to_whatsapp(phone_number_id, to_wa_id, text, delivery),
+                refresh_typing=lambda: mark_read_and_typing(phone_number_id, latest_id),
+            )
+            async with stream.keep_typing():
+                runner = await run_application_agent_streamed(
+                    user_text, profile_name=msg.profile_name, on_delta=stream.on_delta, history=history,
+                    hooks=llm_hooks,
+                )
+        else:
+            runner = await run_application_agent(
+                user_text, profile_name=msg.profile_name, history=history, hooks=llm_hooks
+            )
+    response = get_response_text(runner)
+    route = get_route(runner)
+    MESSAGES.inc(len(texts), route=route)
+    if len(texts) > 1:
+        COALESCED.inc(len(texts) - 1, route=route)
+    if not response or route == ROUTE_LLM_FALLBACK:
+        # Never leave the user without an answer; nothing is stored for a turn the LLM did not handle.
+        sent = await response_to_whatsapp(phone_number_id, to_wa_id, response or LLM_FALLBACK_REPLY)
+        observe_first_message(started, stream, route)
+        return sent
+    if MEMORY_ENABLED:
+        conversation_memory.record_request(history, runner)
+        await conversation_memory.append(key, user_text, response)
+
+    expenses = normalize_expenses(get_expenses(runner))
+
+    if WRITE_BEHIND_ENABLED and get_store() is not None:
+        sent = await reply_write_behind(msg, user_text, response, stream, expenses, delivery)
+        observe_first_message(started, stream, route)
+        return sent
+
+    with span("db_upsert"):
+        user_row = await upsert_user_conservation(msg, user_text, response)
+    if user_row:
+        delivery["user_conservation_id"] = user_row.get("id", "")
+    if stream is not None:
+        sent = await stream.finish(response)
+    else:
+        sent = await response_to_whatsapp(phone_number_id, to_wa_id, response, delivery)
+    observe_first_message(started, stream, route)
+    if sent and user_row:
+        initiated_at_iso = _parse_wa_timestamp(msg.timestamp)
+        with span("history_insert"):
             await insert_conversation_history(
                 user_conservation_id=user_row.get("id", ""),
                 converstion_id=user_row.get("converstion_id", ""),
                 user_text=user_text,
                 llm_response=response,
                 initiated_at_iso=initiated_at_iso,
+                message_id=msg.id,
             )
+        try:
+            await record_expenses(get_store(), user_row.get("user_id", ""), msg.id, expenses)
+        except Exception as e:
+            print(f"Supabase record_expenses failed: {e}")
+    return sent
+
+
+def observe_first_message(started: float, stream: StreamingReply | None, route: str) -> None:
+    """
+    Record time to the reply's first WhatsApp message (an early streamed segment, else the whole reply).
+    streamed="true" only when a segment went out early; structured-output (expense) replies never do.
+    """
+    ttfm = stream.time_to_first_message if stream is not None else None
+    if ttfm is None:
+        ttfm = time.monotonic() - started
+    streamed = stream is not None and stream.streamed_early
+    FIRST_MESSAGE_SECONDS.observe(ttfm, route=route, streamed=str(streamed).lower())
+
 
-        sent = await response_to_whatsapp(phone_number_id or "", to_wa_id, response)
-        if sent and user_row:
-            await update_msg_delivered_at(user_row.get("id", ""))
+async def reply_write_behind(
+    msg: InboundMessage,
+    user_text: str,
+    response: str,
+    stream: StreamingReply | None,
+    expenses: list[dict],
+    delivery: dict,
+) -> bool:
+    """
+    Send the reply with no DB call on the path; the turn, expenses and delivered_at are buffered for batch flush,
+    the turn and expenses only once the reply went out (or may have).
+    Returns True if the reply was sent.
+    """
+    key = {
+        "entity_id": msg.entity_id,
+        "phone_number_id": msg.phone_number_id,
+        "phone_number": msg.sender,
+    }
+    delivery.update(key)
+    if stream is not None:
+        sent = await stream.finish(response)
+    else:
+        sent = await response_to_whatsapp(msg.phone_number_id, msg.sender, response, delivery)
+    if not sent:
+        return False
+    write_behind.add(
+        "turn",
+        {
+            **key,
+            "profile_name": msg.profile_name,
+            "msg_initated_at": _parse_wa_timestamp(msg.timestamp),
+            "user_msg": user_text,
+            "llm_response": response,
+            "message_id": msg.id,
+        },
+    )
+    for i, expense in enumerate(expenses):
+        write_behind.add("expense", {**key, "message_id": msg.id, "item_index": i, **expense})
+    return True
+
+
+class ReplyNotDelivered(Exception):
+    """
+    A claimed webhook_jobs batch was certainly not answered (nothing sent, nothing stored); the worker fails the jobs
+    so they are retried.
+    """
+
+
+async def process_claimed_messages(msgs: list[InboundMessage]) -> None:
+    """
+    worker.py handler for a claimed webhook_jobs batch: the job table already deduplicated these messages.
+    Raises ReplyNotDelivered when the reply was not delivered, so the batch is retried instead of completed.
+    """
+    if not await process_messages(msgs, dedup=False):
+        raise ReplyNotDelivered(f"reply to {msgs[0].sender} for {len(msgs)} message(s) was not delivered")
+
+
+def log_delivery_failures(parsed: ParsedWebhook) -> None:
+    for st in parsed.statuses:
+        if st.status == "failed":
+            print(f"WhatsApp delivery failed for message_id={st.id} to {st.recipient_id}: {st.errors}")
+
+
+async def process_webhook_body(raw: bytes) -> None:
+    """
+    Worker side of the ACK path: parse the raw body, log failed deliveries, and hand each message to the coalescer,
+    which submits one job per conversation burst keyed by conversation (ordered per user, parallel across users).
+    Self-contained messages (greeting, simple expense, month summary) are never merged into a burst.
+    No await before the adds, so payloads fan out in the order they were acknowledged.
+    """
+    with span("parse"):
+        parsed, body = parse_webhook_bytes(raw)
+    if not parsed:
+        debug_payload("Unparsed webhook body:", body)
+        return
+    debug_payload("Parsed:", parsed)
+    log_delivery_failures(parsed)
+    today = datetime.now(timezone.utc).date()
+    for msg in parsed.messages:
+        alone = coalescer.enabled and is_self_contained(msg.text, today)
+        coalescer.add(conversation_key(msg), msg, alone=alone)
 
 
 @app.get("/")
@@ -339,30 +741,72 @@ def webhook_verify(request: Request):
 
     if mode == "subscribe" and token and token == VERIFY_TOKEN:
         print("WEBHOOK VERIFIED")
-        print(f"Supabase DB connection established: {SUPABASE_CONNECTED}")
+        print(f"Supabase DB connection established: {get_store() is not None}")
         return PlainTextResponse(content=challenge or "")
     return PlainTextResponse(content="Forbidden", status_code=403)
 
 
+@app.get("/health", status_code=status.HTTP_200_OK)
+async def get_health():
+    """Health check plus job queue (depth / wait / in-flight), dedup cache, router, cache, coalescing, outbox counters and LLM limiter/breaker state."""
+    return {
+        "status": "ok",
+        "status_code": 200,
+        "queue": job_queue.stats(),
+        "dedup": dedup_cache.stats(),
+        "router": route_stats(),
+        "response_cache": response_cache.stats(),
+        "write_behind": write_behind.stats(),
+        "memory": conversation_memory.stats(),
+        "coalesce": coalesce_stats(),
+        "outbox": outbox.stats(),
+        "llm": llm_guard.stats(),
+        "job_backend": JOB_BACKEND,
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: stage latency histograms, LLM call/token metrics, queue gauges."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+async def persist_webhook_body(raw: bytes) -> Response:
+    """JOB_BACKEND=postgres ACK path: store one webhook_jobs row per message before answering (503 if that fails)."""
+    with span("parse"):
+        parsed, body = parse_webhook_bytes(raw)
+    if not parsed:
+        debug_payload("Unparsed webhook body:", body)
+    log_delivery_failures(parsed)
+    if parsed.messages:
+        try:
+            with span("enqueue"):
+                await enqueue_messages(get_store(), parsed.messages)
+        except Exception as e:
+            print(f"Job enqueue failed: {e}")
+            # Nothing was stored: non-2xx makes Meta redeliver the payload.
+            return Response(content=ACK_REJECTED, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, media_type="application/json")
+    return Response(content=ACK_OK, media_type="application/json")
+
+
 @app.post("/")
-async def webhook_receive(request: Request, background_tasks: BackgroundTasks):
-    """Handle POST: receive webhook events (e.g. incoming messages)."""
-    try:
-        body = await request.json()
-    except Exception:
-        body = {}
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"\n\nWebhook received {timestamp}\n")
-    parsed = parse_webhook_payload(body)
-    if parsed:
-        print("Parsed:", json.dumps(parsed, indent=2))
-        background_tasks.add_task(process_parsed_messages, parsed)
-    else:
-        print(json.dumps(body, indent=2))
-    return {"ok": True}
+async def webhook_receive(request: Request):
+    """
+    Handle POST: read the raw body once, check X-Hub-Signature-256, enqueue the bytes and ACK.
+    Parsing happens on a worker (process_webhook_body); responses are pre-serialized.
+    With JOB_BACKEND=postgres the body is parsed here and its messages are persisted (persist_webhook_body).
+    """
+    raw = await request.body()
+    if not verify_signature(raw, request.headers.get(SIGNATURE_HEADER)):
+        return Response(content=ACK_REJECTED, status_code=status.HTTP_401_UNAUTHORIZED, media_type="application/json")
+    if JOB_BACKEND == "postgres" and get_store() is not None:
+        return await persist_webhook_body(raw)
+    if not job_queue.submit(process_webhook_body, raw):
+        # Queue full: non-2xx makes Meta redeliver later instead of us dropping the message.
+        return Response(content=ACK_REJECTED, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, media_type="application/json")
+    return Response(content=ACK_OK, media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"Supabase DB connection established: {SUPABASE_CONNECTED}")
     uvicorn.run(app, host="0.0.0.0", port=PORT)
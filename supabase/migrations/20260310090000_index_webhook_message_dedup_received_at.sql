@@ -0,0 +1,3 @@
+-- Supports the periodic purge of old dedup rows (delete ... where received_at < cutoff).
+create index if not exists webhook_message_dedup_received_at_idx
+    on public.webhook_message_dedup (received_at);
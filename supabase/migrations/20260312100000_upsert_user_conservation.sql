@@ -0,0 +1,62 @@
+-- One row per (entity_id, phone_number_id, phone_number) and a single-call upsert for it.
+
+-- Merge duplicates created by the old SELECT-then-INSERT race: keep the earliest row per triple
+-- and re-point its conversation history before deleting the rest.
+with ranked as (
+    select
+        id,
+        first_value(id) over w as keep_id,
+        first_value(converstion_id) over w as keep_converstion_id,
+        row_number() over w as rn
+    from public.user_conservation
+    window w as (
+        partition by entity_id, phone_number_id, phone_number
+        order by msg_initated_at nulls last, id
+    )
+)
+update public.conversation c
+set user_conversation_id = r.keep_id,
+    conversation_id = r.keep_converstion_id
+from ranked r
+where r.rn > 1
+  and c.user_conversation_id = r.id;
+
+with ranked as (
+    select
+        id,
+        row_number() over (
+            partition by entity_id, phone_number_id, phone_number
+            order by msg_initated_at nulls last, id
+        ) as rn
+    from public.user_conservation
+)
+delete from public.user_conservation u
+using ranked r
+where r.rn > 1
+  and u.id = r.id;
+
+create unique index if not exists user_conservation_entity_phone_key
+    on public.user_conservation (entity_id, phone_number_id, phone_number);
+
+create or replace function public.upsert_user_conservation(
+    p_entity_id text,
+    p_phone_number_id text,
+    p_phone_number text,
+    p_profile_name text,
+    p_msg_initated_at timestamptz
+)
+returns table (id uuid, user_id uuid, converstion_id uuid)
+language sql
+as $$
+    insert into public.user_conservation as u (
+        entity_id, phone_number_id, phone_number, profile_name, msg_initated_at
+    )
+    values (
+        p_entity_id, p_phone_number_id, p_phone_number, p_profile_name, p_msg_initated_at
+    )
+    on conflict (entity_id, phone_number_id, phone_number)
+    do update set
+        profile_name = excluded.profile_name,
+        msg_initated_at = excluded.msg_initated_at
+    returning u.id, u.user_id, u.converstion_id;
+$$;
@@ -0,0 +1,44 @@
+-- Write-behind flush: persist a batch of conversation turns and delivery timestamps in one call.
+-- p_turns:      [{entity_id, phone_number_id, phone_number, profile_name, msg_initated_at, user_msg, llm_response}]
+-- p_deliveries: [{entity_id, phone_number_id, phone_number, delivered_at}]
+create or replace function public.record_conversation_batch(
+    p_turns jsonb default '[]'::jsonb,
+    p_deliveries jsonb default '[]'::jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+    t jsonb;
+    u record;
+begin
+    for t in select value from jsonb_array_elements(coalesce(p_turns, '[]'::jsonb))
+    loop
+        select * into u
+        from public.upsert_user_conservation(
+            t->>'entity_id',
+            t->>'phone_number_id',
+            t->>'phone_number',
+            t->>'profile_name',
+            (t->>'msg_initated_at')::timestamptz
+        );
+
+        insert into public.conversation (user_conversation_id, conversation_id, conversation)
+        values (
+            u.id,
+            u.converstion_id,
+            jsonb_build_object(
+                t->>'msg_initated_at',
+                jsonb_build_object('user_msg', t->>'user_msg', 'llm_response', t->>'llm_response')
+            )
+        );
+    end loop;
+
+    update public.user_conservation uc
+    set msg_delivered_at = (d.value->>'delivered_at')::timestamptz
+    from jsonb_array_elements(coalesce(p_deliveries, '[]'::jsonb)) d
+    where uc.entity_id = d.value->>'entity_id'
+      and uc.phone_number_id = d.value->>'phone_number_id'
+      and uc.phone_number = d.value->>'phone_number';
+end;
+$$;
@@ -0,0 +1,145 @@
+-- Append-only conversation log with typed columns, partitioned by month on created_at.
+-- Replaces one JSONB blob per turn in public.conversation (kept as-is for reference; no longer written).
+
+create table if not exists public.conversation_message (
+    id uuid not null default gen_random_uuid(),
+    conversation_id uuid not null,
+    user_conversation_id uuid not null,
+    message_id text,
+    role text not null check (role in ('user', 'assistant')),
+    text text not null,
+    sent_at timestamptz,
+    created_at timestamptz not null default now(),
+    primary key (created_at, id),
+    constraint conversation_message_conversation_id_fkey
+        foreign key (conversation_id)
+        references public.user_conservation(converstion_id),
+    constraint conversation_message_user_conversation_id_fkey
+        foreign key (user_conversation_id)
+        references public.user_conservation(id)
+) partition by range (created_at);
+
+-- "Last N turns" / keyset pagination: newest first within one conversation.
+create index if not exists conversation_message_conversation_created_idx
+    on public.conversation_message (conversation_id, created_at desc, id desc);
+
+create table if not exists public.conversation_message_default
+    partition of public.conversation_message default;
+
+-- Monthly partition for the month containing p_month; no-op if it exists.
+create or replace function public.create_conversation_message_partition(p_month date)
+returns void
+language plpgsql
+as $$
+declare
+    start_at date := date_trunc('month', p_month)::date;
+    end_at date := (date_trunc('month', p_month) + interval '1 month')::date;
+    partition_name text := format('conversation_message_%s', to_char(start_at, 'YYYY_MM'));
+begin
+    execute format(
+        'create table if not exists public.%I partition of public.conversation_message for values from (%L) to (%L)',
+        partition_name, start_at, end_at
+    );
+end;
+$$;
+
+-- Partitions for existing history through two months ahead (kept ahead by ensure_conversation_message_partitions,
+-- 20260318100000, which also drops the default partition).
+do $$
+declare
+    m date;
+begin
+    for m in
+        select generate_series(
+            date_trunc('month', coalesce((select min(created_at) from public.conversation), now())),
+            date_trunc('month', now()) + interval '2 months',
+            interval '1 month'
+        )::date
+    loop
+        perform public.create_conversation_message_partition(m);
+    end loop;
+end $$;
+
+-- Backfill: each JSONB key is one turn -> a user row and an assistant row.
+insert into public.conversation_message (
+    conversation_id, user_conversation_id, role, text, sent_at, created_at
+)
+select
+    c.conversation_id,
+    c.user_conversation_id,
+    t.role,
+    t.text,
+    case when turn.key ~ '^\d{4}-\d{2}-\d{2}' then turn.key::timestamptz end,
+    c.created_at + t.offset_by
+from public.conversation c
+cross join lateral jsonb_each(c.conversation) as turn(key, value)
+cross join lateral (
+    values
+        ('user', turn.value->>'user_msg', interval '0'),
+        ('assistant', turn.value->>'llm_response', interval '1 microsecond')
+) as t(role, text, offset_by)
+where t.text is not null;
+
+-- Keyset page of a conversation, newest first. Pass the last row's (created_at, id) to get the next page.
+create or replace function public.conversation_messages_page(
+    p_conversation_id uuid,
+    p_limit integer default 20,
+    p_before_created_at timestamptz default null,
+    p_before_id uuid default null
+)
+returns setof public.conversation_message
+language sql
+stable
+as $$
+    select *
+    from public.conversation_message m
+    where m.conversation_id = p_conversation_id
+      and (
+          p_before_created_at is null
+          or (m.created_at, m.id) < (p_before_created_at, coalesce(p_before_id, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::uuid))
+      )
+    order by m.created_at desc, m.id desc
+    limit p_limit;
+$$;
+
+-- Write-behind flush now appends to conversation_message.
+create or replace function public.record_conversation_batch(
+    p_turns jsonb default '[]'::jsonb,
+    p_deliveries jsonb default '[]'::jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+    t jsonb;
+    u record;
+begin
+    for t in select value from jsonb_array_elements(coalesce(p_turns, '[]'::jsonb))
+    loop
+        select * into u
+        from public.upsert_user_conservation(
+            t->>'entity_id',
+            t->>'phone_number_id',
+            t->>'phone_number',
+            t->>'profile_name',
+            (t->>'msg_initated_at')::timestamptz
+        );
+
+        insert into public.conversation_message (
+            conversation_id, user_conversation_id, message_id, role, text, sent_at, created_at
+        )
+        values
+            (u.converstion_id, u.id, t->>'message_id', 'user', t->>'user_msg',
+             (t->>'msg_initated_at')::timestamptz, clock_timestamp()),
+            (u.converstion_id, u.id, t->>'message_id', 'assistant', t->>'llm_response',
+             null, clock_timestamp() + interval '1 microsecond');
+    end loop;
+
+    update public.user_conservation uc
+    set msg_delivered_at = (d.value->>'delivered_at')::timestamptz
+    from jsonb_array_elements(coalesce(p_deliveries, '[]'::jsonb)) d
+    where uc.entity_id = d.value->>'entity_id'
+      and uc.phone_number_id = d.value->>'phone_number_id'
+      and uc.phone_number = d.value->>'phone_number';
+end;
+$$;
@@ -0,0 +1,106 @@
+-- Structured expense ledger plus per-user/month/purpose rollups kept current by triggers.
+
+create table if not exists public.expenses (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    message_id text,
+    amount numeric(12, 2) not null check (amount > 0),
+    expense_date date not null,
+    purpose text not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists expenses_user_date_idx
+    on public.expenses (user_id, expense_date);
+
+create table if not exists public.expense_monthly_rollup (
+    user_id uuid not null,
+    month date not null,  -- first day of the month
+    purpose text not null,
+    total numeric(14, 2) not null default 0,
+    entries integer not null default 0,
+    primary key (user_id, month, purpose)
+);
+
+create or replace function public.expense_rollup_apply()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('INSERT', 'UPDATE') then
+        insert into public.expense_monthly_rollup (user_id, month, purpose, total, entries)
+        values (new.user_id, date_trunc('month', new.expense_date)::date, new.purpose, new.amount, 1)
+        on conflict (user_id, month, purpose)
+        do update set
+            total = public.expense_monthly_rollup.total + excluded.total,
+            entries = public.expense_monthly_rollup.entries + 1;
+    end if;
+    if tg_op in ('DELETE', 'UPDATE') then
+        update public.expense_monthly_rollup
+        set total = total - old.amount,
+            entries = entries - 1
+        where user_id = old.user_id
+          and month = date_trunc('month', old.expense_date)::date
+          and purpose = old.purpose;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists expenses_rollup on public.expenses;
+create trigger expenses_rollup
+    after insert or update or delete on public.expenses
+    for each row execute function public.expense_rollup_apply();
+
+-- Write-behind flush also records extracted expenses (p_expenses rows carry the user lookup triple).
+drop function if exists public.record_conversation_batch(jsonb, jsonb);
+create or replace function public.record_conversation_batch(
+    p_turns jsonb default '[]'::jsonb,
+    p_deliveries jsonb default '[]'::jsonb,
+    p_expenses jsonb default '[]'::jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+    t jsonb;
+    u record;
+begin
+    for t in select value from jsonb_array_elements(coalesce(p_turns, '[]'::jsonb))
+    loop
+        select * into u
+        from public.upsert_user_conservation(
+            t->>'entity_id',
+            t->>'phone_number_id',
+            t->>'phone_number',
+            t->>'profile_name',
+            (t->>'msg_initated_at')::timestamptz
+        );
+
+        insert into public.conversation_message (
+            conversation_id, user_conversation_id, message_id, role, text, sent_at, created_at
+        )
+        values
+            (u.converstion_id, u.id, t->>'message_id', 'user', t->>'user_msg',
+             (t->>'msg_initated_at')::timestamptz, clock_timestamp()),
+            (u.converstion_id, u.id, t->>'message_id', 'assistant', t->>'llm_response',
+             null, clock_timestamp() + interval '1 microsecond');
+    end loop;
+
+    insert into public.expenses (user_id, message_id, amount, expense_date, purpose)
+    select uc.user_id, e.value->>'message_id', (e.value->>'amount')::numeric,
+           (e.value->>'date')::date, lower(e.value->>'purpose')
+    from jsonb_array_elements(coalesce(p_expenses, '[]'::jsonb)) e
+    join public.user_conservation uc
+      on uc.entity_id = e.value->>'entity_id'
+     and uc.phone_number_id = e.value->>'phone_number_id'
+     and uc.phone_number = e.value->>'phone_number';
+
+    update public.user_conservation uc
+    set msg_delivered_at = (d.value->>'delivered_at')::timestamptz
+    from jsonb_array_elements(coalesce(p_deliveries, '[]'::jsonb)) d
+    where uc.entity_id = d.value->>'entity_id'
+      and uc.phone_number_id = d.value->>'phone_number_id'
+      and uc.phone_number = d.value->>'phone_number';
+end;
+$$;
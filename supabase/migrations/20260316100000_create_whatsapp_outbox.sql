@@ -0,0 +1,25 @@
+-- Durable outbox for outbound WhatsApp text sends (webhook/outbox.py).
+-- Rows are inserted as 'pending' before the send and marked 'sent' / 'failed'; pending rows are re-sent on startup.
+-- delivery: what to mark delivered once the send succeeds ({user_conservation_id} or {entity_id, phone_number_id, phone_number}).
+create table if not exists public.whatsapp_outbox (
+    id uuid primary key default gen_random_uuid(),
+    phone_number_id text not null,
+    recipient text not null,
+    body text not null,
+    delivery jsonb,
+    status text not null default 'pending' check (status in ('pending', 'sent', 'failed')),
+    attempts int not null default 0,
+    last_error text,
+    wa_message_id text,
+    created_at timestamptz not null default now(),
+    sent_at timestamptz
+);
+
+-- Startup recovery reads pending rows only; the purge deletes by sent_at.
+create index if not exists whatsapp_outbox_pending_idx
+    on public.whatsapp_outbox (created_at)
+    where status = 'pending';
+
+create index if not exists whatsapp_outbox_sent_at_idx
+    on public.whatsapp_outbox (sent_at)
+    where sent_at is not null;
@@ -0,0 +1,119 @@
+-- Postgres work queue for JOB_BACKEND=postgres (webhook/pg_jobs.py, worker.py).
+-- One row per WhatsApp message; message_id is the idempotency key (replaces webhook_message_dedup in this mode).
+-- payload: the parsed InboundMessage fields. seq keeps arrival order within a conversation.
+create table if not exists public.webhook_jobs (
+    message_id text primary key,
+    seq bigserial,
+    conversation_key text not null,  -- '<phone_number_id>:<wa_id>'
+    payload jsonb not null,
+    status text not null default 'pending' check (status in ('pending', 'running', 'done', 'failed')),
+    attempts integer not null default 0,
+    run_after timestamptz not null default now(),
+    locked_by text,
+    locked_until timestamptz,
+    last_error text,
+    created_at timestamptz not null default now(),
+    finished_at timestamptz
+);
+
+-- Claim scan (oldest unfinished first) and the per-conversation "older unfinished job" check.
+create index if not exists webhook_jobs_unfinished_idx
+    on public.webhook_jobs (seq)
+    where status in ('pending', 'running');
+create index if not exists webhook_jobs_conversation_unfinished_idx
+    on public.webhook_jobs (conversation_key, seq)
+    where status in ('pending', 'running');
+-- Retention purge (delete ... where finished_at < cutoff).
+create index if not exists webhook_jobs_finished_at_idx
+    on public.webhook_jobs (finished_at)
+    where finished_at is not null;
+
+-- ACK path: insert the payload's messages in order; known message ids are ignored. Returns rows inserted.
+create or replace function public.enqueue_webhook_jobs(p_jobs jsonb)
+returns integer
+language sql
+as $$
+    with inserted as (
+        insert into public.webhook_jobs (message_id, conversation_key, payload)
+        select j.value->>'message_id', j.value->>'conversation_key', j.value->'payload'
+        from jsonb_array_elements(p_jobs) with ordinality as j(value, ord)
+        order by j.ord
+        on conflict (message_id) do nothing
+        returning 1
+    )
+    select count(*)::integer from inserted;
+$$;
+
+-- Worker claim. A job is a conversation head when no older job of its conversation is unfinished; heads that are
+-- ready (pending and due, or running with an expired lease) are locked with SKIP LOCKED, so concurrent workers get
+-- disjoint conversations. Each head is leased together with its conversation's other ready jobs.
+create or replace function public.claim_webhook_jobs(
+    p_worker text,
+    p_limit integer default 10,
+    p_visibility_seconds integer default 300
+)
+returns setof public.webhook_jobs
+language sql
+as $$
+    with heads as (
+        select j.conversation_key
+        from public.webhook_jobs j
+        where j.status in ('pending', 'running')
+          and ((j.status = 'pending' and j.run_after <= now())
+               or (j.status = 'running' and j.locked_until < now()))
+          and not exists (
+              select 1
+              from public.webhook_jobs older
+              where older.conversation_key = j.conversation_key
+                and older.status in ('pending', 'running')
+                and older.seq < j.seq
+          )
+        order by j.seq
+        limit p_limit
+        for update of j skip locked
+    )
+    update public.webhook_jobs j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker,
+        locked_until = now() + make_interval(secs => p_visibility_seconds)
+    from heads
+    where j.conversation_key = heads.conversation_key
+      and ((j.status = 'pending' and j.run_after <= now())
+           or (j.status = 'running' and j.locked_until < now()))
+    returning j.*;
+$$;
+
+-- Worker finished a batch. Only the current lease holder can complete it.
+create or replace function public.complete_webhook_jobs(p_worker text, p_message_ids text[])
+returns void
+language sql
+as $$
+    update public.webhook_jobs
+    set status = 'done', finished_at = now(), locked_until = null
+    where message_id = any(p_message_ids)
+      and locked_by = p_worker
+      and status = 'running';
+$$;
+
+-- Worker batch failed: retry after p_retry_seconds, or give up ('failed') after p_max_attempts attempts.
+create or replace function public.fail_webhook_jobs(
+    p_worker text,
+    p_message_ids text[],
+    p_error text,
+    p_retry_seconds double precision,
+    p_max_attempts integer default 5
+)
+returns void
+language sql
+as $$
+    update public.webhook_jobs
+    set status = case when attempts >= p_max_attempts then 'failed' else 'pending' end,
+        finished_at = case when attempts >= p_max_attempts then now() end,
+        run_after = now() + make_interval(secs => p_retry_seconds),
+        locked_until = null,
+        last_error = left(p_error, 500)
+    where message_id = any(p_message_ids)
+      and locked_by = p_worker
+      and status = 'running';
+$$;
@@ -0,0 +1,61 @@
+-- conversation_message partitions are created ahead of time instead of relying on the default partition: once a row
+-- for a month lands in conversation_message_default, creating that month's partition fails (the default partition's
+-- implicit constraint would be violated), so every later insert for the month keeps landing there.
+-- ensure_conversation_message_partitions() creates the current month and p_months_ahead months after it. The app
+-- calls it at startup and every CONVERSATION_PARTITION_INTERVAL (webhook/conversation_log.py); pg_cron also runs it
+-- daily where the extension is installed.
+
+create or replace function public.ensure_conversation_message_partitions(p_months_ahead integer default 3)
+returns integer
+language plpgsql
+as $$
+declare
+    m date;
+    created integer := 0;
+begin
+    for m in
+        select generate_series(
+            date_trunc('month', now()),
+            date_trunc('month', now()) + make_interval(months => p_months_ahead),
+            interval '1 month'
+        )::date
+    loop
+        if to_regclass(format('public.conversation_message_%s', to_char(m, 'YYYY_MM'))) is null then
+            perform public.create_conversation_message_partition(m);
+            created := created + 1;
+        end if;
+    end loop;
+    return created;
+end;
+$$;
+
+-- Move any rows out of the default partition into their monthly partitions and drop it. Without a default, an insert
+-- for a month that has no partition fails loudly instead of blocking that month's partition later.
+do $$
+declare
+    m date;
+begin
+    if to_regclass('public.conversation_message_default') is null then
+        return;
+    end if;
+    alter table public.conversation_message detach partition public.conversation_message_default;
+    for m in select distinct date_trunc('month', created_at)::date from public.conversation_message_default
+    loop
+        perform public.create_conversation_message_partition(m);
+    end loop;
+    insert into public.conversation_message select * from public.conversation_message_default;
+    drop table public.conversation_message_default;
+end $$;
+
+select public.ensure_conversation_message_partitions(3);
+
+do $$
+begin
+    if exists (select 1 from pg_extension where extname = 'pg_cron') then
+        perform cron.schedule(
+            'conversation-message-partitions',
+            '15 0 * * *',
+            'select public.ensure_conversation_message_partitions(3)'
+        );
+    end if;
+end $$;
@@ -0,0 +1,126 @@
+-- Outbox leases (webhook/outbox.py): a pending row is sent only by the process holding its lease.
+-- send() inserts the row already leased to its worker; a periodic sweep renews the worker's own leases and claims
+-- pending rows whose lease expired (a crashed or stopped process), so pods and worker.py never send the same row
+-- at the same time. Status updates after the send are buffered and applied by record_conversation_batch (p_outbox).
+alter table public.whatsapp_outbox
+    add column if not exists locked_by text,
+    add column if not exists locked_until timestamptz;
+
+-- Sweep scan: pending rows by lease expiry (rows from before this migration have no lease and are claimable).
+drop index if exists public.whatsapp_outbox_pending_idx;
+create index if not exists whatsapp_outbox_pending_lease_idx
+    on public.whatsapp_outbox (locked_until, created_at)
+    where status = 'pending';
+
+-- Sweep: extend p_worker's leases on rows it still has pending, then lease up to p_limit pending rows whose lease
+-- expired, oldest first. SKIP LOCKED keeps concurrent sweeps from claiming the same rows.
+create or replace function public.claim_whatsapp_outbox(
+    p_worker text,
+    p_limit integer default 100,
+    p_lease_seconds integer default 60
+)
+returns setof public.whatsapp_outbox
+language plpgsql
+as $$
+begin
+    update public.whatsapp_outbox
+    set locked_until = now() + make_interval(secs => p_lease_seconds)
+    where status = 'pending'
+      and locked_by = p_worker;
+
+    return query
+    with ready as (
+        select o.id
+        from public.whatsapp_outbox o
+        where o.status = 'pending'
+          and (o.locked_until is null or o.locked_until < now())
+        order by o.locked_until nulls first, o.created_at
+        limit p_limit
+        for update skip locked
+    )
+    update public.whatsapp_outbox o
+    set locked_by = p_worker,
+        locked_until = now() + make_interval(secs => p_lease_seconds)
+    from ready
+    where o.id = ready.id
+    returning o.*;
+end;
+$$;
+
+-- Write-behind flush also applies outbox status updates.
+-- p_outbox: [{id, status, attempts, last_error, sent_at, wa_message_id, locked_until}], in the order they happened;
+-- only the last update per row is applied, and only to rows that are still pending.
+drop function if exists public.record_conversation_batch(jsonb, jsonb, jsonb);
+create or replace function public.record_conversation_batch(
+    p_turns jsonb default '[]'::jsonb,
+    p_deliveries jsonb default '[]'::jsonb,
+    p_expenses jsonb default '[]'::jsonb,
+    p_outbox jsonb default '[]'::jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+    t jsonb;
+    u record;
+begin
+    for t in select value from jsonb_array_elements(coalesce(p_turns, '[]'::jsonb))
+    loop
+        select * into u
+        from public.upsert_user_conservation(
+            t->>'entity_id',
+            t->>'phone_number_id',
+            t->>'phone_number',
+            t->>'profile_name',
+            (t->>'msg_initated_at')::timestamptz
+        );
+
+        insert into public.conversation_message (
+            conversation_id, user_conversation_id, message_id, role, text, sent_at, created_at
+        )
+        values
+            (u.converstion_id, u.id, t->>'message_id', 'user', t->>'user_msg',
+             (t->>'msg_initated_at')::timestamptz, clock_timestamp()),
+            (u.converstion_id, u.id, t->>'message_id', 'assistant', t->>'llm_response',
+             null, clock_timestamp() + interval '1 microsecond');
+    end loop;
+
+    insert into public.expenses (user_id, message_id, amount, expense_date, purpose)
+    select uc.user_id, e.value->>'message_id', (e.value->>'amount')::numeric,
+           (e.value->>'date')::date, lower(e.value->>'purpose')
+    from jsonb_array_elements(coalesce(p_expenses, '[]'::jsonb)) e
+    join public.user_conservation uc
+      on uc.entity_id = e.value->>'entity_id'
+     and uc.phone_number_id = e.value->>'phone_number_id'
+     and uc.phone_number = e.value->>'phone_number';
+
+    update public.user_conservation uc
+    set msg_delivered_at = (d.value->>'delivered_at')::timestamptz
+    from jsonb_array_elements(coalesce(p_deliveries, '[]'::jsonb)) d
+    where uc.entity_id = d.value->>'entity_id'
+      and uc.phone_number_id = d.value->>'phone_number_id'
+      and uc.phone_number = d.value->>'phone_number';
+
+    update public.whatsapp_outbox o
+    set status = s.status,
+        attempts = s.attempts,
+        last_error = coalesce(s.last_error, o.last_error),
+        sent_at = s.sent_at,
+        wa_message_id = coalesce(s.wa_message_id, o.wa_message_id),
+        locked_until = s.locked_until
+    from (
+        select distinct on ((e.value->>'id')::uuid)
+            (e.value->>'id')::uuid as id,
+            e.value->>'status' as status,
+            (e.value->>'attempts')::integer as attempts,
+            e.value->>'last_error' as last_error,
+            (e.value->>'sent_at')::timestamptz as sent_at,
+            e.value->>'wa_message_id' as wa_message_id,
+            (e.value->>'locked_until')::timestamptz as locked_until
+        from jsonb_array_elements(coalesce(p_outbox, '[]'::jsonb)) with ordinality as e(value, ord)
+        order by (e.value->>'id')::uuid, e.ord desc
+    ) s
+    where o.id = s.id
+      and o.status = 'pending';
+end;
+$$;
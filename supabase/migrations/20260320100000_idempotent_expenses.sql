@@ -0,0 +1,100 @@
+-- Expense writes are idempotent: one row per (message_id, item_index), and every insert path (record_expenses through
+-- PostgREST, record_conversation_batch) uses ON CONFLICT DO NOTHING, so a retried job or a replayed write-behind
+-- batch cannot record a message's expenses, or add them to expense_monthly_rollup, twice.
+alter table public.expenses
+    add column if not exists item_index integer;
+
+-- Number existing rows per message in insert order. The rollup trigger is off meanwhile: the totals do not change.
+alter table public.expenses disable trigger expenses_rollup;
+
+update public.expenses e
+set item_index = r.item_index
+from (
+    select id, row_number() over (partition by message_id order by created_at, id) - 1 as item_index
+    from public.expenses
+    where message_id is not null
+) r
+where e.id = r.id
+  and e.item_index is null;
+
+alter table public.expenses enable trigger expenses_rollup;
+
+-- Rows without a message_id stay unconstrained (nulls are distinct).
+create unique index if not exists expenses_message_item_key
+    on public.expenses (message_id, item_index);
+
+-- p_expenses items carry item_index (their position in the message's expenses).
+create or replace function public.record_conversation_batch(
+    p_turns jsonb default '[]'::jsonb,
+    p_deliveries jsonb default '[]'::jsonb,
+    p_expenses jsonb default '[]'::jsonb,
+    p_outbox jsonb default '[]'::jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+    t jsonb;
+    u record;
+begin
+    for t in select value from jsonb_array_elements(coalesce(p_turns, '[]'::jsonb))
+    loop
+        select * into u
+        from public.upsert_user_conservation(
+            t->>'entity_id',
+            t->>'phone_number_id',
+            t->>'phone_number',
+            t->>'profile_name',
+            (t->>'msg_initated_at')::timestamptz
+        );
+
+        insert into public.conversation_message (
+            conversation_id, user_conversation_id, message_id, role, text, sent_at, created_at
+        )
+        values
+            (u.converstion_id, u.id, t->>'message_id', 'user', t->>'user_msg',
+             (t->>'msg_initated_at')::timestamptz, clock_timestamp()),
+            (u.converstion_id, u.id, t->>'message_id', 'assistant', t->>'llm_response',
+             null, clock_timestamp() + interval '1 microsecond');
+    end loop;
+
+    insert into public.expenses (user_id, message_id, item_index, amount, expense_date, purpose)
+    select uc.user_id, e.value->>'message_id', (e.value->>'item_index')::integer, (e.value->>'amount')::numeric,
+           (e.value->>'date')::date, lower(e.value->>'purpose')
+    from jsonb_array_elements(coalesce(p_expenses, '[]'::jsonb)) e
+    join public.user_conservation uc
+      on uc.entity_id = e.value->>'entity_id'
+     and uc.phone_number_id = e.value->>'phone_number_id'
+     and uc.phone_number = e.value->>'phone_number'
+    on conflict (message_id, item_index) do nothing;
+
+    update public.user_conservation uc
+    set msg_delivered_at = (d.value->>'delivered_at')::timestamptz
+    from jsonb_array_elements(coalesce(p_deliveries, '[]'::jsonb)) d
+    where uc.entity_id = d.value->>'entity_id'
+      and uc.phone_number_id = d.value->>'phone_number_id'
+      and uc.phone_number = d.value->>'phone_number';
+
+    update public.whatsapp_outbox o
+    set status = s.status,
+        attempts = s.attempts,
+        last_error = coalesce(s.last_error, o.last_error),
+        sent_at = s.sent_at,
+        wa_message_id = coalesce(s.wa_message_id, o.wa_message_id),
+        locked_until = s.locked_until
+    from (
+        select distinct on ((e.value->>'id')::uuid)
+            (e.value->>'id')::uuid as id,
+            e.value->>'status' as status,
+            (e.value->>'attempts')::integer as attempts,
+            e.value->>'last_error' as last_error,
+            (e.value->>'sent_at')::timestamptz as sent_at,
+            e.value->>'wa_message_id' as wa_message_id,
+            (e.value->>'locked_until')::timestamptz as locked_until
+        from jsonb_array_elements(coalesce(p_outbox, '[]'::jsonb)) with ordinality as e(value, ord)
+        order by (e.value->>'id')::uuid, e.ord desc
+    ) s
+    where o.id = s.id
+      and o.status = 'pending';
+end;
+$$;
@@ -0,0 +1,39 @@
+"""Shared test setup: no tracing, no external services; the app's feature flags keep their defaults."""
+import os
+
+os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "1")
+os.environ.setdefault("OPENAI_API_KEY", "test")  # clients are built but never reach the network
+os.environ["REDIS_URL"] = ""
+os.environ["SUPABASE_URL"] = ""
+os.environ["WHATSAPP_APP_SECRET"] = ""
+os.environ["WEBHOOK_SIGNATURE_OPTIONAL"] = "0"
+
+import pytest  # noqa: E402
+
+import llm.openai_client  # noqa: E402
+from llm.limiter import LLMGuard  # noqa: E402
+from webhook.parser import InboundMessage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_llm_guard(monkeypatch):
+    """Each test's asyncio.run is a new event loop; the shared guard's Condition must not outlive one."""
+    monkeypatch.setattr(llm.openai_client, "llm_guard", LLMGuard())
+
+
+@pytest.fixture
+def make_message():
+    def make(text: str = "hi", message_id: str = "wamid.1", sender: str = "911234567890", phone_number_id: str = "PHONE"):
+        return InboundMessage(
+            entity_id="WABA",
+            phone_number_id=phone_number_id,
+            display_phone_number="15550000000",
+            sender=sender,
+            profile_name="Asha",
+            id=message_id,
+            timestamp="1773500000",
+            type="text",
+            text=text,
+        )
+
+    return make
@@ -0,0 +1,20 @@
+"""
+The webhook_load regression gate on a reduced scenario (benchmarks/baseline_smoke.json), in a subprocess so the
+benchmark's environment does not leak into this process's app. Re-record that baseline (and baseline.json) in the
+commit that changes what they measure.
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SMOKE_BASELINE = ROOT / "benchmarks" / "baseline_smoke.json"
+SMOKE_ARGS = ["--messages", "80", "--users", "20"]
+
+
+def test_webhook_load_has_no_regressions_against_the_smoke_baseline():
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.webhook_load", *SMOKE_ARGS, "--baseline", str(SMOKE_BASELINE), "--check"],
+        cwd=ROOT, capture_output=True, text=True, timeout=180,
+    )
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
@@ -0,0 +1,84 @@
+"""Message coalescing: off by default, window timing on a fake clock, self-contained messages never wait."""
+import asyncio
+from datetime import date
+
+import main
+import webhook.coalesce as coalesce
+from benchmarks import coalesce_timing
+from benchmarks.coalesce_timing import FakeClock
+from llm.fast_router import is_self_contained
+from webhook.coalesce import Coalescer
+from webhook.parser import ParsedWebhook
+
+TODAY = date(2026, 3, 14)
+
+
+def make_coalescer(window: float = 0.3):
+    clock = FakeClock()
+    flushed = []
+    coalescer = Coalescer(lambda key, items: flushed.append((clock.now, key, items)), window=window, clock=clock)
+    return coalescer, clock, flushed
+
+
+def test_off_by_default_so_replies_are_not_delayed():
+    assert coalesce.COALESCE_WINDOW == 0.0
+    coalescer = Coalescer(lambda key, items: None)
+    assert not coalescer.enabled
+    assert not main.coalescer.enabled
+
+
+def test_disabled_coalescer_flushes_each_message_immediately():
+    coalescer, _, flushed = make_coalescer(window=0.0)
+    coalescer.add("a", "spent 200")
+    coalescer.add("a", "on bus")
+    assert flushed == [(0.0, "a", ["spent 200"]), (0.0, "a", ["on bus"])]
+
+
+def test_timing_scenarios():
+    assert coalesce_timing.main() == 0
+
+
+def test_fragments_merge_within_a_short_window():
+    coalescer, clock, flushed = make_coalescer(window=0.3)
+    coalescer.add("a", "spent 200")
+    clock.now = 0.2
+    coalescer.add("a", "on bus")
+    clock.now = 0.45
+    assert coalescer.flush_due() == 0
+    clock.now = 0.5
+    assert coalescer.flush_due() == 1
+    assert flushed == [(0.5, "a", ["spent 200", "on bus"])]
+
+
+def test_self_contained_message_flushes_the_open_batch_then_goes_alone():
+    coalescer, clock, flushed = make_coalescer(window=0.3)
+    coalescer.add("a", "spent 200")
+    coalescer.add("b", "hello")
+    clock.now = 0.1
+    coalescer.add("a", "how much did I spend this month", alone=True)
+    assert flushed == [(0.1, "a", ["spent 200"]), (0.1, "a", ["how much did I spend this month"])]
+    assert list(coalescer.pending) == ["b"]
+
+
+def test_what_counts_as_self_contained():
+    assert is_self_contained("200 for bus", TODAY)
+    assert is_self_contained("how much did I spend this month on food?", TODAY)
+    assert is_self_contained("Hi!", TODAY)
+    assert not is_self_contained("spent 200", TODAY)
+    assert not is_self_contained("on bus", TODAY)
+
+
+def test_webhook_keeps_fast_path_messages_out_of_a_burst(monkeypatch, make_message):
+    batches = []
+    coalescer = Coalescer(lambda key, items: batches.append([m.text for m in items]), window=0.3)
+    monkeypatch.setattr(main, "coalescer", coalescer)
+    monkeypatch.setattr(main, "parse_webhook_bytes", lambda raw: (raw, None))
+
+    async def scenario():
+        coalescer.start()
+        for text in ("spent 200", "on bus", "450 for dinner"):
+            await main.process_webhook_body(ParsedWebhook(messages=[make_message(text)], statuses=[]))
+        await coalescer.stop()
+
+    asyncio.run(scenario())
+    assert batches == [["spent 200", "on bus"], ["450 for dinner"]]
@@ -0,0 +1,32 @@
+"""conversation_message partition maintenance against MemoryStore's emulation."""
+import asyncio
+from datetime import datetime, timezone
+
+from webhook.conversation_log import ensure_partitions, run_partition_maintenance
+from webhook.storage import MemoryStore
+
+
+def test_partitions_are_created_ahead_once():
+    store = MemoryStore()
+    assert asyncio.run(ensure_partitions(store, months_ahead=3)) == 4
+    assert asyncio.run(ensure_partitions(store, months_ahead=3)) == 0
+    assert datetime.now(timezone.utc).strftime("%Y_%m") in store.partitions
+
+
+def test_maintenance_loop_runs_at_start_and_survives_errors():
+    store = MemoryStore()
+    broken = MemoryStore()
+    del broken.functions["ensure_conversation_message_partitions"]
+
+    async def scenario():
+        tasks = [
+            asyncio.create_task(run_partition_maintenance(lambda s=s: s, interval=0.01)) for s in (store, broken, None)
+        ]
+        await asyncio.sleep(0.03)
+        for task in tasks:
+            assert not task.done()
+            task.cancel()
+
+    asyncio.run(scenario())
+    assert len(store.partitions) == 4
+    assert broken.calls >= 2  # kept retrying
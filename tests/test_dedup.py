@@ -0,0 +1,50 @@
+"""Two-tier dedup in front of webhook_message_dedup: in-process cache, shared tier, table as authority."""
+import asyncio
+
+import main
+from webhook.dedup import DedupCache, MemorySharedCache, open_shared_cache
+from webhook.storage import MemoryStore, set_store
+
+
+def test_dedup_cache_rejects_repeats_and_evicts_lru():
+    cache = DedupCache(max_size=2, ttl=60)
+    assert cache.claim("a") and cache.claim("b")
+    assert not cache.claim("a")
+    assert cache.claim("c")  # evicts b, the least recently used
+    assert cache.claim("b")
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 4}
+
+
+def test_memory_url_opens_the_in_process_shared_tier():
+    assert isinstance(open_shared_cache("memory://"), MemorySharedCache)
+    assert open_shared_cache("") is None
+
+
+def test_retry_on_another_pod_is_caught_before_the_table(make_message, monkeypatch):
+    store = MemoryStore()
+    set_store(store)
+    monkeypatch.setattr(main, "shared_dedup", MemorySharedCache())
+    msg = make_message(message_id="wamid.retry")
+    try:
+        monkeypatch.setattr(main, "dedup_cache", DedupCache())  # pod A
+        assert asyncio.run(main.claim_message_once(msg))
+        table_calls = store.calls
+        monkeypatch.setattr(main, "dedup_cache", DedupCache())  # pod B: empty local tier
+        assert not asyncio.run(main.claim_message_once(msg))
+        assert store.calls == table_calls
+    finally:
+        set_store(None)
+
+
+def test_table_stays_the_authority_without_cache_tiers(make_message, monkeypatch):
+    store = MemoryStore()
+    set_store(store)
+    monkeypatch.setattr(main, "shared_dedup", None)
+    msg = make_message(message_id="wamid.table")
+    try:
+        monkeypatch.setattr(main, "dedup_cache", DedupCache())
+        assert asyncio.run(main.claim_message_once(msg))
+        monkeypatch.setattr(main, "dedup_cache", DedupCache())
+        assert not asyncio.run(main.claim_message_once(msg))
+    finally:
+        set_store(None)
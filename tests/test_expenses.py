@@ -0,0 +1,82 @@
+"""Expense normalization before storage, idempotent recording, and the monthly-summary matcher."""
+import asyncio
+from datetime import date
+
+import pytest
+
+from llm.fast_router import match_summary_query
+from webhook.expenses import monthly_summary, normalize_expense, normalize_expenses, record_expenses
+from webhook.storage import MemoryStore
+
+TODAY = date(2026, 3, 14)
+
+
+def test_expenses_are_normalized_for_the_ledger():
+    assert normalize_expense({"amount": "120.456", "date": " 2026-03-14", "purpose": " Street  Food "}) == {
+        "amount": 120.46, "date": "2026-03-14", "purpose": "street food",
+    }
+
+
+@pytest.mark.parametrize("expense", [
+    {"amount": 0, "date": "2026-03-14", "purpose": "food"},
+    {"amount": -5, "date": "2026-03-14", "purpose": "food"},
+    {"amount": float("nan"), "date": "2026-03-14", "purpose": "food"},
+    {"amount": 1e12, "date": "2026-03-14", "purpose": "food"},
+    {"amount": 10, "date": "2026-02-30", "purpose": "food"},
+    {"amount": 10, "date": "yesterday", "purpose": "food"},
+    {"amount": 10, "date": "2026-03-14", "purpose": "  "},
+    {"amount": "ten", "date": "2026-03-14", "purpose": "food"},
+    {"date": "2026-03-14", "purpose": "food"},
+])
+def test_items_the_table_would_reject_are_dropped(expense):
+    assert normalize_expense(expense) is None
+
+
+def test_one_bad_item_does_not_drop_the_others():
+    expenses = [
+        {"amount": 1800, "date": "2026-03-14", "purpose": "Shopping"},
+        {"amount": 0, "date": "2026-03-14", "purpose": "food"},
+        {"amount": 200, "date": "2026-03-13", "purpose": "bus"},
+    ]
+    assert [e["purpose"] for e in normalize_expenses(expenses)] == ["shopping", "bus"]
+
+
+@pytest.mark.parametrize("text, month, purpose", [
+    ("how much did I spend this month", date(2026, 3, 1), None),
+    ("How much did I spend this month on food?", date(2026, 3, 1), "food"),
+    ("how much did i spend on food this month", date(2026, 3, 1), "food"),
+    ("total expenses for last month", date(2026, 2, 1), None),
+    ("how much did I spend last month for the rent", date(2026, 2, 1), "rent"),
+    ("monthly summary", date(2026, 3, 1), None),
+])
+def test_month_questions_use_the_rollup(text, month, purpose):
+    assert match_summary_query(text, TODAY) == {"month": month, "purpose": purpose}
+
+
+@pytest.mark.parametrize("text", [
+    "how much did I spend yesterday",
+    "how much did I spend in the first week",
+    "what did I spend today",
+    "how much did I spend",
+    "total spent on food",
+    "how much did I spend this month so far vs last month",
+])
+def test_other_periods_go_to_the_agent(text):
+    assert match_summary_query(text, TODAY) is None
+
+
+def test_recording_a_message_s_expenses_again_changes_nothing():
+    store = MemoryStore()
+    expenses = [
+        {"amount": 200.0, "date": "2026-03-14", "purpose": "bus"},
+        {"amount": 50.0, "date": "2026-03-14", "purpose": "tea"},
+    ]
+
+    async def scenario():
+        await record_expenses(store, "user-1", "wamid.1", expenses)
+        await record_expenses(store, "user-1", "wamid.1", expenses)  # a retried job
+        return await monthly_summary(store, "user-1", date(2026, 3, 1))
+
+    rollup = asyncio.run(scenario())
+    assert [(e["item_index"], e["amount"]) for e in store.tables["expenses"]] == [(0, 200.0), (1, 50.0)]
+    assert sorted((r["purpose"], r["total"], r["entries"]) for r in rollup) == [("bus", 200.0, 1), ("tea", 50.0, 1)]
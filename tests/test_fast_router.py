@@ -0,0 +1,92 @@
+"""
+Labeled corpus for the deterministic pre-router (llm.fast_router): every message's expected route and, for expenses,
+the extracted item. A wrong fast-path answer is worse than an extra agent run, so the corpus is mostly near misses.
+"""
+from datetime import date
+
+import pytest
+
+from llm.fast_router import (
+    AGENT_GRAPH_LLM_CALLS,
+    ROUTE_AGENT,
+    ROUTE_EXPENSE,
+    ROUTE_GREETING,
+    fast_route,
+)
+
+TODAY = date(2026, 3, 15)
+
+# (message, expected route, expected expense for ROUTE_EXPENSE)
+CORPUS = [
+    ("hi", ROUTE_GREETING, None),
+    ("Hello!", ROUTE_GREETING, None),
+    ("hey there 👋", ROUTE_GREETING, None),
+    ("good morning", ROUTE_GREETING, None),
+    ("Namaste", ROUTE_GREETING, None),
+    ("hiii", ROUTE_GREETING, None),
+    ("200 for bus", ROUTE_EXPENSE, (200.0, "2026-03-15", "bus")),
+    ("spent 200 on bus yesterday", ROUTE_EXPENSE, (200.0, "2026-03-14", "bus")),
+    ("rs 150 for tea 2026-03-01", ROUTE_EXPENSE, (150.0, "2026-03-01", "tea")),
+    ("₹80 for auto", ROUTE_EXPENSE, (80.0, "2026-03-15", "auto")),
+    ("450 for dinner today.", ROUTE_EXPENSE, (450.0, "2026-03-15", "dinner")),
+    ("bus 200", ROUTE_EXPENSE, (200.0, "2026-03-15", "bus")),
+    ("tea 50 today", ROUTE_EXPENSE, (50.0, "2026-03-15", "tea")),
+    ("Lunch 120.50", ROUTE_EXPENSE, (120.5, "2026-03-15", "lunch")),
+    ("plumber ₹1500", ROUTE_EXPENSE, (1500.0, "2026-03-15", "plumber")),
+    ("paid plumber 1500 yesterday", ROUTE_EXPENSE, (1500.0, "2026-03-14", "plumber")),
+    ("paid for parking 40", ROUTE_EXPENSE, (40.0, "2026-03-15", "parking")),
+    ("groceries 900 rs", ROUTE_EXPENSE, (900.0, "2026-03-15", "groceries")),
+    # "<word> <number>" without a currency, a spend verb or a known purpose is not an expense.
+    ("call 911", ROUTE_AGENT, None),
+    ("room 204", ROUTE_AGENT, None),
+    ("chapter 3", ROUTE_AGENT, None),
+    ("top 10", ROUTE_AGENT, None),
+    ("flight 6E203", ROUTE_AGENT, None),
+    ("level 5 today", ROUTE_AGENT, None),
+    # Ambiguous or multi-part: the agent decides.
+    ("spent 100", ROUTE_AGENT, None),
+    ("bus", ROUTE_AGENT, None),
+    ("0 for bus", ROUTE_AGENT, None),
+    ("200 for bus tomorrow", ROUTE_AGENT, None),
+    ("spent 1800 on shopping and 700 for food", ROUTE_AGENT, None),
+    ("paid the plumber 1500 yesterday", ROUTE_AGENT, None),
+    ("200 for the bus", ROUTE_AGENT, None),
+    ("and 50 more for tea", ROUTE_AGENT, None),
+    ("hi, 200 for bus", ROUTE_AGENT, None),
+    ("hello there, can you help me track my spending?", ROUTE_AGENT, None),
+    ("what's the weather today", ROUTE_AGENT, None),
+    ("how much did I spend yesterday", ROUTE_AGENT, None),
+    ("bus 2026-03-01", ROUTE_AGENT, None),
+    ("hiking 200km", ROUTE_AGENT, None),
+]
+
+
+def route_of(text: str) -> tuple[str, tuple | None]:
+    result = fast_route(text, TODAY)
+    if result is None:
+        return ROUTE_AGENT, None
+    if result.route == ROUTE_EXPENSE:
+        (e,) = result.expenses
+        return result.route, (e["amount"], e["date"], e["purpose"])
+    return result.route, None
+
+
+@pytest.mark.parametrize("text,route,expense", CORPUS)
+def test_corpus_message_takes_its_labeled_route(text, route, expense):
+    assert route_of(text) == (route, expense)
+
+
+def test_corpus_accuracy_and_llm_calls_saved():
+    correct = sum(route_of(text) == (route, expense) for text, route, expense in CORPUS)
+    agent_runs = sum(1 for text, _, _ in CORPUS if route_of(text)[0] == ROUTE_AGENT)
+    calls_before = len(CORPUS) * AGENT_GRAPH_LLM_CALLS  # every message through router + guardrail + agent
+    calls_after = agent_runs * AGENT_GRAPH_LLM_CALLS
+    print(f"accuracy {correct}/{len(CORPUS)}, LLM calls {calls_before} -> {calls_after}")
+    assert correct == len(CORPUS)
+    assert calls_after <= calls_before * 0.6
+
+
+@pytest.mark.parametrize("text", ["call 911", "room 204", "chapter 3", "top 10"])
+def test_numbers_that_are_not_amounts_never_reach_the_ledger(text):
+    result = fast_route(text, TODAY)
+    assert result is None or not result.expenses
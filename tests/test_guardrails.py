@@ -0,0 +1,71 @@
+"""Router scope guardrail: runs on the Application Agent run in every ROUTER_GUARDRAIL_MODE; run hooks see its LLM call."""
+import asyncio
+
+import pytest
+
+import llm.expense_agent as expense_agent
+import llm.fast_router as fast_router
+from benchmarks.fakes import FakeModel
+from llm.agents import config
+from llm.expense_agent import (
+    ROUTE_GUARDRAIL_BLOCKED,
+    get_expenses,
+    get_route,
+    run_application_agent,
+    run_application_agent_streamed,
+)
+from llm.fast_router import ROUTE_AGENT
+from llm.openai_client import set_model_provider
+from webhook.metrics import MetricsRunHooks
+
+
+def run_with(monkeypatch, mode: str, off_topic: bool):
+    monkeypatch.setitem(config.GUARDRAIL_MODES, "router", mode)
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", False)
+    agent_model = FakeModel(latency=0.0, off_topic=off_topic)
+    guardrail_model = FakeModel(latency=0.0, off_topic=off_topic)
+    set_model_provider(lambda key, name: guardrail_model if key.endswith("_guardrail") else agent_model)
+    try:
+        result = asyncio.run(run_application_agent("bought groceries for 450", "Asha"))
+    finally:
+        set_model_provider(None)
+    return result, agent_model.calls, guardrail_model.calls
+
+
+@pytest.mark.parametrize("mode, guardrail_calls", [("parallel", 1), ("blocking", 1), ("merged", 0)])
+def test_in_scope_message_reaches_the_target_agent(monkeypatch, mode, guardrail_calls):
+    result, agent_calls, calls = run_with(monkeypatch, mode, off_topic=False)
+    assert get_route(result) == ROUTE_AGENT
+    assert get_expenses(result)
+    assert (agent_calls, calls) == (2, guardrail_calls)  # router + Classify Expense Agent
+
+
+@pytest.mark.parametrize("mode, agent_calls, guardrail_calls", [
+    ("parallel", 1, 1),  # router ran alongside the guardrail; its output is discarded
+    ("blocking", 0, 1),  # the router is never called
+    ("merged", 1, 0),  # the router's own verdict
+])
+def test_off_topic_message_is_blocked(monkeypatch, mode, agent_calls, guardrail_calls):
+    result, calls, g_calls = run_with(monkeypatch, mode, off_topic=True)
+    assert get_route(result) == ROUTE_GUARDRAIL_BLOCKED
+    assert not get_expenses(result)
+    assert result.final_output
+    assert (calls, g_calls) == (agent_calls, guardrail_calls)
+
+
+@pytest.mark.parametrize("mode", ["parallel", "blocking", "merged"])
+@pytest.mark.parametrize("streamed", [False, True])
+def test_run_hooks_see_the_guardrail_agent_s_llm_call(monkeypatch, mode, streamed):
+    monkeypatch.setitem(config.GUARDRAIL_MODES, "router", mode)
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", False)
+    model = FakeModel(latency=0.0)
+    set_model_provider(lambda key, name: model)
+    hooks = MetricsRunHooks()
+    run = run_application_agent_streamed if streamed else run_application_agent
+    try:
+        asyncio.run(run("bought groceries for 450", "Asha", hooks=hooks))
+    finally:
+        set_model_provider(None)
+    assert hooks.calls == model.calls == (2 if mode == "merged" else 3)
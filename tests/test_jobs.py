@@ -0,0 +1,88 @@
+"""JobQueue: per-conversation ordering, cross-conversation parallelism and load shedding (fake agent runner)."""
+import asyncio
+import random
+import time
+
+from webhook.jobs import JobQueue
+
+
+def run_jobs(keys: int, per_key: int, workers: int, latency: tuple[float, float], seed: int = 7):
+    """Submit per_key jobs for each key, interleaved; each sleeps a random latency. Returns (runs, elapsed, total)."""
+    rng = random.Random(seed)
+    delays = {(k, i): rng.uniform(*latency) for k in range(keys) for i in range(per_key)}
+    runs: list[tuple[int, int, float, float]] = []  # (key, index, started, ended)
+
+    async def fake_agent(key: int, index: int) -> None:
+        started = time.perf_counter()
+        await asyncio.sleep(delays[(key, index)])
+        runs.append((key, index, started, time.perf_counter()))
+
+    async def main() -> float:
+        queue = JobQueue(workers=workers, max_depth=keys * per_key)
+        queue.start()
+        started = time.perf_counter()
+        for i in range(per_key):
+            for k in range(keys):
+                assert queue.submit(fake_agent, k, i, key=k)
+        await queue.stop(timeout=30)
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(main())
+    return runs, elapsed, sum(delays.values())
+
+
+def test_jobs_run_in_submit_order_per_key_and_never_overlap():
+    runs, _, _ = run_jobs(keys=10, per_key=20, workers=8, latency=(0.0, 0.01))
+    assert len(runs) == 200
+    for key in range(10):
+        mine = sorted((r for r in runs if r[0] == key), key=lambda r: r[2])
+        assert [r[1] for r in mine] == list(range(20))
+        for earlier, later in zip(mine, mine[1:]):
+            assert later[2] >= earlier[3]  # one job in flight per key
+
+
+def test_keys_run_in_parallel_up_to_the_worker_count():
+    runs, elapsed, total = run_jobs(keys=16, per_key=5, workers=8, latency=(0.01, 0.03))
+    assert len(runs) == 80
+    # Serial execution would take `total`; 8 workers over 16 independent keys should come close to total / 8.
+    assert elapsed < total / 4
+
+
+def test_slow_conversation_does_not_hold_up_others():
+    finished: dict[str, float] = {}
+
+    async def job(name: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        finished[name] = time.perf_counter()
+
+    async def main() -> None:
+        queue = JobQueue(workers=4)
+        queue.start()
+        queue.submit(job, "slow-1", 0.3, key="slow")
+        queue.submit(job, "slow-2", 0.0, key="slow")
+        for i in range(6):
+            queue.submit(job, f"fast-{i}", 0.01, key=f"user-{i}")
+        await queue.stop()
+
+    asyncio.run(main())
+    assert all(finished[f"fast-{i}"] < finished["slow-1"] for i in range(6))
+    assert finished["slow-2"] >= finished["slow-1"]
+
+
+def test_submit_sheds_when_full_unless_forced():
+    async def main() -> tuple[list[bool], bool, dict]:
+        queue = JobQueue(workers=1, max_depth=2)
+        queue.start()
+        gate = asyncio.Event()
+        accepted = [queue.submit(gate.wait) for _ in range(4)]  # no worker has run yet: two fit, two are shed
+        await asyncio.sleep(0)
+        forced = queue.submit(gate.wait, force=True)
+        gate.set()
+        await queue.stop()
+        return accepted, forced, queue.stats()
+
+    accepted, forced, stats = asyncio.run(main())
+    assert accepted == [True, True, False, False]
+    assert forced
+    assert stats["shed"] == 2
+    assert stats["failed"] == 0
@@ -0,0 +1,78 @@
+"""Adaptive LLM concurrency limit and circuit breaker against a fake provider."""
+import asyncio
+
+import llm.expense_agent as expense_agent
+import llm.fast_router as fast_router
+import llm.openai_client
+from benchmarks.fakes import FakeModel
+from llm.expense_agent import ROUTE_LLM_FALLBACK, get_route, run_application_agent
+from llm.limiter import BREAKER_CLOSED, BREAKER_OPEN, AdaptiveLimiter, CircuitBreaker, LLMGuard, LLMUnavailable
+from llm.openai_client import set_model_provider
+
+
+async def call_provider(guard: LLMGuard, model: FakeModel) -> str:
+    try:
+        async with guard.call():
+            await model._wait_and_maybe_fail()
+        return "ok"
+    except LLMUnavailable:
+        return "unavailable"
+    except Exception:
+        return "error"
+
+
+def test_limit_halves_under_throttling_and_grows_back():
+    model = FakeModel(latency=0.02, capacity=4)  # the provider 429s beyond 4 concurrent calls
+    guard = LLMGuard(AdaptiveLimiter(initial=16, latency_target=1.0), CircuitBreaker(failure_threshold=1000))
+
+    async def scenario():
+        first = await asyncio.gather(*(call_provider(guard, model) for _ in range(32)))
+        throttled_limit = guard.limiter.limit
+        for _ in range(40):
+            await asyncio.gather(*(call_provider(guard, model) for _ in range(int(guard.limiter.limit))))
+        return first, throttled_limit
+
+    first, throttled_limit = asyncio.run(scenario())
+    assert "error" in first and guard.limiter.decreases >= 1
+    assert throttled_limit <= 8
+    assert guard.limiter.in_flight == 0
+    assert 4 <= guard.limiter.limit < 16  # settles around the provider's capacity instead of 16
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_one_probe():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    guard = LLMGuard(AdaptiveLimiter(initial=4), breaker)
+    failing = FakeModel(latency=0.0, rate_limit_rate=1.0)
+    healthy = FakeModel(latency=0.0)
+
+    async def scenario():
+        results = [await call_provider(guard, failing) for _ in range(5)]
+        calls_while_open = failing.rate_limited
+        await asyncio.sleep(0.06)
+        probe = await asyncio.gather(*(call_provider(guard, healthy) for _ in range(3)))
+        return results, calls_while_open, probe
+
+    results, calls_while_open, probe = asyncio.run(scenario())
+    assert results == ["error"] * 3 + ["unavailable"] * 2
+    assert calls_while_open == 3  # no provider calls while open
+    assert probe.count("ok") >= 1 and breaker.state == BREAKER_CLOSED
+
+
+def test_agent_run_falls_back_when_the_provider_is_down(monkeypatch):
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", False)
+    guard = LLMGuard(AdaptiveLimiter(initial=4), CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(llm.openai_client, "llm_guard", guard)
+    model = FakeModel(latency=0.0, rate_limit_rate=1.0)
+    set_model_provider(lambda key, name: model)
+
+    async def scenario():
+        return [await run_application_agent(f"bought groceries for {i}", "Asha") for i in range(5)]
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        set_model_provider(None)
+    assert [get_route(r) for r in results] == [ROUTE_LLM_FALLBACK] * 5
+    assert guard.breaker.state == BREAKER_OPEN
+    assert model.calls <= 4  # later messages get the fallback without reaching the provider
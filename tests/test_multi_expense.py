@@ -0,0 +1,116 @@
+"""
+Multi-item expense pipeline through the agent graph: every item of one Classify Expense Agent call reaches the ledger
+as its own expense. The model is scripted (for each corpus message it returns the structured output given here,
+including a merged item and a zero amount), so this checks what the pipeline does with an extraction (parsing,
+normalization, reply) and how many LLM calls a message costs; it says nothing about extraction accuracy.
+"""
+import asyncio
+import json
+from datetime import date, timedelta
+
+import llm.expense_agent as expense_agent
+import llm.fast_router as fast_router
+from benchmarks.fakes import FakeModel
+from llm.expense_agent import get_expenses, get_response_text, run_application_agent
+from llm.openai_client import set_model_provider
+from llm.prompt import USER_MARKER
+from webhook.expenses import normalize_expenses
+
+TODAY = date(2026, 3, 15)
+YESTERDAY = TODAY - timedelta(days=1)
+
+# (message, scripted extraction (amount, days ago, purpose), items the pipeline keeps)
+CORPUS = [
+    (
+        "Today i really spend too much amount which 1800 for shopping itself and 700 for food and then finally 200 for bus far",
+        [(1800, 0, "shopping"), (700, 0, "food"), (200, 0, "bus")],
+        [(1800, 0, "shopping"), (700, 0, "food"), (200, 0, "bus")],
+    ),
+    (
+        "spent 1800 on shopping and 700 for food",
+        [(1800, 0, "Shopping"), (700, 0, "Food")],
+        [(1800, 0, "shopping"), (700, 0, "food")],
+    ),
+    (
+        "yesterday 120 for breakfast, 340 lunch and 90 auto",
+        [(120, 1, "breakfast"), (340, 1, "lunch"), (90, 1, "auto")],
+        [(120, 1, "breakfast"), (340, 1, "lunch"), (90, 1, "auto")],
+    ),
+    (
+        "paid rent 15000 and electricity 2300",
+        [(15000, 0, "rent"), (2300, 0, "electricity")],
+        [(15000, 0, "rent"), (2300, 0, "electricity")],
+    ),
+    (
+        "movie 500, popcorn 250 and cab back 310",
+        [(500, 0, "movie"), (250, 0, "popcorn"), (310, 0, "cab")],
+        [(500, 0, "movie"), (250, 0, "popcorn"), (310, 0, "cab")],
+    ),
+    (
+        "coffee 60 and sandwich 90 at the station",
+        [(150, 0, "food")],  # merged by the model: kept as one item
+        [(150, 0, "food")],
+    ),
+    (
+        "petrol 1200 today and 80 parking yesterday",
+        [(1200, 0, "petrol"), (80, 1, "parking")],
+        [(1200, 0, "petrol"), (80, 1, "parking")],
+    ),
+    (
+        "gym 1500, protein 2200, and 0 for water",
+        [(1500, 0, "gym"), (2200, 0, "protein"), (0, 0, "water")],  # a zero amount the ledger must not store
+        [(1500, 0, "gym"), (2200, 0, "protein")],
+    ),
+]
+# Router + parallel scope guardrail + one Classify Expense Agent call, whatever the number of items.
+LLM_CALLS_PER_MESSAGE = 3
+
+
+def item(amount: float, days_ago: int, purpose: str) -> dict:
+    return {"amount": float(amount), "date": (TODAY - timedelta(days=days_ago)).isoformat(), "purpose": purpose}
+
+
+class ScriptedExtractionModel(FakeModel):
+    """FakeModel whose Classify Expense Agent output is the corpus entry's scripted extraction."""
+
+    def _output(self, system_instructions, input, output_schema, handoffs):
+        if output_schema is None or handoffs or "expenses" not in output_schema.json_schema().get("properties", {}):
+            return super()._output(system_instructions, input, output_schema, handoffs)
+        text = json.dumps(input)
+        scripted = next(s for m, s, _ in CORPUS if json.dumps(USER_MARKER + m)[1:-1] in text)
+        output, _ = super()._output(system_instructions, input, None, handoffs)
+        body = json.dumps({"expenses": [item(*i) for i in scripted]})
+        output[0].content[0].text = body
+        return output, body
+
+
+def run_corpus(monkeypatch) -> tuple[list[list[dict]], list[str], int]:
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", False)
+    model = ScriptedExtractionModel(latency=0.0)
+    set_model_provider(lambda key, name: model)
+
+    async def scenario():
+        results = [await run_application_agent(message, "Asha") for message, _, _ in CORPUS]
+        return [normalize_expenses(get_expenses(r)) for r in results], [get_response_text(r) for r in results]
+
+    try:
+        extracted, replies = asyncio.run(scenario())
+    finally:
+        set_model_provider(None)
+    return extracted, replies, model.calls
+
+
+def test_every_scripted_item_reaches_the_ledger_from_one_extraction_call_per_message(monkeypatch):
+    extracted, replies, calls = run_corpus(monkeypatch)
+    assert extracted == [[item(*i) for i in kept] for _, _, kept in CORPUS]
+    assert calls == LLM_CALLS_PER_MESSAGE * len(CORPUS)  # one extraction call per message, not per item
+    assert all(len(got) <= 1 or "Total:" in reply for got, reply in zip(extracted, replies))
+
+
+def test_items_keep_message_order_and_invalid_items_are_dropped(monkeypatch):
+    extracted, _, _ = run_corpus(monkeypatch)
+    assert [e["purpose"] for e in extracted[0]] == ["shopping", "food", "bus"]
+    assert [e["purpose"] for e in extracted[1]] == ["shopping", "food"]  # normalized to lower case
+    assert [e["date"] for e in extracted[6]] == [TODAY.isoformat(), YESTERDAY.isoformat()]
+    assert [e["purpose"] for e in extracted[7]] == ["gym", "protein"]
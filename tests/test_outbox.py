@@ -0,0 +1,232 @@
+"""
+Outbox leases: one sender per row across processes, expired leases are swept, status updates are buffered.
+Retries: only sends that certainly did not go out (throttled, never reached Graph) are retried, and send() reports
+False only for those.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from webhook.graph_api import ERROR_NOT_SENT, ERROR_OUTCOME_UNKNOWN, GraphClient, local_error
+import webhook.outbox as outbox_module
+from webhook.outbox import OUTBOX_TABLE, STATUS_FAILED, STATUS_PENDING, STATUS_SENT, Outbox
+from webhook.storage import MemoryStore
+
+
+class RecordingGraph:
+    def __init__(self, fail: bool = False, errors: list[dict] | None = None):
+        self.fail = fail
+        self.errors = list(errors or [])  # returned for the first sends, in order
+        self.attempts = 0
+        self.sent: list[str] = []
+
+    async def send_messages(self, phone_number_id: str, payload: dict, retries: int = 0) -> dict:
+        self.attempts += 1
+        if self.fail:
+            return local_error(ERROR_NOT_SENT, "connect failed")
+        if self.errors:
+            return self.errors.pop(0)
+        self.sent.append(payload["text"]["body"])
+        return {"messages": [{"id": f"wamid.{len(self.sent)}"}]}
+
+
+def make_outbox(store, graph, name: str, updates: list | None = None) -> Outbox:
+    return Outbox(
+        lambda: graph, lambda: store, record_status=None if updates is None else updates.append,
+        worker_id=name, lease_seconds=60, sweep_interval=3600, weights={},
+    )
+
+
+def expire_leases(store: MemoryStore) -> None:
+    past = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    for row in store.tables.get(OUTBOX_TABLE, []):
+        row["locked_until"] = past
+
+
+def test_two_pods_never_send_the_same_row():
+    store = MemoryStore()
+    graph = RecordingGraph()
+
+    async def scenario():
+        a, b = make_outbox(store, graph, "pod-a"), make_outbox(store, graph, "pod-b")
+        await a.start()
+        await b.start()
+        results = await asyncio.gather(*(pod.send("PHONE", "91", f"r{i}") for i, pod in enumerate([a, b] * 10)))
+        claimed = await a.sweep() + await b.sweep()  # every row is leased to its sender or already sent
+        await a.stop()
+        await b.stop()
+        return results, claimed
+
+    results, claimed = asyncio.run(scenario())
+    assert all(results) and claimed == 0
+    assert sorted(graph.sent) == sorted(f"r{i}" for i in range(20))
+    assert all(r["status"] == STATUS_SENT for r in store.tables[OUTBOX_TABLE])
+
+
+def test_rows_of_a_crashed_pod_are_sent_once_by_whoever_sweeps_first():
+    store = MemoryStore()
+    down, graph = RecordingGraph(fail=True), RecordingGraph()
+
+    async def scenario():
+        crashed = make_outbox(store, down, "pod-a")
+        await crashed.start()
+        sends = [asyncio.create_task(crashed.send("PHONE", "91", f"r{i}")) for i in range(5)]
+        await asyncio.sleep(0.05)
+        await crashed.stop(timeout=0)
+        for task in sends:
+            task.cancel()
+        b, c = make_outbox(store, graph, "pod-b"), make_outbox(store, graph, "pod-c")
+        before_expiry = await b.sweep()
+        expire_leases(store)
+        claimed = await asyncio.gather(b.sweep(), c.sweep())
+        await b.start()
+        await c.start()
+        while any(r["status"] == STATUS_PENDING for r in store.tables[OUTBOX_TABLE]):
+            await asyncio.sleep(0.01)
+        await b.stop()
+        await c.stop()
+        return before_expiry, claimed
+
+    before_expiry, claimed = asyncio.run(scenario())
+    assert before_expiry == 0  # pod-a's leases still hold
+    assert sorted(claimed) == [0, 5]
+    assert sorted(graph.sent) == [f"r{i}" for i in range(5)]
+
+
+def test_status_updates_are_buffered_instead_of_one_update_per_reply():
+    store = MemoryStore()
+    updates: list[dict] = []
+
+    async def scenario():
+        outbox = make_outbox(store, RecordingGraph(), "pod-a", updates)
+        await outbox.start()
+        await asyncio.sleep(0.01)  # let the start-up sweep and purge run
+        calls = store.calls
+        await asyncio.gather(*(outbox.send("PHONE", "91", f"r{i}") for i in range(10)))
+        per_send = (store.calls - calls) / 10
+        await outbox.stop()
+        assert all(r["status"] == STATUS_PENDING for r in store.tables[OUTBOX_TABLE])
+        await store.rpc("record_conversation_batch", {"p_outbox": updates})
+        return per_send
+
+    assert asyncio.run(scenario()) == 1  # the insert before the send
+    rows = store.tables[OUTBOX_TABLE]
+    assert all(r["status"] == STATUS_SENT and r["locked_until"] is None and r["wa_message_id"] for r in rows)
+
+
+def test_a_retrying_row_keeps_its_lease_through_the_backoff():
+    store = MemoryStore()
+    updates: list[dict] = []
+
+    async def scenario():
+        outbox = make_outbox(store, RecordingGraph(fail=True), "pod-a", updates)
+        await outbox.start()
+        task = asyncio.create_task(outbox.send("PHONE", "91", "r0"))
+        while not updates:
+            await asyncio.sleep(0.01)
+        await store.rpc("record_conversation_batch", {"p_outbox": updates})
+        other = make_outbox(store, RecordingGraph(), "pod-b")
+        claimed = await other.sweep()
+        task.cancel()
+        await outbox.stop(timeout=0)
+        return claimed
+
+    assert asyncio.run(scenario()) == 0
+    row = store.tables[OUTBOX_TABLE][0]
+    assert row["status"] == STATUS_PENDING and row["attempts"] == 1 and row["locked_by"] == "pod-a"
+    assert row["locked_until"] > (datetime.now(timezone.utc) + timedelta(seconds=59)).isoformat()
+
+
+def send_once(graph: RecordingGraph) -> tuple[bool, dict]:
+    store = MemoryStore()
+
+    async def scenario():
+        outbox = Outbox(lambda: graph, lambda: store, worker_id="pod-a", sweep_interval=3600, weights={})
+        outbox.backoff = lambda attempt: 0.0
+        await outbox.start()
+        sent = await outbox.send("PHONE", "91", "r0")
+        await outbox.stop()
+        return sent
+
+    return asyncio.run(scenario()), store.tables[OUTBOX_TABLE][0]
+
+
+@pytest.mark.parametrize("error", [
+    {"error": {"code": 130429, "message": "throughput reached"}},
+    local_error(ERROR_NOT_SENT, "connect failed"),
+])
+def test_sends_that_did_not_go_out_are_retried(error):
+    graph = RecordingGraph(errors=[error])
+    sent, row = send_once(graph)
+    assert sent and graph.sent == ["r0"] and graph.attempts == 2
+    assert row["status"] == STATUS_SENT
+
+
+@pytest.mark.parametrize("error", [
+    {},  # no body at all
+    local_error(ERROR_OUTCOME_UNKNOWN, "ReadTimeout"),
+    {"error": {"code": 1, "message": "unknown error"}},
+    {"error": {"code": 2, "message": "service temporarily unavailable"}},
+    {"error": {"code": 131000, "message": "something went wrong"}},
+])
+def test_sends_with_an_unknown_outcome_are_never_repeated(error):
+    graph = RecordingGraph(errors=[error])
+    sent, row = send_once(graph)
+    assert graph.attempts == 1 and not graph.sent and row["status"] == STATUS_FAILED
+    assert sent  # it may have gone out: the caller must not answer again either
+
+
+def test_a_rejected_send_is_reported_as_not_sent():
+    graph = RecordingGraph(errors=[{"error": {"code": 131026, "message": "Message undeliverable"}}])
+    sent, row = send_once(graph)
+    assert not sent and graph.attempts == 1 and row["status"] == STATUS_FAILED
+
+
+def test_a_row_still_retrying_when_the_wait_ends_counts_as_sent(monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_SEND_WAIT", 0.05)
+    store = MemoryStore()
+
+    async def scenario():
+        outbox = make_outbox(store, RecordingGraph(fail=True), "pod-a")
+        await outbox.start()
+        sent = await outbox.send("PHONE", "91", "r0")
+        await outbox.stop(timeout=0)
+        return sent
+
+    assert asyncio.run(scenario()) is True
+    assert store.tables[OUTBOX_TABLE][0]["status"] == STATUS_PENDING
+
+
+@pytest.mark.parametrize("exc, kind", [
+    (httpx.ConnectError("refused"), ERROR_NOT_SENT),
+    (httpx.ConnectTimeout("connect timed out"), ERROR_NOT_SENT),
+    (httpx.ReadTimeout("read timed out"), ERROR_OUTCOME_UNKNOWN),
+    (httpx.RemoteProtocolError("connection closed"), ERROR_OUTCOME_UNKNOWN),
+])
+def test_graph_client_tells_unsent_requests_from_unknown_outcomes(exc, kind):
+    def handler(request):
+        raise exc
+
+    async def scenario():
+        client = GraphClient("token", http2=False, transport=httpx.MockTransport(handler))
+        try:
+            return await client.send_messages("PHONE", {"type": "text", "text": {"body": "hi"}}, retries=0)
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario())["error"]["type"] == kind
+
+
+@pytest.mark.parametrize("status, kind", [(503, ERROR_NOT_SENT), (502, ERROR_OUTCOME_UNKNOWN)])
+def test_graph_client_error_status_without_a_graph_body(status, kind):
+    async def scenario():
+        transport = httpx.MockTransport(lambda request: httpx.Response(status, text="<html>bad gateway</html>"))
+        client = GraphClient("token", http2=False, transport=transport)
+        try:
+            return await client.send_messages("PHONE", {"type": "text", "text": {"body": "hi"}}, retries=0)
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario())["error"]["type"] == kind
@@ -0,0 +1,99 @@
+"""Webhook payload parsing: batched entries and changes, contacts matched by wa_id, status-only bodies."""
+import json
+from pathlib import Path
+
+from benchmarks import parse_bench
+from webhook.parser import WHATSAPP_OBJECT, parse_webhook_bytes, parse_webhook_payload
+
+PAYLOADS = Path(__file__).resolve().parent.parent / "benchmarks" / "payloads.jsonl"
+
+
+def message(wa_id: str, message_id: str, body: str) -> dict:
+    return {"from": wa_id, "id": message_id, "timestamp": "1773500000", "type": "text", "text": {"body": body}}
+
+
+def change(phone_number_id: str, contacts: list[tuple[str, str]] | None = None, messages=(), statuses=()) -> dict:
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": f"1555{phone_number_id}", "phone_number_id": phone_number_id},
+        "messages": list(messages),
+        "statuses": list(statuses),
+    }
+    if contacts is not None:
+        value["contacts"] = [{"wa_id": wa_id, "profile": {"name": name}} for wa_id, name in contacts]
+    return {"field": "messages", "value": value}
+
+
+def payload(*entries: tuple[str, list[dict]]) -> dict:
+    return {"object": WHATSAPP_OBJECT, "entry": [{"id": entry_id, "changes": changes} for entry_id, changes in entries]}
+
+
+def test_every_entry_and_change_is_parsed_in_order():
+    parsed = parse_webhook_payload(payload(
+        ("WABA_1", [
+            change("P1", [("911", "Asha")], [message("911", "m1", "hi")]),
+            change("P2", [("912", "Ravi")], [message("912", "m2", "200 for bus"), message("912", "m3", "thanks")]),
+        ]),
+        ("WABA_2", [change("P3", [("913", "Meera")], [message("913", "m4", "hello")])]),
+    ))
+    assert [(m.entity_id, m.phone_number_id, m.id, m.text) for m in parsed.messages] == [
+        ("WABA_1", "P1", "m1", "hi"),
+        ("WABA_1", "P2", "m2", "200 for bus"),
+        ("WABA_1", "P2", "m3", "thanks"),
+        ("WABA_2", "P3", "m4", "hello"),
+    ]
+    assert parsed.messages[3].display_phone_number == "1555P3"
+
+
+def test_contacts_are_matched_by_wa_id_not_position():
+    parsed = parse_webhook_payload(payload(("WABA", [change(
+        "P1",
+        [("911", "Asha"), ("912", "Ravi")],
+        [message("912", "m1", "from Ravi"), message("911", "m2", "from Asha"), message("999", "m3", "unknown")],
+    )])))
+    assert [(m.sender, m.profile_name) for m in parsed.messages] == [("912", "Ravi"), ("911", "Asha"), ("999", "")]
+
+
+def test_single_contact_with_a_differently_formatted_wa_id_keeps_its_name():
+    parsed = parse_webhook_payload(payload(("WABA", [change("P1", [("+91 1", "Asha")], [message("911", "m1", "hi")])])))
+    assert parsed.messages[0].profile_name == "Asha"
+
+
+def test_status_only_payload():
+    status = {
+        "id": "wamid.out1", "status": "failed", "recipient_id": "911", "timestamp": "1773500001",
+        "errors": [{"code": 131026, "title": "Message undeliverable"}],
+    }
+    parsed = parse_webhook_payload(payload(("WABA", [change("P1", None, statuses=[status])])))
+    assert not parsed.messages and parsed
+    assert [(s.entity_id, s.phone_number_id, s.id, s.status, s.recipient_id) for s in parsed.statuses] == [
+        ("WABA", "P1", "wamid.out1", "failed", "911"),
+    ]
+    assert parsed.statuses[0].errors[0]["code"] == 131026
+
+
+def test_other_objects_and_invalid_bodies_parse_to_nothing():
+    assert not parse_webhook_payload({"object": "page", "entry": [{"id": "x", "changes": []}]})
+    assert not parse_webhook_bytes(b"{not json")[0]
+    assert not parse_webhook_bytes(b"[1, 2]")[0]
+    assert not parse_webhook_bytes(b"")[0]
+
+
+def test_recorded_payloads_find_what_the_legacy_parser_found_with_each_sender_s_own_name():
+    for line in PAYLOADS.read_text().splitlines():
+        data = json.loads(line)
+        parsed, _ = parse_webhook_bytes(line.encode())
+        legacy = parse_bench.legacy_parse(data)
+        assert [(m.id, m.sender, m.text) for m in parsed.messages] == [
+            (m["id"], m["from"], m["text"]) for m in legacy["messages"]
+        ]
+        names = {
+            c["wa_id"]: c["profile"]["name"]
+            for e in data["entry"] for ch in e["changes"] for c in ch["value"].get("contacts", [])
+        }
+        assert all(m.profile_name == names.get(m.sender, m.profile_name) for m in parsed.messages)
+
+
+def test_parse_bench_runs():
+    report = parse_bench.main(["--iterations", "20"], quiet=True)
+    assert report["batched"]["messages_new"] > report["batched"]["messages_legacy"]
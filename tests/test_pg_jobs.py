@@ -0,0 +1,133 @@
+"""
+JOB_BACKEND=postgres: undelivered replies fail the job for a retry that stores the turn once; replies that may have
+gone out are not sent again; memory is reloaded across worker processes.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import main
+from llm.memory import ConversationMemory
+from webhook.graph_api import ERROR_NOT_SENT, ERROR_OUTCOME_UNKNOWN, local_error, set_graph_client
+from webhook.pg_jobs import JOBS_TABLE, PostgresJobWorker, enqueue_messages
+from webhook.storage import MemoryStore, set_store
+
+
+class StubGraph:
+    def __init__(self, up: bool = True, text_error: dict | None = None):
+        self.up = up
+        self.text_error = text_error  # returned for text sends (read receipts still succeed)
+        self.attempts = 0
+        self.replies: list[str] = []
+
+    async def send_messages(self, phone_number_id: str, payload: dict, retries: int | None = None) -> dict:
+        if not self.up:
+            return local_error(ERROR_NOT_SENT, "connect failed")
+        if payload.get("status") == "read":
+            return {"success": True}
+        self.attempts += 1
+        if self.text_error is not None:
+            return self.text_error
+        self.replies.append(payload["text"]["body"])
+        return {"messages": [{"id": f"wamid.out{len(self.replies)}"}]}
+
+
+@pytest.fixture
+def pg_backend(monkeypatch):
+    store = MemoryStore()
+    set_store(store)
+    monkeypatch.setattr(main, "OUTBOX_ENABLED", False)
+    monkeypatch.setattr(main, "WRITE_BEHIND_ENABLED", False)
+    yield store
+    set_store(None)
+    set_graph_client(None)
+
+
+def run_worker_once(store: MemoryStore, messages, enqueue: bool = True) -> dict:
+    async def scenario():
+        if enqueue:
+            await enqueue_messages(store, messages)
+        worker = PostgresJobWorker(lambda: store, main.process_claimed_messages, poll_interval=0.01)
+        task = asyncio.create_task(worker.run())
+        while worker.completed + worker.failed < len(messages):
+            await asyncio.sleep(0.01)
+        worker.stop()
+        await task
+
+    asyncio.run(scenario())
+    return store.tables[JOBS_TABLE][0]
+
+
+def test_job_is_failed_for_retry_when_the_reply_is_not_delivered(pg_backend, make_message):
+    set_graph_client(StubGraph(up=False))
+    job = run_worker_once(pg_backend, [make_message("200 for bus")])
+    assert job["status"] == "pending" and job["attempts"] == 1
+    assert "not delivered" in job["last_error"]
+
+
+def test_job_is_completed_once_the_reply_is_sent(pg_backend, make_message):
+    graph = StubGraph()
+    set_graph_client(graph)
+    job = run_worker_once(pg_backend, [make_message("200 for bus")])
+    assert job["status"] == "done" and graph.replies
+
+
+def test_a_retried_job_stores_the_turn_and_its_expenses_once(pg_backend, make_message):
+    msgs = [make_message("200 for bus")]
+    set_graph_client(StubGraph(text_error=local_error(ERROR_NOT_SENT, "connect failed")))
+    job = run_worker_once(pg_backend, msgs)
+    assert job["status"] == "pending"
+    assert not pg_backend.tables.get("conversation_message") and not pg_backend.tables.get("expenses")
+    graph = StubGraph()
+    set_graph_client(graph)
+    job["run_after"] = datetime.now(timezone.utc).isoformat()  # skip the retry backoff
+    job = run_worker_once(pg_backend, msgs, enqueue=False)
+    assert job["status"] == "done" and len(graph.replies) == 1
+    assert [r["role"] for r in pg_backend.tables["conversation_message"]] == ["user", "assistant"]
+    assert [r["amount"] for r in pg_backend.tables["expenses"]] == [200.0]
+
+
+def test_a_reply_that_may_have_gone_out_is_not_sent_again(pg_backend, make_message):
+    graph = StubGraph(text_error=local_error(ERROR_OUTCOME_UNKNOWN, "ReadTimeout"))
+    set_graph_client(graph)
+    job = run_worker_once(pg_backend, [make_message("200 for bus")])
+    assert job["status"] == "done" and job["attempts"] == 1 and graph.attempts == 1
+
+
+def test_nothing_to_answer_is_not_a_failure(pg_backend, make_message):
+    set_graph_client(StubGraph())
+    assert asyncio.run(main.process_messages([make_message("   ")], dedup=False)) is True
+
+
+def test_without_a_session_cache_every_message_sees_turns_stored_by_other_workers():
+    stored: list[tuple[str, str]] = [("user", "200 for bus"), ("assistant", "Recorded")]
+
+    async def loader(key):
+        return list(stored)
+
+    async def scenario():
+        memory = ConversationMemory(loader, max_sessions=0)
+        first = await memory.history("conv")
+        await memory.append("conv", "450 dinner", "Recorded")  # answered here...
+        stored.extend([("user", "50 tea"), ("assistant", "Recorded")])  # ...and by another worker
+        second = await memory.history("conv")
+        return memory, first, second
+
+    memory, first, second = asyncio.run(scenario())
+    assert len(first) == 2 and [m["content"] for m in second][-2:] == ["50 tea", "Recorded"]
+    assert memory.loads == 2 and not memory.sessions
+
+
+def test_session_cache_keeps_appended_turns_without_reloading():
+    async def loader(key):
+        return [("user", "200 for bus"), ("assistant", "Recorded")]
+
+    async def scenario():
+        memory = ConversationMemory(loader)
+        await memory.history("conv")
+        await memory.append("conv", "450 dinner", "Recorded")
+        return memory, await memory.history("conv")
+
+    memory, history = asyncio.run(scenario())
+    assert memory.loads == 1 and history[-2]["content"] == "450 dinner"
@@ -0,0 +1,69 @@
+"""Static-to-volatile prompt layout: what each agent's model receives before the input never varies per request."""
+import asyncio
+import json
+
+import llm.expense_agent as expense_agent
+import llm.fast_router as fast_router
+from benchmarks import prompt_tokens
+from benchmarks.fakes import FakeModel
+from llm.agents.config import APPLICATION_INSTRUCTION
+from llm.expense_agent import applicationAgent, run_application_agent
+from llm.openai_client import set_model_provider
+from llm.prompt import USER_MARKER, build_input, static_prefix
+
+REQUESTS = [
+    ("bought groceries for 450", "Asha", None),
+    ("paid the plumber 1500 yesterday", "Ravi", None),
+    ("what's a good way to save on groceries", "", None),
+    ("and 50 more for tea", "Asha", [{"role": "user", "content": "200 for bus"}, {"role": "assistant", "content": "ok"}]),
+]
+
+
+class RecordingModel(FakeModel):
+    """FakeModel that keeps the static part of every request: instructions, tools, handoffs, output schema."""
+
+    def __init__(self):
+        super().__init__(latency=0.0)
+        self.prefixes: set[str] = set()
+
+    def _output(self, system_instructions, input, output_schema, handoffs):
+        schema = output_schema.json_schema() if output_schema is not None and not output_schema.is_plain_text() else None
+        tools = [(h.tool_name, h.tool_description, h.input_json_schema) for h in handoffs]
+        self.prefixes.add(json.dumps([system_instructions, tools, schema], sort_keys=True))
+        return super()._output(system_instructions, input, output_schema, handoffs)
+
+
+def test_static_prefix_is_byte_identical_across_requests(monkeypatch):
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", False)
+    models: dict[str, RecordingModel] = {}
+    set_model_provider(lambda key, name: models.setdefault(key, RecordingModel()))
+
+    async def scenario():
+        for message, profile_name, history in REQUESTS:
+            await run_application_agent(message, profile_name, history=history)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        set_model_provider(None)
+    assert {"router", "welcome_guardrail", "classify_expense"} <= set(models)
+    for key, model in models.items():
+        assert len(model.prefixes) == 1, f"{key}: static prefix varies between requests"
+        instructions = json.loads(next(iter(model.prefixes)))[0]
+        assert instructions.startswith(APPLICATION_INSTRUCTION)
+        assert "Asha" not in instructions and "Ravi" not in instructions
+
+
+def test_per_request_values_only_appear_in_the_last_item():
+    history = [{"role": "user", "content": "200 for bus"}, {"role": "assistant", "content": "ok"}]
+    day1 = build_input("450 dinner", "Asha", "2026-03-14", history)
+    day2 = build_input("450 dinner", "Asha", "2026-03-15", history)
+    assert day1[:-1] == day2[:-1] == history
+    assert day1[-1]["content"] == f"Profile name: Asha\nCurrent date: 2026-03-14\n\n{USER_MARKER}450 dinner"
+    assert static_prefix(applicationAgent) == static_prefix(applicationAgent.clone())
+
+
+def test_prompt_tokens_check_passes(capsys):
+    assert prompt_tokens.main(["--check"]) == 0
+    assert json.loads(capsys.readouterr().out)["static_prefix_identical"]
@@ -0,0 +1,65 @@
+"""Response cache keys (route, date, text) and store policy."""
+import asyncio
+from types import SimpleNamespace
+
+import llm.expense_agent as expense_agent
+import llm.fast_router as fast_router
+from benchmarks.fakes import FakeModel
+from llm.expense_agent import run_application_agent
+from llm.openai_client import set_model_provider
+from llm.response_cache import CACHE_ROUTE_CHAT, CACHE_ROUTE_EXPENSE, ResponseCache, cache_key
+
+
+def run_by(agent_name: str):
+    return SimpleNamespace(last_agent=SimpleNamespace(name=agent_name))
+
+
+def test_key_carries_the_route_and_the_date_only_for_expenses():
+    assert cache_key("Hello, there!", "2026-03-14") == f"{CACHE_ROUTE_CHAT}|hello there"
+    assert cache_key("Paid 200 for the bus", "2026-03-14") == f"{CACHE_ROUTE_EXPENSE}|2026-03-14|paid 200 for the bus"
+    assert cache_key("bus yesterday", "2026-03-14") != cache_key("bus yesterday", "2026-03-15")
+
+
+def test_extraction_replies_are_cached_only_under_a_date_keyed_route():
+    cache = ResponseCache(agents={"Application Agent", "Classify Expense Agent"})
+    chat_key = cache_key("bought groceries", "2026-03-14")
+    cache.put(chat_key, run_by("Classify Expense Agent"), "Recorded", [{"amount": 1, "date": "2026-03-14", "purpose": "x"}])
+    assert cache.get(chat_key) is None
+    expense_key = cache_key("bought groceries for 450", "2026-03-14")
+    cache.put(expense_key, run_by("Classify Expense Agent"), "Recorded")
+    assert cache.get(expense_key).final_output == "Recorded"
+    assert cache.stats()["hits_by_route"] == {CACHE_ROUTE_EXPENSE: 1}
+
+
+def test_uncacheable_agents_ttl_and_lru():
+    cache = ResponseCache(max_size=2, ttl=60, agents={"Application Agent"})
+    cache.put("chat|hi", run_by("Welcome Agent"), "Hey!")
+    assert cache.get("chat|hi") is None
+    for text in ("a", "b", "c"):
+        cache.put(f"chat|{text}", run_by("Application Agent"), text)
+    assert cache.get("chat|a") is None and cache.get("chat|c").final_output == "c"
+    expired = ResponseCache(ttl=0, agents={"Application Agent"})
+    expired.put("chat|a", run_by("Application Agent"), "a")
+    assert expired.get("chat|a") is None
+
+
+def test_follow_ups_with_history_bypass_the_cache(monkeypatch):
+    cache = ResponseCache(agents={"Application Agent", "Classify Expense Agent"})
+    monkeypatch.setattr(expense_agent, "response_cache", cache)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    model = FakeModel(latency=0.0)
+    set_model_provider(lambda key, name: model)
+    history = [{"role": "user", "content": "200 for bus"}, {"role": "assistant", "content": "Recorded"}]
+
+    async def scenario():
+        for _ in range(2):
+            await run_application_agent("and 50 more for tea", "Asha", history=history)
+        assert not cache.entries and cache.hits == cache.misses == 0
+        await run_application_agent("and 50 more for tea", "Ravi")  # first message of a conversation
+
+    try:
+        asyncio.run(scenario())
+        assert len(cache.entries) == 1
+    finally:
+        set_model_provider(None)
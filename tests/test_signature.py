@@ -0,0 +1,31 @@
+"""X-Hub-Signature-256 verification fails closed without an app secret."""
+import asyncio
+
+import httpx
+
+import main
+from webhook.signature import sign, verify_signature
+
+BODY = b'{"object": "whatsapp_business_account", "entry": []}'
+
+
+def test_valid_signature_is_required_when_a_secret_is_set():
+    assert verify_signature(BODY, sign(BODY, "s3cret"), secret="s3cret")
+    assert not verify_signature(BODY, sign(BODY, "other"), secret="s3cret")
+    assert not verify_signature(BODY, None, secret="s3cret")
+    assert not verify_signature(BODY, "md5=abc", secret="s3cret")
+
+
+def test_missing_secret_rejects_unless_signatures_are_optional():
+    assert not verify_signature(BODY, None, secret="")
+    assert not verify_signature(BODY, sign(BODY, "anything"), secret="")
+    assert verify_signature(BODY, None, secret="", optional=True)
+
+
+def test_unsigned_post_gets_401_without_a_secret():
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/", content=BODY, headers={"content-type": "application/json"})
+
+    assert asyncio.run(post()).status_code == 401
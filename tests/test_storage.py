@@ -0,0 +1,129 @@
+"""
+MemoryStore constraints, the atomic user_conservation upsert under concurrency, and webhook ACKs that never wait on
+the store (benchmarks.ack_latency, run in a subprocess so its env does not leak into this process's app).
+The concurrent upsert test runs against real Postgres (asyncpg, $PG_DSN) and is skipped without one: MemoryStore's
+upsert is synchronous, so concurrent calls never interleave inside it.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+import main
+from webhook.storage import MemoryStore, StoreError, set_store
+
+ROOT = Path(__file__).resolve().parent.parent
+MIGRATIONS_DIR = ROOT / "supabase" / "migrations"
+MIGRATIONS = [
+    "20260307114400_create_user_conservation.sql",
+    "20260307121000_create_conversation_table.sql",
+    "20260312100000_upsert_user_conservation.sql",
+]
+
+
+def test_user_conservation_triple_is_unique():
+    store = MemoryStore()
+    key = {"entity_id": "WABA", "phone_number_id": "PHONE", "phone_number": "911234567890"}
+    asyncio.run(store.insert("user_conservation", {**key, "converstion_id": "c1"}))
+    asyncio.run(store.insert("user_conservation", {**key, "phone_number": "919999999999", "converstion_id": "c2"}))
+    with pytest.raises(StoreError, match="23505"):
+        asyncio.run(store.insert("user_conservation", {**key, "converstion_id": "c3"}))
+    assert len(store.tables["user_conservation"]) == 2
+
+
+class AsyncpgStore:
+    """The slice of the SupabaseStore API main.upsert_user_conservation uses, over an asyncpg pool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.calls = 0
+
+    async def rpc(self, function: str, params: dict) -> list[dict]:
+        assert function == "upsert_user_conservation"
+        self.calls += 1
+        rows = await self.pool.fetch(
+            "select id::text, user_id::text, converstion_id::text"
+            " from public.upsert_user_conservation($1, $2, $3, $4, $5::text::timestamptz)",
+            params["p_entity_id"], params["p_phone_number_id"], params["p_phone_number"],
+            params["p_profile_name"], params["p_msg_initated_at"],
+        )
+        return [dict(r) for r in rows]
+
+
+def test_concurrent_upserts_create_one_user(make_message):
+    """20 upserts on 20 connections at once, so the conflict is decided by Postgres itself ($PG_DSN, a scratch DB)."""
+    dsn = os.environ.get("PG_DSN", "")
+    if not dsn:
+        pytest.skip("PG_DSN not set (a scratch Postgres database)")
+    asyncpg = pytest.importorskip("asyncpg")
+    sender = f"91{uuid.uuid4().int % 10**10:010d}"
+
+    async def burst():
+        pool = await asyncpg.create_pool(dsn, min_size=20, max_size=20)
+        try:
+            async with pool.acquire() as conn:
+                for name in MIGRATIONS:
+                    await conn.execute((MIGRATIONS_DIR / name).read_text())
+            store = AsyncpgStore(pool)
+            set_store(store)
+            msgs = [make_message(message_id=f"wamid.{i}", sender=sender) for i in range(20)]
+            rows = await asyncio.gather(*(main.upsert_user_conservation(m, "hi", "hello") for m in msgs))
+            stored = await pool.fetchval(
+                "select count(*) from public.user_conservation where phone_number = $1", sender
+            )
+            await pool.execute("delete from public.user_conservation where phone_number = $1", sender)
+            return rows, stored, store.calls
+        finally:
+            set_store(None)
+            await pool.close()
+
+    rows, stored, calls = asyncio.run(burst())
+    assert stored == 1
+    assert len({(r["id"], r["user_id"], r["converstion_id"]) for r in rows}) == 1
+    assert calls == 20  # one round trip per upsert
+
+
+def test_upsert_is_one_round_trip(make_message):
+    store = MemoryStore()
+    set_store(store)
+    try:
+        msgs = [make_message(message_id=f"wamid.{i}") for i in range(3)]
+        rows = [asyncio.run(main.upsert_user_conservation(m, "hi", "hello")) for m in msgs]
+    finally:
+        set_store(None)
+    assert len(store.tables["user_conservation"]) == 1 and len({r["id"] for r in rows}) == 1
+    assert store.calls == 3
+
+
+def test_racing_select_then_insert_fallback_cannot_duplicate_a_user(make_message):
+    store = MemoryStore(latency=0.005)
+    del store.functions["upsert_user_conservation"]  # schema cache without the function: racy fallback path
+    set_store(store)
+    try:
+        async def burst():
+            msgs = [make_message(message_id=f"wamid.{i}") for i in range(5)]
+            return await asyncio.gather(*(main.upsert_user_conservation(m, "hi", "hello") for m in msgs))
+
+        rows = asyncio.run(burst())
+    finally:
+        set_store(None)
+    assert len(store.tables["user_conservation"]) == 1  # the unique triple rejects the losers' inserts
+    assert sum(1 for r in rows if r) == 1
+
+
+def test_acks_stay_below_one_store_call_while_background_messages_write():
+    db_latency = 0.05
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.ack_latency", "--writers", "16", "--probes", "20",
+         "--db-latency", str(db_latency)],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+    assert report["writers_unfinished_after_probes"] > 0 and report["store_calls_during_probes"] > 0
+    assert report["loaded"]["ack_p99_ms"] < db_latency * 1000
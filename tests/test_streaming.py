@@ -0,0 +1,91 @@
+"""StreamingReply: timer-driven typing refresh, early first paragraph, time to first message; which routes stream."""
+import asyncio
+
+from agents import RunConfig
+
+import llm.expense_agent as expense_agent
+import llm.fast_router as fast_router
+from benchmarks.fakes import FakeModel
+from llm.expense_agent import get_response_text, run_application_agent_streamed
+from llm.openai_client import set_model_provider
+from webhook.streaming import StreamingReply
+
+
+def make_reply(sent: list[str], typing: list[int], refresh_interval: float = 0.01) -> StreamingReply:
+    async def send(text: str) -> bool:
+        sent.append(text)
+        return True
+
+    async def refresh_typing() -> bool:
+        typing.append(1)
+        return True
+
+    return StreamingReply(send, refresh_typing, refresh_interval=refresh_interval, min_segment_chars=5)
+
+
+def test_typing_is_refreshed_while_a_run_streams_no_text():
+    sent, typing = [], []
+
+    async def scenario():
+        reply = make_reply(sent, typing)
+        async with reply.keep_typing():
+            await asyncio.sleep(0.055)  # e.g. a structured-output agent: no deltas at all
+        refreshed = len(typing)
+        await asyncio.sleep(0.03)
+        assert len(typing) == refreshed  # stopped with the run
+        assert await reply.finish("Recorded!")
+        return reply
+
+    reply = asyncio.run(scenario())
+    assert len(typing) >= 3
+    assert sent == ["Recorded!"] and not reply.streamed_early
+    assert reply.time_to_first_message >= 0.05
+
+
+def test_first_paragraph_is_sent_before_the_run_finishes():
+    sent, typing = [], []
+
+    async def scenario():
+        reply = make_reply(sent, typing, refresh_interval=60)
+        async with reply.keep_typing():
+            for delta in ("Got it, noted.", "\n• Amount", ": *200*"):
+                await reply.on_delta(delta)
+            assert sent == ["Got it, noted."]
+            await asyncio.sleep(0.02)
+        await reply.finish("Got it, noted.\n• Amount: *200*")
+        return reply
+
+    reply = asyncio.run(scenario())
+    assert sent == ["Got it, noted.", "• Amount: *200*"]
+    assert reply.time_to_first_message < 0.02 and reply.streamed_early
+    assert not typing
+
+
+def run_streamed(monkeypatch, text: str) -> tuple[list[str], str]:
+    """run_application_agent_streamed against FakeModel (no fast path, no cache); returns the deltas and the reply."""
+    monkeypatch.setattr(fast_router, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(expense_agent, "RESPONSE_CACHE_ENABLED", False)
+    set_model_provider(lambda key, name: FakeModel(latency=0.0, output_tokens=8))
+    deltas: list[str] = []
+
+    async def on_delta(delta: str) -> None:
+        deltas.append(delta)
+
+    try:
+        result = asyncio.run(run_application_agent_streamed(text, "Asha", on_delta=on_delta))
+    finally:
+        set_model_provider(None)
+    return deltas, get_response_text(result)
+
+
+def test_expense_replies_are_structured_output_and_skip_streaming(monkeypatch):
+    deltas, reply = run_streamed(monkeypatch, "spent 1800 on shopping and 700 for food")
+    assert deltas == [] and reply  # one message at the end, built from the parsed expenses
+
+
+def test_plain_text_replies_stream(monkeypatch):
+    # the router answering on its own (no handoff) is the plain-text agent; it streams its reply as it goes
+    monkeypatch.setattr(expense_agent, "router_agent", lambda: expense_agent.applicationAgent.clone(handoffs=[]))
+    monkeypatch.setattr(expense_agent, "router_run_config", RunConfig)
+    deltas, reply = run_streamed(monkeypatch, "what's a good way to save on groceries")
+    assert deltas and "".join(deltas).strip() == reply.strip()
@@ -0,0 +1 @@
+"""Webhook runtime services: storage backend and helpers shared by main.py."""
@@ -0,0 +1,136 @@
+"""
+Per-conversation coalescing of rapid-fire messages ("spent 200" / "on bus" / "yesterday").
+- A conversation's first message opens a batch; each new message pushes its flush back by COALESCE_WINDOW seconds,
+  but a batch never waits more than COALESCE_MAX_WAIT seconds after its first message or grows past
+  COALESCE_MAX_MESSAGES. A flushed batch is handed to on_flush (one agent run answers the whole batch).
+- Timing is driven by clock() (time.monotonic by default) and flush_due(); the background task only sleeps until the
+  next deadline, so the rules can be checked with a fake clock (benchmarks.coalesce_timing).
+- stop() flushes every open batch; messages added after that are flushed immediately.
+- Off by default: any window delays every reply by at least that long, so enable it only for users who type in
+  bursts, with a window of a few hundred ms. Messages that are complete on their own (add(..., alone=True), e.g. a
+  fast-path expense or a summary question) never wait: they flush the open batch first, then themselves alone.
+"""
+import asyncio
+import os
+import time
+
+COALESCE_WINDOW = float(os.environ.get("COALESCE_WINDOW", 0.0))  # 0 disables coalescing; try 0.3
+COALESCE_MAX_WAIT = float(os.environ.get("COALESCE_MAX_WAIT", 4.0))
+COALESCE_MAX_MESSAGES = int(os.environ.get("COALESCE_MAX_MESSAGES", 8))
+
+
+class _Batch:
+    __slots__ = ("items", "first_at", "deadline")
+
+    def __init__(self, item, now: float):
+        self.items = [item]
+        self.first_at = now
+        self.deadline = now
+
+
+class Coalescer:
+    """Groups items by key within a resettable, capped window; on_flush(key, items) receives each batch in order."""
+
+    def __init__(
+        self,
+        on_flush,
+        window: float = COALESCE_WINDOW,
+        max_wait: float = COALESCE_MAX_WAIT,
+        max_messages: int = COALESCE_MAX_MESSAGES,
+        clock=time.monotonic,
+    ):
+        self.on_flush = on_flush
+        self.window = window
+        self.max_wait = max_wait
+        self.max_messages = max_messages
+        self.clock = clock
+        self.pending: dict[object, _Batch] = {}
+        self.wakeup: asyncio.Event | None = None
+        self.task: asyncio.Task | None = None
+        self.accepting = True  # False after stop(): add() flushes immediately
+        self.batches = 0
+        self.messages = 0
+        self.batch_size_max = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.accepting
+
+    def start(self) -> None:
+        self.accepting = True
+        if self.task is None and self.window > 0:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run(), name="coalescer")
+
+    def add(self, key, item, alone: bool = False) -> None:
+        """
+        Add item to key's open batch (or open one); flushes right away when disabled or the batch is full.
+        alone=True flushes key's open batch (keeping order) and then item as its own batch.
+        """
+        if not self.enabled or alone:
+            if key in self.pending:
+                self._flush(key, self.pending.pop(key).items)
+            self._flush(key, [item])
+            return
+        now = self.clock()
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = _Batch(item, now)
+            if self.wakeup is not None:
+                self.wakeup.set()  # new batch may have the earliest deadline
+        else:
+            batch.items.append(item)
+        batch.deadline = min(now + self.window, batch.first_at + self.max_wait)
+        if len(batch.items) >= self.max_messages:
+            self._flush(key, self.pending.pop(key).items)
+
+    def next_deadline(self) -> float | None:
+        return min((b.deadline for b in self.pending.values()), default=None)
+
+    def flush_due(self) -> int:
+        """Flush every batch whose deadline has passed; returns how many were flushed."""
+        now = self.clock()
+        due = [key for key, batch in self.pending.items() if batch.deadline <= now]
+        for key in due:
+            self._flush(key, self.pending.pop(key).items)
+        return len(due)
+
+    def _flush(self, key, items: list) -> None:
+        self.batches += 1
+        self.messages += len(items)
+        self.batch_size_max = max(self.batch_size_max, len(items))
+        self.on_flush(key, items)
+
+    async def _run(self) -> None:
+        while True:
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - self.clock())
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                self.flush_due()
+            except Exception as e:
+                print(f"Coalescer flush failed: {e}")
+
+    async def stop(self) -> None:
+        """Flush every open batch and stop coalescing (later adds flush immediately)."""
+        self.accepting = False
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for key in list(self.pending):
+            self._flush(key, self.pending.pop(key).items)
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "open_batches": len(self.pending),
+            "batches": self.batches,
+            "messages": self.messages,
+            "runs_saved": self.messages - self.batches,
+            "batch_size_max": self.batch_size_max,
+        }
@@ -0,0 +1,110 @@
+"""
+Read/append API for the conversation_message log (typed rows, partitioned by month).
+Pages are newest first and keyset-paginated on (created_at, id): pass the returned cursor to get older rows.
+There is no default partition: run_partition_maintenance() keeps monthly partitions created ahead of time.
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+CONVERSATION_PARTITION_MONTHS_AHEAD = int(os.environ.get("CONVERSATION_PARTITION_MONTHS_AHEAD", 3))
+CONVERSATION_PARTITION_INTERVAL = float(os.environ.get("CONVERSATION_PARTITION_INTERVAL", 6 * 3600))
+
+
+@dataclass(slots=True)
+class ConversationMessage:
+    id: str
+    conversation_id: str
+    role: str
+    text: str
+    created_at: str
+    message_id: str | None = None
+    sent_at: str | None = None
+
+
+def turn_rows(
+    user_conversation_id: str,
+    conversation_id: str,
+    user_text: str,
+    llm_response: str,
+    sent_at: str | None = None,
+    message_id: str | None = None,
+) -> list[dict]:
+    """The two conversation_message rows (user, then assistant) for one answered message."""
+    now = datetime.now(timezone.utc)
+    base = {
+        "user_conversation_id": user_conversation_id,
+        "conversation_id": conversation_id,
+        "message_id": message_id,
+    }
+    return [
+        {**base, "role": ROLE_USER, "text": user_text, "sent_at": sent_at, "created_at": now.isoformat()},
+        {
+            **base,
+            "role": ROLE_ASSISTANT,
+            "text": llm_response,
+            "created_at": (now + timedelta(microseconds=1)).isoformat(),
+        },
+    ]
+
+
+async def fetch_page(
+    store,
+    conversation_id: str,
+    limit: int = 20,
+    cursor: tuple[str, str] | None = None,
+) -> tuple[list[ConversationMessage], tuple[str, str] | None]:
+    """One page of a conversation, newest first. Returns (messages, cursor for the next page or None)."""
+    before_created_at, before_id = cursor or (None, None)
+    rows = await store.rpc(
+        "conversation_messages_page",
+        {
+            "p_conversation_id": conversation_id,
+            "p_limit": limit,
+            "p_before_created_at": before_created_at,
+            "p_before_id": before_id,
+        },
+    )
+    messages = [
+        ConversationMessage(
+            id=row["id"],
+            conversation_id=row["conversation_id"],
+            role=row["role"],
+            text=row["text"],
+            created_at=row["created_at"],
+            message_id=row.get("message_id"),
+            sent_at=row.get("sent_at"),
+        )
+        for row in rows
+    ]
+    next_cursor = (messages[-1].created_at, messages[-1].id) if len(messages) == limit else None
+    return messages, next_cursor
+
+
+async def last_messages(store, conversation_id: str, n: int) -> list[ConversationMessage]:
+    """Last n messages of a conversation in chronological order."""
+    messages, _ = await fetch_page(store, conversation_id, limit=n)
+    return list(reversed(messages))
+
+
+async def ensure_partitions(store, months_ahead: int = CONVERSATION_PARTITION_MONTHS_AHEAD) -> int:
+    """Create the current month's partition and months_ahead more (idempotent). Returns how many were created."""
+    rows = await store.rpc("ensure_conversation_message_partitions", {"p_months_ahead": months_ahead})
+    return int(rows[0]) if rows else 0
+
+
+async def run_partition_maintenance(get_store, interval: float = CONVERSATION_PARTITION_INTERVAL) -> None:
+    """Background loop: keep conversation_message partitions created ahead, every interval seconds (cancel to stop)."""
+    while True:
+        store = get_store()
+        if store is not None:
+            try:
+                created = await ensure_partitions(store)
+                if created:
+                    print(f"Created {created} conversation_message partitions")
+            except Exception as e:
+                print(f"conversation_message partition maintenance failed: {e}")
+        await asyncio.sleep(interval)
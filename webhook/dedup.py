@@ -0,0 +1,114 @@
+"""
+Two-tier dedup in front of the webhook_message_dedup table.
+- DedupCache: in-process TTL + LRU set of recently claimed message IDs (rejects Meta retries without a DB call).
+- Shared tier (optional): SET NX EX on Redis (REDIS_URL), so retries landing on another pod are caught.
+  REDIS_URL=memory:// selects MemorySharedCache, an in-process stand-in for local runs and tests.
+- The table stays the authority; purge_dedup_rows() keeps it (and its primary-key index) small.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+DEDUP_CACHE_SIZE = int(os.environ.get("DEDUP_CACHE_SIZE", 50_000))
+DEDUP_CACHE_TTL = float(os.environ.get("DEDUP_CACHE_TTL", 24 * 3600))
+DEDUP_RETENTION_HOURS = float(os.environ.get("DEDUP_RETENTION_HOURS", 72))
+DEDUP_PURGE_INTERVAL = float(os.environ.get("DEDUP_PURGE_INTERVAL", 3600))
+REDIS_URL = os.environ.get("REDIS_URL", "")
+
+
+class DedupCache:
+    """Bounded TTL/LRU set of message IDs with hit/miss counters."""
+
+    def __init__(self, max_size: int = DEDUP_CACHE_SIZE, ttl: float = DEDUP_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, float] = OrderedDict()  # message_id -> expires_at
+        self.hits = 0
+        self.misses = 0
+
+    def claim(self, message_id: str) -> bool:
+        """Return True the first time message_id is seen (within TTL), False for a repeat."""
+        now = time.monotonic()
+        expires_at = self.entries.get(message_id)
+        if expires_at is not None and expires_at > now:
+            self.entries.move_to_end(message_id)
+            self.hits += 1
+            return False
+        self.misses += 1
+        self.entries[message_id] = now + self.ttl
+        self.entries.move_to_end(message_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class MemorySharedCache:
+    """In-memory stand-in for the Redis SET NX EX used by the shared tier."""
+
+    def __init__(self):
+        self.keys: dict[str, float] = {}
+
+    async def set_nx(self, key: str, ttl: float) -> bool:
+        now = time.monotonic()
+        expires_at = self.keys.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+        self.keys[key] = now + ttl
+        return True
+
+    async def close(self) -> None:
+        return None
+
+
+class RedisSharedCache:
+    """Shared tier on Redis (requires the optional `redis` package)."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+
+    async def set_nx(self, key: str, ttl: float) -> bool:
+        return bool(await self.client.set(key, 1, nx=True, ex=max(1, int(ttl))))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def open_shared_cache(url: str = REDIS_URL) -> RedisSharedCache | MemorySharedCache | None:
+    """Shared tier from REDIS_URL ("memory://" for MemorySharedCache), or None (in-process tier + table only)."""
+    if not url:
+        return None
+    if url == "memory://":
+        return MemorySharedCache()
+    try:
+        return RedisSharedCache(url)
+    except Exception as e:
+        print(f"Shared dedup cache init failed: {e}")
+        return None
+
+
+async def purge_dedup_rows(store, retention_hours: float = DEDUP_RETENTION_HOURS) -> int:
+    """Delete webhook_message_dedup rows older than the retention window. Returns rows deleted."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=retention_hours)).isoformat()
+    deleted = await store.delete_before("webhook_message_dedup", "received_at", cutoff)
+    return len(deleted)
+
+
+async def run_dedup_purge(get_store, interval: float = DEDUP_PURGE_INTERVAL) -> None:
+    """Background loop: purge old dedup rows every interval seconds (cancel to stop)."""
+    while True:
+        store = get_store()
+        if store is not None:
+            try:
+                deleted = await purge_dedup_rows(store)
+                if deleted:
+                    print(f"Purged {deleted} webhook_message_dedup rows")
+            except Exception as e:
+                print(f"Dedup purge failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,86 @@
+"""
+Expense ledger: rows in `expenses` (indexed by user_id, expense_date) and monthly summaries read from
+`expense_monthly_rollup`, which triggers keep current per user/month/purpose (see supabase/migrations).
+Extracted expenses go through normalize_expenses() first, so one bad item cannot fail a whole insert or batch flush.
+"""
+import math
+from datetime import date
+
+from llm.agents.classify_expense_agent import format_amount
+
+# expenses.amount is numeric(12, 2) with check (amount > 0).
+MAX_EXPENSE_AMOUNT = 9_999_999_999.99
+# Unique key of an expense row: its message and position in that message's expenses (idempotent inserts).
+EXPENSE_CONFLICT_KEY = "message_id,item_index"
+
+
+def normalize_expense(expense: dict) -> dict | None:
+    """{amount, date, purpose} as the expenses table stores it, or None if the item cannot be stored."""
+    try:
+        amount = round(float(expense["amount"]), 2)
+        expense_date = date.fromisoformat(str(expense["date"]).strip()).isoformat()
+        purpose = " ".join(str(expense["purpose"]).split()).lower()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not math.isfinite(amount) or not 0 < amount <= MAX_EXPENSE_AMOUNT or not purpose:
+        return None
+    return {"amount": amount, "date": expense_date, "purpose": purpose}
+
+
+def normalize_expenses(expenses: list[dict]) -> list[dict]:
+    """Normalized expenses; items with a non-positive amount, an invalid date or no purpose are dropped."""
+    valid = []
+    for expense in expenses:
+        normalized = normalize_expense(expense)
+        if normalized is None:
+            print(f"Dropping invalid expense: {expense}")
+            continue
+        valid.append(normalized)
+    return valid
+
+
+def expense_rows(user_id: str, message_id: str, expenses: list[dict]) -> list[dict]:
+    """expenses rows; item_index is the item's own (write-behind payloads) or its position in expenses."""
+    return [
+        {
+            "user_id": user_id,
+            "message_id": message_id,
+            "item_index": e.get("item_index", i),
+            "amount": e["amount"],
+            "expense_date": e["date"],
+            "purpose": e["purpose"].lower(),
+        }
+        for i, e in enumerate(expenses)
+    ]
+
+
+async def record_expenses(store, user_id: str, message_id: str, expenses: list[dict]) -> None:
+    """
+    Insert extracted expenses for one message in a single multi-row insert. Idempotent: items already recorded
+    for the message (same item_index) are skipped, so a retry cannot count them twice.
+    """
+    if not expenses or not user_id:
+        return
+    await store.insert("expenses", expense_rows(user_id, message_id, expenses), on_conflict=EXPENSE_CONFLICT_KEY)
+
+
+async def monthly_summary(store, user_id: str, month: date, purpose: str | None = None) -> list[dict]:
+    """Rollup rows (purpose, total, entries) for one user and month, optionally one purpose."""
+    filters = {"user_id": user_id, "month": month.isoformat()}
+    if purpose:
+        filters["purpose"] = purpose.lower()
+    rows = await store.select("expense_monthly_rollup", "purpose,total,entries", filters)
+    return [row for row in rows if row.get("entries")]
+
+
+def format_summary(rows: list[dict], month: date, purpose: str | None = None) -> str:
+    label = month.strftime("%B %Y")
+    scope = f" on *{purpose}*" if purpose else ""
+    if not rows:
+        return f"No expenses recorded{scope} for {label} yet."
+    total = sum(float(row["total"]) for row in rows)
+    lines = [f"You spent *{format_amount(total)}*{scope} in {label}."]
+    if not purpose and len(rows) > 1:
+        for row in sorted(rows, key=lambda r: float(r["total"]), reverse=True):
+            lines.append(f"• {row['purpose']}: *{format_amount(float(row['total']))}*")
+    return "\n".join(lines)
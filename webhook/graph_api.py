@@ -0,0 +1,157 @@
+"""
+Shared WhatsApp Graph API client.
+One pooled httpx.AsyncClient (HTTP/2, keep-alive) lives for the app lifetime; open/close from the FastAPI lifespan.
+POSTs are retried with jittered exponential backoff on 429 / 503 and on connect errors (the request was not
+processed). 500 / 502 / 504 and timeouts after the request went out are retried only for idempotent calls (read
+receipts): a text send may already have been delivered, and repeating it would message the user twice.
+retries=0 leaves retrying to the caller (e.g. webhook.outbox) and returns the Graph error body as is.
+When there is no Graph error body, post() returns {"error": {"type": ERROR_NOT_SENT | ERROR_OUTCOME_UNKNOWN, ...}}:
+NOT_SENT when the request never reached Graph (connect-phase failure, or a 429 / 503 rejection), OUTCOME_UNKNOWN
+when it may have been processed (timeout or connection lost after sending, 500 / 502 / 504, unreadable body).
+"""
+import asyncio
+import os
+import random
+
+import httpx
+
+GRAPH_API_BASE = os.environ.get("GRAPH_API_BASE", "https://graph.facebook.com/v22.0")
+GRAPH_HTTP2 = os.environ.get("GRAPH_HTTP2", "1") == "1"
+GRAPH_MAX_CONNECTIONS = int(os.environ.get("GRAPH_MAX_CONNECTIONS", 100))
+GRAPH_MAX_KEEPALIVE = int(os.environ.get("GRAPH_MAX_KEEPALIVE", 20))
+GRAPH_KEEPALIVE_EXPIRY = float(os.environ.get("GRAPH_KEEPALIVE_EXPIRY", 30))
+GRAPH_TIMEOUT = float(os.environ.get("GRAPH_TIMEOUT", 10))
+GRAPH_CONNECT_TIMEOUT = float(os.environ.get("GRAPH_CONNECT_TIMEOUT", 5))
+GRAPH_MAX_RETRIES = int(os.environ.get("GRAPH_MAX_RETRIES", 3))
+GRAPH_BACKOFF_BASE = float(os.environ.get("GRAPH_BACKOFF_BASE", 0.25))
+GRAPH_BACKOFF_MAX = float(os.environ.get("GRAPH_BACKOFF_MAX", 4))
+
+RETRY_STATUS = {429, 503}  # request was rejected, not processed
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)  # nothing was sent
+ERROR_NOT_SENT = "not_sent"
+ERROR_OUTCOME_UNKNOWN = "outcome_unknown"
+# Graph error codes that do not say whether the message went out (unknown / temporary / generic failures).
+UNKNOWN_OUTCOME_CODES = {1, 2, 131000, 131016}
+IDEMPOTENT_RETRY_STATUS = RETRY_STATUS | {500, 502, 504}  # outcome unknown: retry only if repeating is harmless
+
+
+def local_error(kind: str, message: str) -> dict:
+    """Error body for a failure Graph did not describe itself (kind: ERROR_NOT_SENT / ERROR_OUTCOME_UNKNOWN)."""
+    return {"error": {"type": kind, "message": message}}
+
+
+def may_have_been_sent(data: dict) -> bool:
+    """For a text send's response: accepted, or failed with an unknown outcome (sending again could duplicate it)."""
+    if data.get("messages") is not None:
+        return True
+    error = data.get("error") or {}
+    return not error or error.get("type") == ERROR_OUTCOME_UNKNOWN or error.get("code") in UNKNOWN_OUTCOME_CODES
+
+
+class GraphClient:
+    """Pooled Graph API client. post() returns the parsed JSON body, or a local error body (see module docstring)."""
+
+    def __init__(
+        self,
+        access_token: str,
+        base_url: str = GRAPH_API_BASE,
+        http2: bool = GRAPH_HTTP2,
+        max_connections: int = GRAPH_MAX_CONNECTIONS,
+        max_keepalive: int = GRAPH_MAX_KEEPALIVE,
+        keepalive_expiry: float = GRAPH_KEEPALIVE_EXPIRY,
+        timeout: float = GRAPH_TIMEOUT,
+        connect_timeout: float = GRAPH_CONNECT_TIMEOUT,
+        max_retries: int = GRAPH_MAX_RETRIES,
+        backoff_base: float = GRAPH_BACKOFF_BASE,
+        backoff_max: float = GRAPH_BACKOFF_MAX,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+            },
+            transport=transport,
+        )
+
+    def backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        """Full-jitter exponential backoff; honours a numeric Retry-After header."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def post(self, path: str, payload: dict, retries: int | None = None, idempotent: bool = False) -> dict:
+        max_retries = self.max_retries if retries is None else retries
+        retry_status = IDEMPOTENT_RETRY_STATUS if idempotent else RETRY_STATUS
+        for attempt in range(max_retries + 1):
+            try:
+                r = await self.client.post(path, json=payload)
+            except httpx.TransportError as e:
+                not_sent = isinstance(e, CONNECT_ERRORS)
+                if not (idempotent or not_sent) or attempt >= max_retries:
+                    return local_error(ERROR_NOT_SENT if not_sent else ERROR_OUTCOME_UNKNOWN, repr(e))
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            if r.status_code in retry_status and attempt < max_retries:
+                await asyncio.sleep(self.backoff(attempt, r.headers.get("retry-after")))
+                continue
+            try:
+                data = r.json() if r.content else {}
+            except ValueError:
+                data = {}
+            if r.is_error and not (isinstance(data, dict) and data.get("error")):
+                kind = ERROR_NOT_SENT if r.status_code in RETRY_STATUS else ERROR_OUTCOME_UNKNOWN
+                return local_error(kind, f"HTTP {r.status_code}")
+            return data if isinstance(data, dict) else {}
+        return {}
+
+    async def send_messages(self, phone_number_id: str, payload: dict, retries: int | None = None) -> dict:
+        """POST /{phone_number_id}/messages (read receipts, typing indicators and text sends)."""
+        idempotent = payload.get("status") == "read"  # marking a message read twice is harmless
+        return await self.post(f"/{phone_number_id}/messages", payload, retries, idempotent=idempotent)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_client: GraphClient | None = None
+
+
+def get_graph_client() -> GraphClient | None:
+    """Return the app-wide Graph client, or None before startup / without an access token."""
+    return _client
+
+
+def set_graph_client(client: GraphClient | None) -> None:
+    """Inject a Graph client (e.g. one pointed at a local stub server)."""
+    global _client
+    _client = client
+
+
+def open_graph_client(access_token: str, **kwargs) -> GraphClient | None:
+    """Create the shared client once at startup; keeps an already injected client."""
+    global _client
+    if _client is None and access_token:
+        _client = GraphClient(access_token, **kwargs)
+    return _client
+
+
+async def close_graph_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = None
@@ -0,0 +1,129 @@
+"""
+Bounded in-process job queue for background message processing.
+- A fixed pool of worker tasks pulls jobs, so at most `workers` agent runs happen at once.
+- Jobs submitted with a key run one at a time, in submit order, per key (e.g. one WhatsApp conversation);
+  different keys run in parallel. Waiting keyed jobs are parked and do not hold a worker.
+- submit() never blocks the webhook: it returns False when the queue is full (caller answers 503 so Meta retries).
+  force=True skips the depth check for fan-out of work that was already accepted (one payload job -> its messages).
+- stop() stops intake and drains queued jobs before cancelling workers.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 8))
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("JOB_QUEUE_MAX_DEPTH", 500))
+JOB_DRAIN_TIMEOUT = float(os.environ.get("JOB_DRAIN_TIMEOUT", 25))
+
+
+class JobQueue:
+    """Fixed worker pool over an asyncio.Queue with a max depth and per-key ordering; stats() reports sizing metrics."""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_depth: int = JOB_QUEUE_MAX_DEPTH):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.queue: asyncio.Queue | None = None
+        self.depth = 0  # queued + parked jobs (excludes in flight)
+        self.active_keys: set = set()  # keys with a job queued or running
+        self.parked: dict[object, deque] = {}  # key -> jobs waiting for the key's current job
+        self.tasks: list[asyncio.Task] = []
+        self.accepting = False
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def start(self) -> None:
+        if self.tasks:
+            return
+        self.queue = asyncio.Queue()
+        self.accepting = True
+        self.tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    def has_capacity(self, count: int = 1) -> bool:
+        return self.accepting and self.queue is not None and self.depth + count <= self.max_depth
+
+    def submit(self, fn, *args, key=None, force: bool = False) -> bool:
+        """
+        Enqueue fn(*args) without waiting. Returns False (and counts it as shed) when full or stopping.
+        With a key, the job starts only after earlier jobs with the same key have finished.
+        With force, the job is accepted past max_depth and during the stop() drain (workers must be running).
+        """
+        forced = force and self.queue is not None and bool(self.tasks)
+        if not forced and not self.has_capacity():
+            self.shed += 1
+            print(f"Job queue full (depth={self.depth}/{self.max_depth}); shedding job")
+            return False
+        job = (time.monotonic(), key, fn, args)
+        self.depth += 1
+        self.submitted += 1
+        if key is not None and key in self.active_keys:
+            self.parked.setdefault(key, deque()).append(job)
+        else:
+            if key is not None:
+                self.active_keys.add(key)
+            self.queue.put_nowait(job)
+        return True
+
+    def _release(self, key) -> None:
+        """Hand the key to its next parked job, or free it."""
+        waiting = self.parked.get(key)
+        if waiting:
+            self.queue.put_nowait(waiting.popleft())
+            if not waiting:
+                del self.parked[key]
+        else:
+            self.active_keys.discard(key)
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, key, fn, args = await self.queue.get()
+            self.depth -= 1
+            waited = time.monotonic() - enqueued_at
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self.in_flight += 1
+            try:
+                await fn(*args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Background job failed: {e}")
+            finally:
+                self.in_flight -= 1
+                if key is not None:
+                    self._release(key)
+                self.queue.task_done()
+
+    async def stop(self, timeout: float = JOB_DRAIN_TIMEOUT) -> None:
+        """Stop intake, wait up to timeout for queued and in-flight jobs, then cancel workers."""
+        self.accepting = False
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Job queue drain timed out with {self.depth} queued, {self.in_flight} in flight")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def stats(self) -> dict:
+        started = self.completed + self.failed + self.in_flight
+        return {
+            "workers": self.workers,
+            "max_depth": self.max_depth,
+            "depth": self.depth,
+            "active_keys": len(self.active_keys),
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "wait_seconds_avg": round(self.wait_seconds_total / started, 4) if started else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
@@ -0,0 +1,214 @@
+"""
+Hot-path telemetry: Prometheus-style counters/histograms rendered on /metrics, timing spans per stage,
+optional OpenTelemetry export (OTEL_EXPORTER_OTLP_ENDPOINT), and a sampled debug logger for raw payloads.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, is_dataclass
+
+from agents import RunHooks
+
+from llm.prompt import segment_tokens
+
+DEBUG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("DEBUG_PAYLOAD_SAMPLE_RATE", 0))
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("webhook")
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.values: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {count}")
+            lines.append(f'{self.name}_bucket{_format_labels(key, (("le", "+Inf"),))} {series[-1]}')
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Counter | Histogram] = {}
+        self.gauges: dict[str, tuple[str, object]] = {}  # name -> (help, callable returning value)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, read) -> None:
+        """Register a gauge computed at scrape time (e.g. queue depth)."""
+        self.gauges[name] = (help_text, read)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for name, (help_text, read) in self.gauges.items():
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+STAGE_SECONDS = registry.histogram("webhook_stage_seconds", "Duration of each hot-path stage.")
+STAGE_ERRORS = registry.counter("webhook_stage_errors_total", "Exceptions raised inside a stage.")
+LLM_CALL_SECONDS = registry.histogram("llm_call_seconds", "Duration of each LLM call, by agent.")
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens by agent and kind (input/output/cached).")
+PROMPT_TOKENS = registry.counter(
+    "llm_prompt_segment_tokens_total", "Estimated prompt tokens by agent and segment (instructions/tools/history/context/user)."
+)
+FIRST_MESSAGE_SECONDS = registry.histogram(
+    "reply_first_message_seconds",
+    "Time from the start of the agent stage to the first WhatsApp message of the reply, by route and streamed.",
+)
+MESSAGES = registry.counter("webhook_messages_total", "Processed messages by route.")
+COALESCED = registry.counter(
+    "webhook_coalesced_messages_total", "Messages answered by an earlier message's agent run (coalesced), by route."
+)
+
+
+def _otel_tracer():
+    """OpenTelemetry tracer exporting to OTEL_EXPORTER_OTLP_ENDPOINT, or None if unset / SDK not installed."""
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("OTEL_EXPORTER_OTLP_ENDPOINT set but opentelemetry-sdk / OTLP exporter are not installed")
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": "webhook-llm"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{OTEL_EXPORTER_OTLP_ENDPOINT}/v1/traces")))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("webhook-llm")
+
+
+tracer = _otel_tracer()
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    """Time a stage into webhook_stage_seconds (and an OTel span when export is enabled)."""
+    started = time.perf_counter()
+    otel = tracer.start_as_current_span(stage, attributes=attributes) if tracer is not None else None
+    if otel is not None:
+        otel.__enter__()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        if otel is not None:
+            otel.__exit__(None, None, None)
+
+
+class MetricsRunHooks(RunHooks):
+    """Agents SDK hooks: time every LLM call, count its tokens per prompt segment and as reported (incl. cached)."""
+
+    def __init__(self):
+        self.started: dict[tuple[int, int], float] = {}  # (run context, agent) -> start time
+        self.calls = 0
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self.calls += 1
+        self.started[(id(context), id(agent))] = time.perf_counter()
+        for segment, tokens in segment_tokens(agent, system_prompt, input_items).items():
+            PROMPT_TOKENS.inc(tokens, agent=agent.name, segment=segment)
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        started = self.started.pop((id(context), id(agent)), None)
+        if started is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, agent=agent.name)
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        LLM_TOKENS.inc(usage.input_tokens or 0, agent=agent.name, kind="input")
+        LLM_TOKENS.inc(usage.output_tokens or 0, agent=agent.name, kind="output")
+        cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+        LLM_TOKENS.inc(cached, agent=agent.name, kind="cached")
+        logger.info(
+            "LLM usage agent=%s input=%s cached=%s output=%s",
+            agent.name, usage.input_tokens, cached, usage.output_tokens,
+        )
+
+
+def debug_payload(label: str, payload) -> None:
+    """Log a payload (dict or dataclass) as JSON for a DEBUG_PAYLOAD_SAMPLE_RATE fraction of calls (serialization skipped otherwise)."""
+    if DEBUG_PAYLOAD_SAMPLE_RATE <= 0 or random.random() >= DEBUG_PAYLOAD_SAMPLE_RATE:
+        return
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if is_dataclass(payload):
+        payload = asdict(payload)
+    logger.debug("%s %s", label, json.dumps(payload, default=str))
@@ -0,0 +1,447 @@
+"""
+Outbound WhatsApp text sends: per-number rate limiting, weighted fair scheduling and a durable outbox.
+- Every reply is written to the whatsapp_outbox table (status "pending") before it is sent, leased to this process
+  (locked_by / locked_until, OUTBOX_LEASE_SECONDS). Every OUTBOX_SWEEP_INTERVAL seconds the claim_whatsapp_outbox RPC
+  renews this process's leases and claims pending rows whose lease expired (a crashed or stopped pod), with SKIP
+  LOCKED, so queued or retrying replies survive a restart and no two processes send the same row.
+- Status updates after a send (sent / retry / failed) go through record_status (the write-behind buffer in main.py)
+  when given, instead of one UPDATE per reply.
+- Each phone_number_id has a token bucket (OUTBOX_RATE sends/s, OUTBOX_BURST). A Graph throttling error empties the
+  number's bucket for the backoff time. Numbers share OUTBOX_CONCURRENCY send slots by weighted fair queueing
+  (OUTBOX_WEIGHTS="<phone_number_id>:<weight>,..."), so one busy number cannot starve the others.
+- A failed send is retried (jittered exponential backoff, up to OUTBOX_MAX_ATTEMPTS) only when it certainly did not
+  go out: a Graph throttling code or a request that never reached Graph (graph_api.ERROR_NOT_SENT). Any other
+  failure, including an unknown outcome (timeout after sending, 5xx, no response), fails the row at once: a text
+  send is not idempotent, and resending could message the user twice. on_sent(delivery) runs after a send succeeds
+  (e.g. to set msg_delivered_at).
+- Sent rows are purged after OUTBOX_RETENTION_HOURS.
+send() resolves once the reply is sent or has failed for good, or after OUTBOX_SEND_WAIT (the row keeps retrying).
+It returns False only when the reply certainly did not go out and will not: a caller may then answer again (e.g. a
+retried job). A row still pending at OUTBOX_SEND_WAIT, or a failure with an unknown outcome, returns True.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import socket
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from webhook.graph_api import ERROR_NOT_SENT, ERROR_OUTCOME_UNKNOWN, local_error, may_have_been_sent
+
+OUTBOX_ENABLED = os.environ.get("OUTBOX_ENABLED", "1") == "1"
+OUTBOX_RATE = float(os.environ.get("OUTBOX_RATE", 80))  # Cloud API default throughput per business number
+OUTBOX_BURST = float(os.environ.get("OUTBOX_BURST", OUTBOX_RATE / 4))  # small bursts stay inside per-second windows
+OUTBOX_CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", 32))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_BACKOFF_BASE = float(os.environ.get("OUTBOX_BACKOFF_BASE", 0.5))
+OUTBOX_BACKOFF_MAX = float(os.environ.get("OUTBOX_BACKOFF_MAX", 30))
+OUTBOX_SEND_WAIT = float(os.environ.get("OUTBOX_SEND_WAIT", 30))
+OUTBOX_LEASE_SECONDS = int(os.environ.get("OUTBOX_LEASE_SECONDS", 60))
+OUTBOX_SWEEP_INTERVAL = float(os.environ.get("OUTBOX_SWEEP_INTERVAL", 15))
+OUTBOX_SWEEP_BATCH = int(os.environ.get("OUTBOX_SWEEP_BATCH", 100))
+OUTBOX_DRAIN_TIMEOUT = float(os.environ.get("OUTBOX_DRAIN_TIMEOUT", 10))
+OUTBOX_RETENTION_HOURS = float(os.environ.get("OUTBOX_RETENTION_HOURS", 72))
+OUTBOX_PURGE_INTERVAL = float(os.environ.get("OUTBOX_PURGE_INTERVAL", 3600))
+OUTBOX_WEIGHTS = os.environ.get("OUTBOX_WEIGHTS", "")
+
+OUTBOX_TABLE = "whatsapp_outbox"
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# Graph error codes: throttling (app / account / number throughput / pair rate); the message was not sent.
+THROTTLE_CODES = {4, 80007, 130429, 131056}
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """"pnid_a:3,pnid_b:1" -> {"pnid_a": 3.0, "pnid_b": 1.0}; malformed entries are ignored."""
+    weights = {}
+    for part in spec.split(","):
+        number, _, weight = part.strip().rpartition(":")
+        try:
+            if number and float(weight) > 0:
+                weights[number] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+class TokenBucket:
+    """rate tokens/s up to burst; one token per send. penalize() pushes the balance below zero."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 when one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def penalize(self, seconds: float) -> None:
+        """No sends for about seconds (after a throttling error)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+@dataclass(slots=True)
+class OutboxItem:
+    phone_number_id: str
+    to: str
+    text: str
+    delivery: dict | None = None
+    row_id: str | None = None
+    attempts: int = 0
+    ready_at: float = 0.0
+    future: asyncio.Future | None = field(default=None, repr=False)
+
+
+class Outbox:
+    """
+    Per-number queues drained by one dispatcher task; get_graph() / get_store() return the current clients.
+    record_status(update) buffers a row's status update ({id, status, attempts, ...}); without it rows are updated
+    directly.
+    """
+
+    def __init__(
+        self,
+        get_graph,
+        get_store,
+        on_sent=None,
+        record_status=None,
+        rate: float = OUTBOX_RATE,
+        burst: float = OUTBOX_BURST,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        weights: dict[str, float] | None = None,
+        lease_seconds: int = OUTBOX_LEASE_SECONDS,
+        sweep_interval: float = OUTBOX_SWEEP_INTERVAL,
+        worker_id: str | None = None,
+    ):
+        self.get_graph = get_graph
+        self.get_store = get_store
+        self.on_sent = on_sent
+        self.record_status = record_status
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.weights = parse_weights(OUTBOX_WEIGHTS) if weights is None else weights
+        self.lease_seconds = lease_seconds
+        self.sweep_interval = sweep_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.held: set[str] = set()  # row ids queued, retrying or sending here (leased to worker_id)
+        self.queues: dict[str, deque[OutboxItem]] = {}
+        self.buckets: dict[str, TokenBucket] = {}
+        self.vtime: dict[str, float] = {}  # weighted fair queueing: virtual finish time per number
+        self.virtual_now = 0.0
+        self.delayed: list[tuple[float, int, OutboxItem]] = []  # retry heap: (ready_at, seq, item)
+        self.seq = itertools.count()
+        self.slots: asyncio.Semaphore | None = None
+        self.wakeup: asyncio.Event | None = None
+        self.task: asyncio.Task | None = None
+        self.purge_task: asyncio.Task | None = None
+        self.sweep_task: asyncio.Task | None = None
+        self.sending: set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.recovered = 0
+
+    async def start(self) -> None:
+        if self.task is not None:
+            return
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run(), name="outbox")
+        self.purge_task = asyncio.create_task(self._purge_sent(), name="outbox-purge")
+        self.sweep_task = asyncio.create_task(self._sweep_leases(), name="outbox-sweep")
+
+    async def sweep(self) -> int:
+        """Renew this worker's leases and queue pending rows whose lease expired; returns how many were claimed."""
+        store = self.get_store()
+        if store is None:
+            return 0
+        rows = await store.rpc("claim_whatsapp_outbox", {
+            "p_worker": self.worker_id,
+            "p_limit": OUTBOX_SWEEP_BATCH,
+            "p_lease_seconds": self.lease_seconds,
+        })
+        claimed = 0
+        for row in sorted(rows, key=lambda r: r.get("created_at") or ""):
+            if row["id"] in self.held:
+                continue
+            self.held.add(row["id"])
+            self._enqueue(OutboxItem(
+                phone_number_id=row["phone_number_id"],
+                to=row["recipient"],
+                text=row["body"],
+                delivery=row.get("delivery"),
+                row_id=row["id"],
+                attempts=row.get("attempts") or 0,
+            ))
+            claimed += 1
+        self.recovered += claimed
+        return claimed
+
+    async def _sweep_leases(self) -> None:
+        """Background loop: sweep() at start, then every sweep_interval seconds."""
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Outbox sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def _lease_until(self, extra: float = 0.0) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds + extra)).isoformat()
+
+    async def _purge_sent(self) -> None:
+        """Background loop: delete rows sent more than OUTBOX_RETENTION_HOURS ago (pending / failed rows are kept)."""
+        while True:
+            store = self.get_store()
+            if store is not None:
+                cutoff = (datetime.now(timezone.utc) - timedelta(hours=OUTBOX_RETENTION_HOURS)).isoformat()
+                try:
+                    deleted = await store.delete_before(OUTBOX_TABLE, "sent_at", cutoff)
+                    if deleted:
+                        print(f"Purged {len(deleted)} {OUTBOX_TABLE} rows")
+                except Exception as e:
+                    print(f"Outbox purge failed: {e}")
+            await asyncio.sleep(OUTBOX_PURGE_INTERVAL)
+
+    async def send(self, phone_number_id: str, to: str, text: str, delivery: dict | None = None) -> bool:
+        """Persist and queue one text message; True once Graph accepted it or while it may still go out (see above)."""
+        item = OutboxItem(phone_number_id, to, text, delivery, future=asyncio.get_running_loop().create_future())
+        store = self.get_store()
+        if store is not None:
+            try:
+                rows = await store.insert(OUTBOX_TABLE, {
+                    "phone_number_id": phone_number_id,
+                    "recipient": to,
+                    "body": text,
+                    "delivery": delivery,
+                    "status": STATUS_PENDING,
+                    "locked_by": self.worker_id,
+                    "locked_until": self._lease_until(),
+                })
+                item.row_id = rows[0]["id"] if rows else None
+                if item.row_id is not None:
+                    self.held.add(item.row_id)
+            except Exception as e:
+                print(f"Outbox insert failed (sending without durability): {e}")
+        self._enqueue(item)
+        try:
+            return await asyncio.wait_for(asyncio.shield(item.future), OUTBOX_SEND_WAIT)
+        except asyncio.TimeoutError:
+            # Still queued or retrying: a persisted row is sent by this process or, after a crash, by a sweep.
+            return item.row_id is not None
+
+    def _enqueue(self, item: OutboxItem, front: bool = False) -> None:
+        number = item.phone_number_id
+        queue = self.queues.get(number)
+        if queue is None:
+            queue = self.queues[number] = deque()
+        if not queue:
+            # A number that was idle starts at the current virtual time instead of catching up.
+            self.vtime[number] = max(self.vtime.get(number, 0.0), self.virtual_now)
+        if front:
+            queue.appendleft(item)
+        else:
+            queue.append(item)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def _bucket(self, number: str) -> TokenBucket:
+        bucket = self.buckets.get(number)
+        if bucket is None:
+            bucket = self.buckets[number] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _pick(self) -> tuple[str | None, float | None]:
+        """Number to send for next (lowest virtual time with a token), or (None, seconds until one could be)."""
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            self._enqueue(heapq.heappop(self.delayed)[2], front=True)
+        best, wait = None, None
+        for number, queue in self.queues.items():
+            if not queue:
+                continue
+            delay = self._bucket(number).wait_time()
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+            elif best is None or self.vtime[number] < self.vtime[best]:
+                best = number
+        if best is None and self.delayed:
+            retry_in = self.delayed[0][0] - now
+            wait = retry_in if wait is None else min(wait, retry_in)
+        return best, wait
+
+    async def _run(self) -> None:
+        while True:
+            await self.slots.acquire()
+            while True:
+                self.wakeup.clear()
+                number, wait = self._pick()
+                if number is not None:
+                    break
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            item = self.queues[number].popleft()
+            self._bucket(number).take()
+            self.virtual_now = self.vtime[number]
+            self.vtime[number] += 1 / self.weights.get(number, 1.0)
+            task = asyncio.create_task(self._send(item))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    def backoff(self, attempt: int) -> float:
+        """Equal-jitter exponential backoff."""
+        delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _send(self, item: OutboxItem) -> None:
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": item.to,
+            "type": "text",
+            "text": {"body": item.text},
+        }
+        try:
+            graph = self.get_graph()
+            if graph is None:
+                data = local_error(ERROR_NOT_SENT, "no Graph client")
+            else:
+                data = await graph.send_messages(item.phone_number_id, payload, retries=0)
+        except Exception as e:
+            data = local_error(ERROR_OUTCOME_UNKNOWN, repr(e))
+        finally:
+            self.slots.release()
+        try:
+            if data.get("messages") is not None:
+                await self._sent(item, data)
+            else:
+                await self._failed(item, data.get("error") or {})
+        except Exception as e:
+            print(f"Outbox bookkeeping failed: {e}")
+
+    async def _sent(self, item: OutboxItem, data: dict) -> None:
+        self.sent += 1
+        if item.future is not None and not item.future.done():
+            item.future.set_result(True)
+        if self.on_sent is not None and item.delivery:
+            await self.on_sent(item.delivery)
+        message = (data["messages"] or [{}])[0]
+        await self._update(item, {
+            "status": STATUS_SENT,
+            "attempts": item.attempts + 1,
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+            "wa_message_id": message.get("id"),
+            "locked_until": None,
+        })
+
+    async def _failed(self, item: OutboxItem, error: dict) -> None:
+        item.attempts += 1
+        code = error.get("code")
+        delay = self.backoff(item.attempts - 1)
+        if code in THROTTLE_CODES:
+            self.throttled += 1
+            self._bucket(item.phone_number_id).penalize(delay)
+        retryable = code in THROTTLE_CODES or error.get("type") == ERROR_NOT_SENT
+        if retryable and item.attempts < self.max_attempts:
+            # Certainly not sent: try again later, ahead of newer sends.
+            self.retries += 1
+            item.ready_at = time.monotonic() + delay
+            heapq.heappush(self.delayed, (item.ready_at, next(self.seq), item))
+            self.wakeup.set()
+            # The lease covers the backoff, so no sweep takes the row over while it waits here.
+            await self._update(item, {
+                "status": STATUS_PENDING,
+                "attempts": item.attempts,
+                "last_error": str(error)[:500],
+                "locked_until": self._lease_until(delay),
+            })
+            return
+        self.failed += 1
+        print(f"WhatsApp send to {item.to} failed after {item.attempts} attempts: {error}")
+        if item.future is not None and not item.future.done():
+            item.future.set_result(may_have_been_sent({"error": error}))
+        await self._update(item, {
+            "status": STATUS_FAILED,
+            "attempts": item.attempts,
+            "last_error": str(error)[:500],
+            "locked_until": None,
+        })
+
+    async def _update(self, item: OutboxItem, values: dict) -> None:
+        """Record the row's new status: buffered through record_status, else one UPDATE."""
+        if values["status"] != STATUS_PENDING:
+            self.held.discard(item.row_id)
+        store = self.get_store()
+        if store is None or item.row_id is None:
+            return
+        if self.record_status is not None:
+            self.record_status({"id": item.row_id, **values})
+            return
+        try:
+            await store.update(OUTBOX_TABLE, values, {"id": item.row_id})
+        except Exception as e:
+            print(f"Outbox update failed: {e}")
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self.queues.values()) + len(self.delayed)
+
+    async def stop(self, timeout: float = OUTBOX_DRAIN_TIMEOUT) -> None:
+        """
+        Send what is queued for up to timeout; anything left stays pending in the table, and another process's sweep
+        sends it once this worker's leases expire.
+        """
+        if self.task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self.depth or self.sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.depth:
+            print(f"Outbox stopped with {self.depth} sends pending")
+        self.task.cancel()
+        self.purge_task.cancel()
+        self.sweep_task.cancel()
+        await asyncio.gather(self.task, self.purge_task, self.sweep_task, *self.sending, return_exceptions=True)
+        self.task = None
+        self.purge_task = None
+        self.sweep_task = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(q) for q in self.queues.values()),
+            "retrying": len(self.delayed),
+            "in_flight": len(self.sending),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "held": len(self.held),
+            "recovered": self.recovered,
+        }
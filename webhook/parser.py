@@ -0,0 +1,111 @@
+"""
+WhatsApp webhook payload parser.
+Walks every entry and change (Meta batches several into one POST), matches each message to its
+contact by wa_id, and surfaces delivery `statuses`. Produces flat slotted records instead of nested dicts.
+"""
+from dataclasses import dataclass, field
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # optional: stdlib json is ~3x slower on large payloads
+    import json
+
+    loads = json.loads
+
+WHATSAPP_OBJECT = "whatsapp_business_account"
+
+
+@dataclass(slots=True)
+class InboundMessage:
+    """One user message with the business-number and contact fields it needs for processing."""
+
+    entity_id: str
+    phone_number_id: str
+    display_phone_number: str
+    sender: str  # wa_id of the user ("from" in the payload)
+    profile_name: str
+    id: str
+    timestamp: str
+    type: str
+    text: str
+
+
+@dataclass(slots=True)
+class StatusUpdate:
+    """Delivery / read status for a message we sent."""
+
+    entity_id: str
+    phone_number_id: str
+    id: str
+    status: str
+    recipient_id: str
+    timestamp: str
+    errors: list = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ParsedWebhook:
+    messages: list[InboundMessage] = field(default_factory=list)
+    statuses: list[StatusUpdate] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.messages or self.statuses)
+
+
+def parse_webhook_payload(data: dict) -> ParsedWebhook:
+    """Extract every message and status from a WhatsApp webhook body. Empty result for other objects."""
+    parsed = ParsedWebhook()
+    if not data or data.get("object") != WHATSAPP_OBJECT:
+        return parsed
+    for entry in data.get("entry") or []:
+        entity_id = entry.get("id") or ""
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            metadata = value.get("metadata") or {}
+            phone_number_id = metadata.get("phone_number_id") or ""
+            display_phone_number = metadata.get("display_phone_number") or ""
+            contacts = value.get("contacts") or []
+            names = {c.get("wa_id"): (c.get("profile") or {}).get("name") or "" for c in contacts}
+            # Single-contact payloads sometimes carry a wa_id formatted differently from "from".
+            fallback_name = (contacts[0].get("profile") or {}).get("name") or "" if len(contacts) == 1 else ""
+            for m in value.get("messages") or []:
+                sender = m.get("from") or ""
+                parsed.messages.append(
+                    InboundMessage(
+                        entity_id=entity_id,
+                        phone_number_id=phone_number_id,
+                        display_phone_number=display_phone_number,
+                        sender=sender,
+                        profile_name=names.get(sender, fallback_name),
+                        id=m.get("id") or "",
+                        timestamp=m.get("timestamp") or "",
+                        type=m.get("type") or "",
+                        text=(m.get("text") or {}).get("body", ""),
+                    )
+                )
+            for st in value.get("statuses") or []:
+                parsed.statuses.append(
+                    StatusUpdate(
+                        entity_id=entity_id,
+                        phone_number_id=phone_number_id,
+                        id=st.get("id") or "",
+                        status=st.get("status") or "",
+                        recipient_id=st.get("recipient_id") or "",
+                        timestamp=st.get("timestamp") or "",
+                        errors=st.get("errors") or [],
+                    )
+                )
+    return parsed
+
+
+def parse_webhook_bytes(raw: bytes) -> tuple[ParsedWebhook, dict]:
+    """Decode a raw POST body and parse it. Returns (parsed, decoded body); invalid JSON yields empty results."""
+    try:
+        data = loads(raw) if raw else {}
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    return parse_webhook_payload(data), data
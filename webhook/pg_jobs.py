@@ -0,0 +1,179 @@
+"""
+Postgres work queue (JOB_BACKEND=postgres): webhook pods only persist jobs; worker processes (worker.py) run them.
+- enqueue_messages(): one webhook_jobs row per message, keyed by WhatsApp message id (ON CONFLICT DO NOTHING), so the
+  table is also the dedup authority and webhook_message_dedup is not used in this mode.
+- claim_webhook_jobs locks the oldest unfinished job of each conversation with FOR UPDATE SKIP LOCKED and claims it
+  together with the conversation's other ready jobs: any number of workers on any number of nodes share the queue,
+  a conversation runs on one worker at a time and in order, and its queued messages are answered by one agent run.
+- A claim is leased for JOB_VISIBILITY_TIMEOUT seconds (must exceed the slowest turn); if the worker dies, the jobs
+  become claimable again. Failed batches retry with exponential backoff up to JOB_MAX_ATTEMPTS, then stay 'failed'.
+SQL functions: supabase/migrations/20260317100000_create_webhook_jobs.sql (MemoryStore implements them in Python).
+"""
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+
+from webhook.jobs import JOB_WORKERS
+from webhook.parser import InboundMessage
+
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "memory")  # "memory": in-process JobQueue, "postgres": webhook_jobs table
+JOB_VISIBILITY_TIMEOUT = int(os.environ.get("JOB_VISIBILITY_TIMEOUT", 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_BASE = float(os.environ.get("JOB_RETRY_BASE", 5))
+JOB_RETRY_MAX = float(os.environ.get("JOB_RETRY_MAX", 300))
+JOB_CLAIM_BATCH = int(os.environ.get("JOB_CLAIM_BATCH", 10))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 0.5))
+JOB_RETENTION_HOURS = float(os.environ.get("JOB_RETENTION_HOURS", 72))
+JOB_PURGE_INTERVAL = float(os.environ.get("JOB_PURGE_INTERVAL", 3600))
+
+JOBS_TABLE = "webhook_jobs"
+
+
+def conversation_job_key(msg: InboundMessage) -> str:
+    return f"{msg.phone_number_id}:{msg.sender}"
+
+
+async def enqueue_messages(store, messages: list[InboundMessage]) -> int:
+    """Persist one job per message (duplicates of known message ids are ignored). Returns jobs inserted."""
+    jobs = [
+        {"message_id": msg.id, "conversation_key": conversation_job_key(msg), "payload": asdict(msg)}
+        for msg in messages
+        if msg.id.strip()
+    ]
+    if not jobs:
+        return 0
+    rows = await store.rpc("enqueue_webhook_jobs", {"p_jobs": jobs})
+    return int(rows[0]) if rows else 0
+
+
+def retry_delay(attempts: int) -> float:
+    return min(JOB_RETRY_MAX, JOB_RETRY_BASE * (2 ** max(0, attempts - 1)))
+
+
+async def purge_finished_jobs(store, retention_hours: float = JOB_RETENTION_HOURS) -> int:
+    """Delete done / failed jobs finished before the retention window. Returns rows deleted."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=retention_hours)).isoformat()
+    return len(await store.delete_before(JOBS_TABLE, "finished_at", cutoff))
+
+
+class PostgresJobWorker:
+    """
+    Claim loop for one process: up to concurrency conversation batches in flight, each passed to
+    handler(messages) and then completed, or failed for a retry when handler raises.
+    """
+
+    def __init__(
+        self,
+        get_store,
+        handler,
+        worker_id: str | None = None,
+        concurrency: int = JOB_WORKERS,
+        claim_batch: int = JOB_CLAIM_BATCH,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        visibility_timeout: int = JOB_VISIBILITY_TIMEOUT,
+    ):
+        self.get_store = get_store
+        self.handler = handler
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.claim_batch = claim_batch
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.running: set[asyncio.Task] = set()
+        self.stopping = False
+        self.claims = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+
+    async def run(self) -> None:
+        """Claim and run jobs until stop(); waits for in-flight batches before returning."""
+        last_purge = 0.0
+        while not self.stopping:
+            store = self.get_store()
+            if store is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+                last_purge = time.monotonic()
+                try:
+                    purged = await purge_finished_jobs(store)
+                    if purged:
+                        print(f"Purged {purged} {JOBS_TABLE} rows")
+                except Exception as e:
+                    print(f"Job purge failed: {e}")
+            free = self.concurrency - len(self.running)
+            if free <= 0:
+                await asyncio.wait(set(self.running), return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                rows = await store.rpc("claim_webhook_jobs", {
+                    "p_worker": self.worker_id,
+                    "p_limit": min(free, self.claim_batch),
+                    "p_visibility_seconds": self.visibility_timeout,
+                })
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                rows = []
+            self.claims += 1
+            if not rows:
+                # Jittered so idle workers on many nodes do not poll in lockstep.
+                await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+                continue
+            batches: dict[str, list[dict]] = {}
+            for row in rows:
+                batches.setdefault(row["conversation_key"], []).append(row)
+            for batch in batches.values():
+                task = asyncio.create_task(self._run_batch(store, batch))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions=True)
+
+    async def _run_batch(self, store, rows: list[dict]) -> None:
+        rows.sort(key=lambda r: r.get("seq") or 0)
+        ids = [row["message_id"] for row in rows]
+        self.batches += 1
+        try:
+            await self.handler([InboundMessage(**row["payload"]) for row in rows])
+        except Exception as e:
+            self.failed += len(rows)
+            attempts = max(row.get("attempts") or 1 for row in rows)
+            print(f"Job batch {ids} failed (attempt {attempts}): {e}")
+            await self._finish(store, "fail_webhook_jobs", {
+                "p_worker": self.worker_id,
+                "p_message_ids": ids,
+                "p_error": str(e)[:500],
+                "p_retry_seconds": retry_delay(attempts),
+                "p_max_attempts": JOB_MAX_ATTEMPTS,
+            })
+            return
+        self.completed += len(rows)
+        await self._finish(store, "complete_webhook_jobs", {"p_worker": self.worker_id, "p_message_ids": ids})
+
+    @staticmethod
+    async def _finish(store, function: str, params: dict) -> None:
+        # If this fails the lease expires and the batch runs again: delivery is at least once.
+        try:
+            await store.rpc(function, params)
+        except Exception as e:
+            print(f"{function} failed: {e}")
+
+    def stop(self) -> None:
+        """Stop claiming; run() returns once in-flight batches finish."""
+        self.stopping = True
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "in_flight": len(self.running),
+            "claims": self.claims,
+            "batches": self.batches,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,33 @@
+"""
+X-Hub-Signature-256 verification for webhook POSTs.
+Meta signs the raw request body with the app secret (HMAC-SHA256, header "sha256=<hex>"); anything unsigned
+or mis-signed is rejected before it reaches the job queue. Without WHATSAPP_APP_SECRET every POST is rejected
+(fail closed) unless WEBHOOK_SIGNATURE_OPTIONAL=1 explicitly allows unsigned payloads (local runs, load tests).
+"""
+import hashlib
+import hmac
+import os
+
+WHATSAPP_APP_SECRET = os.environ.get("WHATSAPP_APP_SECRET", "")
+WEBHOOK_SIGNATURE_OPTIONAL = os.environ.get("WEBHOOK_SIGNATURE_OPTIONAL", "0") == "1"
+SIGNATURE_HEADER = "x-hub-signature-256"
+SIGNATURE_PREFIX = "sha256="
+
+
+def sign(body: bytes, secret: str) -> str:
+    """Header value Meta would send for body (also used by benchmarks to sign replayed payloads)."""
+    return SIGNATURE_PREFIX + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(
+    body: bytes,
+    header: str | None,
+    secret: str = WHATSAPP_APP_SECRET,
+    optional: bool = WEBHOOK_SIGNATURE_OPTIONAL,
+) -> bool:
+    """True when header is a valid signature of body; without a secret, only when signatures are optional."""
+    if not secret:
+        return optional
+    if not header or not header.startswith(SIGNATURE_PREFIX):
+        return False
+    return hmac.compare_digest(sign(body, secret), header)
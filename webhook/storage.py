@@ -0,0 +1,441 @@
+"""
+Async storage backend for webhook state.
+- SupabaseStore: async Supabase/PostgREST client, created once at app startup.
+  select / insert / update take equality filters; delete_before removes rows with column < cutoff;
+  rpc calls a Postgres function (see supabase/migrations).
+- MemoryStore: in-memory stand-in with the same table API (tests, benchmarks, local runs).
+main.py only talks to the store returned by get_store(); swap it with set_store().
+"""
+import asyncio
+import itertools
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from supabase import AsyncClient, acreate_client
+
+from webhook.conversation_log import turn_rows
+from webhook.expenses import EXPENSE_CONFLICT_KEY, expense_rows
+
+
+class StoreError(Exception):
+    """Raised by MemoryStore with PostgREST-like messages (e.g. duplicate key / 23505)."""
+
+
+class SupabaseStore:
+    """Thin async wrapper over the Supabase client."""
+
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+    @classmethod
+    async def connect(cls, url: str, key: str) -> "SupabaseStore":
+        return cls(await acreate_client(url, key))
+
+    async def select(self, table: str, columns: str = "*", filters: dict | None = None, limit: int | None = None) -> list[dict]:
+        query = self.client.table(table).select(columns)
+        for column, value in (filters or {}).items():
+            query = query.eq(column, value)
+        if limit:
+            query = query.limit(limit)
+        res = await query.execute()
+        return res.data or []
+
+    async def insert(self, table: str, row: dict | list[dict], on_conflict: str | None = None) -> list[dict]:
+        """on_conflict="col_a,col_b": skip rows that clash on that unique key (ON CONFLICT DO NOTHING)."""
+        if on_conflict:
+            res = await self.client.table(table).upsert(row, on_conflict=on_conflict, ignore_duplicates=True).execute()
+        else:
+            res = await self.client.table(table).insert(row).execute()
+        return res.data or []
+
+    async def update(self, table: str, values: dict, filters: dict) -> list[dict]:
+        query = self.client.table(table).update(values)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        res = await query.execute()
+        return res.data or []
+
+    async def delete_before(self, table: str, column: str, cutoff: str) -> list[dict]:
+        res = await self.client.table(table).delete().lt(column, cutoff).execute()
+        return res.data or []
+
+    async def rpc(self, function: str, params: dict) -> list[dict]:
+        res = await self.client.rpc(function, params).execute()
+        data = res.data
+        if data is None:
+            return []
+        return data if isinstance(data, list) else [data]
+
+    async def close(self) -> None:
+        await self.client.postgrest.aclose()
+
+
+# Columns that must be unique per table (mirrors primary keys / unique constraints in supabase/migrations).
+MEMORY_UNIQUE_KEYS = {
+    "user_conservation": [("id",), ("converstion_id",), ("entity_id", "phone_number_id", "phone_number")],
+    "conversation": [("id",)],
+    "conversation_message": [("created_at", "id")],
+    "expenses": [("id",), ("message_id", "item_index")],
+    "webhook_message_dedup": [("message_id",)],
+    "whatsapp_outbox": [("id",)],
+}
+
+EXPENSE_KEY = tuple(EXPENSE_CONFLICT_KEY.split(","))
+
+# Columns filled by column defaults in supabase/migrations (gen_random_uuid() ids, now() timestamps).
+MEMORY_UUID_DEFAULTS = {"user_conservation", "conversation", "conversation_message", "expenses", "whatsapp_outbox"}
+MEMORY_NOW_DEFAULTS = {
+    "conversation": "created_at",
+    "conversation_message": "created_at",
+    "expenses": "created_at",
+    "webhook_message_dedup": "received_at",
+    "whatsapp_outbox": "created_at",
+}
+
+
+class MemoryStore:
+    """
+    In-memory store with the SupabaseStore API.
+    latency (seconds) is awaited on every call to simulate a slow database.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: dict[str, list[dict]] = {}
+        self.calls = 0
+        # Postgres functions from supabase/migrations, implemented in Python.
+        self.functions = {
+            "upsert_user_conservation": self._upsert_user_conservation,
+            "record_conversation_batch": self._record_conversation_batch,
+            "conversation_messages_page": self._conversation_messages_page,
+            "ensure_conversation_message_partitions": self._ensure_conversation_message_partitions,
+            "enqueue_webhook_jobs": self._enqueue_webhook_jobs,
+            "claim_webhook_jobs": self._claim_webhook_jobs,
+            "complete_webhook_jobs": self._complete_webhook_jobs,
+            "fail_webhook_jobs": self._fail_webhook_jobs,
+            "claim_whatsapp_outbox": self._claim_whatsapp_outbox,
+        }
+        self.job_seq = itertools.count(1)
+        self.partitions: set[str] = set()  # conversation_message months ('YYYY_MM') with a partition
+
+    async def _roundtrip(self) -> None:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @staticmethod
+    def _matches(row: dict, filters: dict | None) -> bool:
+        return all(row.get(column) == value for column, value in (filters or {}).items())
+
+    async def select(self, table: str, columns: str = "*", filters: dict | None = None, limit: int | None = None) -> list[dict]:
+        await self._roundtrip()
+        rows = [row for row in self.tables.get(table, []) if self._matches(row, filters)]
+        if limit:
+            rows = rows[:limit]
+        if columns != "*":
+            keep = [c.strip() for c in columns.split(",")]
+            rows = [{c: row.get(c) for c in keep} for row in rows]
+        return [dict(row) for row in rows]
+
+    async def insert(self, table: str, row: dict | list[dict], on_conflict: str | None = None) -> list[dict]:
+        await self._roundtrip()
+        skip_on = tuple(c.strip() for c in on_conflict.split(",")) if on_conflict else None
+        inserted = [self._insert_row(table, r, skip_on) for r in (row if isinstance(row, list) else [row])]
+        return [r for r in inserted if r is not None]
+
+    def _insert_row(self, table: str, row: dict, skip_on: tuple | None = None) -> dict | None:
+        """Insert one row; a clash on the unique key skip_on returns None (ON CONFLICT DO NOTHING), others raise."""
+        rows = self.tables.setdefault(table, [])
+        new_row = dict(row)
+        if table in MEMORY_UUID_DEFAULTS:
+            new_row.setdefault("id", str(uuid.uuid4()))
+        if table in MEMORY_NOW_DEFAULTS:
+            new_row.setdefault(MEMORY_NOW_DEFAULTS[table], datetime.now(timezone.utc).isoformat())
+        for key in MEMORY_UNIQUE_KEYS.get(table, []):
+            value = tuple(new_row.get(c) for c in key)
+            if None in value:  # nulls are distinct
+                continue
+            if any(tuple(r.get(c) for c in key) == value for r in rows):
+                if key == skip_on:
+                    return None
+                raise StoreError(f"duplicate key value violates unique constraint on {table}{key} (23505)")
+        rows.append(new_row)
+        if table == "expenses":
+            self._expense_rollup_apply(new_row)
+        return dict(new_row)
+
+    def _expense_rollup_apply(self, expense: dict) -> None:
+        """expenses insert trigger: add the amount to its user/month/purpose rollup row."""
+        month = expense["expense_date"][:8] + "01"
+        key = {"user_id": expense["user_id"], "month": month, "purpose": expense["purpose"]}
+        rollups = self.tables.setdefault("expense_monthly_rollup", [])
+        row = next((r for r in rollups if self._matches(r, key)), None)
+        if row is None:
+            row = {**key, "total": 0.0, "entries": 0}
+            rollups.append(row)
+        row["total"] += float(expense["amount"])
+        row["entries"] += 1
+
+    async def update(self, table: str, values: dict, filters: dict) -> list[dict]:
+        await self._roundtrip()
+        updated = []
+        for row in self.tables.get(table, []):
+            if self._matches(row, filters):
+                row.update(values)
+                updated.append(dict(row))
+        return updated
+
+    async def delete_before(self, table: str, column: str, cutoff: str) -> list[dict]:
+        await self._roundtrip()
+        rows = self.tables.get(table, [])
+        deleted = [row for row in rows if row.get(column) is not None and row[column] < cutoff]
+        self.tables[table] = [row for row in rows if not (row.get(column) is not None and row[column] < cutoff)]
+        return deleted
+
+    async def rpc(self, function: str, params: dict) -> list[dict]:
+        await self._roundtrip()
+        if function not in self.functions:
+            raise StoreError(f"Could not find the function public.{function} (PGRST202)")
+        return self.functions[function](**params)
+
+    def _upsert_user_conservation(
+        self,
+        p_entity_id: str,
+        p_phone_number_id: str,
+        p_phone_number: str,
+        p_profile_name: str,
+        p_msg_initated_at: str,
+    ) -> list[dict]:
+        """INSERT ... ON CONFLICT (entity_id, phone_number_id, phone_number) DO UPDATE ... RETURNING."""
+        rows = self.tables.setdefault("user_conservation", [])
+        key = {"entity_id": p_entity_id, "phone_number_id": p_phone_number_id, "phone_number": p_phone_number}
+        row = next((r for r in rows if self._matches(r, key)), None)
+        if row is None:
+            row = {
+                **key,
+                "id": str(uuid.uuid4()),
+                "user_id": str(uuid.uuid4()),
+                "converstion_id": str(uuid.uuid4()),
+            }
+            rows.append(row)
+        row.update({"profile_name": p_profile_name, "msg_initated_at": p_msg_initated_at})
+        return [{"id": row["id"], "user_id": row["user_id"], "converstion_id": row["converstion_id"]}]
+
+    def _record_conversation_batch(
+        self,
+        p_turns: list[dict] | None = None,
+        p_deliveries: list[dict] | None = None,
+        p_expenses: list[dict] | None = None,
+        p_outbox: list[dict] | None = None,
+    ) -> list[dict]:
+        for t in p_turns or []:
+            user = self._upsert_user_conservation(
+                t["entity_id"], t["phone_number_id"], t["phone_number"], t["profile_name"], t["msg_initated_at"]
+            )[0]
+            rows = turn_rows(
+                user["id"],
+                user["converstion_id"],
+                t["user_msg"],
+                t["llm_response"],
+                sent_at=t["msg_initated_at"],
+                message_id=t.get("message_id"),
+            )
+            for row in rows:
+                self._insert_row("conversation_message", row)
+        for e in p_expenses or []:
+            key = {k: e[k] for k in ("entity_id", "phone_number_id", "phone_number")}
+            user = next((r for r in self.tables.get("user_conservation", []) if self._matches(r, key)), None)
+            if user is not None:
+                for row in expense_rows(user["user_id"], e.get("message_id"), [e]):
+                    self._insert_row("expenses", row, EXPENSE_KEY)
+        for d in p_deliveries or []:
+            key = {k: d[k] for k in ("entity_id", "phone_number_id", "phone_number")}
+            for row in self.tables.get("user_conservation", []):
+                if self._matches(row, key):
+                    row["msg_delivered_at"] = d["delivered_at"]
+        outbox = {row["id"]: row for row in self.tables.get("whatsapp_outbox", [])}
+        for o in p_outbox or []:  # in order; an update after sent / failed is ignored like in SQL
+            row = outbox.get(o["id"])
+            if row is None or row["status"] != "pending":
+                continue
+            row.update(
+                status=o["status"],
+                attempts=o["attempts"],
+                last_error=o.get("last_error") or row.get("last_error"),
+                sent_at=o.get("sent_at"),
+                wa_message_id=o.get("wa_message_id") or row.get("wa_message_id"),
+                locked_until=o.get("locked_until"),
+            )
+        return []
+
+    def _conversation_messages_page(
+        self,
+        p_conversation_id: str,
+        p_limit: int = 20,
+        p_before_created_at: str | None = None,
+        p_before_id: str | None = None,
+    ) -> list[dict]:
+        rows = [r for r in self.tables.get("conversation_message", []) if r["conversation_id"] == p_conversation_id]
+        if p_before_created_at is not None:
+            before = (p_before_created_at, p_before_id or "ffffffff-ffff-ffff-ffff-ffffffffffff")
+            rows = [r for r in rows if (r["created_at"], r["id"]) < before]
+        rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        return [dict(r) for r in rows[:p_limit]]
+
+    def _ensure_conversation_message_partitions(self, p_months_ahead: int = 3) -> list[int]:
+        """Record partitions for this month and p_months_ahead more; returns [partitions created]."""
+        month = datetime.now(timezone.utc).date().replace(day=1)
+        created = 0
+        for _ in range(p_months_ahead + 1):
+            name = month.strftime("%Y_%m")
+            if name not in self.partitions:
+                self.partitions.add(name)
+                created += 1
+            month = (month + timedelta(days=32)).replace(day=1)
+        return [created]
+
+    def _enqueue_webhook_jobs(self, p_jobs: list[dict]) -> list[int]:
+        """INSERT ... ON CONFLICT (message_id) DO NOTHING, in payload order; returns [rows inserted]."""
+        jobs = self.tables.setdefault("webhook_jobs", [])
+        known = {job["message_id"] for job in jobs}
+        now = datetime.now(timezone.utc).isoformat()
+        inserted = 0
+        for j in p_jobs:
+            if j["message_id"] in known:
+                continue
+            known.add(j["message_id"])
+            jobs.append({
+                "message_id": j["message_id"],
+                "seq": next(self.job_seq),
+                "conversation_key": j["conversation_key"],
+                "payload": j["payload"],
+                "status": "pending",
+                "attempts": 0,
+                "run_after": now,
+                "locked_by": None,
+                "locked_until": None,
+                "last_error": None,
+                "created_at": now,
+                "finished_at": None,
+            })
+            inserted += 1
+        return [inserted]
+
+    def _claim_webhook_jobs(self, p_worker: str, p_limit: int = 10, p_visibility_seconds: int = 300) -> list[dict]:
+        """Lease up to p_limit ready conversation heads with their conversations' other ready jobs."""
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
+
+        def ready(job: dict) -> bool:
+            if job["status"] == "pending":
+                return job["run_after"] <= now_iso
+            return job["status"] == "running" and job["locked_until"] < now_iso
+
+        jobs = sorted(self.tables.get("webhook_jobs", []), key=lambda j: j["seq"])
+        heads, seen = [], set()
+        for job in jobs:
+            if job["status"] not in ("pending", "running") or job["conversation_key"] in seen:
+                continue
+            seen.add(job["conversation_key"])  # oldest unfinished job of its conversation
+            if ready(job):
+                heads.append(job["conversation_key"])
+                if len(heads) >= p_limit:
+                    break
+        lease = (now + timedelta(seconds=p_visibility_seconds)).isoformat()
+        claimed = []
+        for job in jobs:
+            if job["conversation_key"] in heads and ready(job):
+                job.update(status="running", attempts=job["attempts"] + 1, locked_by=p_worker, locked_until=lease)
+                claimed.append(dict(job))
+        return claimed
+
+    def _complete_webhook_jobs(self, p_worker: str, p_message_ids: list[str]) -> list[dict]:
+        ids = set(p_message_ids)
+        now = datetime.now(timezone.utc).isoformat()
+        for job in self.tables.get("webhook_jobs", []):
+            if job["message_id"] in ids and job["locked_by"] == p_worker and job["status"] == "running":
+                job.update(status="done", finished_at=now, locked_until=None)
+        return []
+
+    def _fail_webhook_jobs(
+        self,
+        p_worker: str,
+        p_message_ids: list[str],
+        p_error: str,
+        p_retry_seconds: float,
+        p_max_attempts: int = 5,
+    ) -> list[dict]:
+        ids = set(p_message_ids)
+        now = datetime.now(timezone.utc)
+        for job in self.tables.get("webhook_jobs", []):
+            if job["message_id"] in ids and job["locked_by"] == p_worker and job["status"] == "running":
+                give_up = job["attempts"] >= p_max_attempts
+                job.update(
+                    status="failed" if give_up else "pending",
+                    finished_at=now.isoformat() if give_up else None,
+                    run_after=(now + timedelta(seconds=p_retry_seconds)).isoformat(),
+                    locked_until=None,
+                    last_error=p_error[:500],
+                )
+        return []
+
+    def _claim_whatsapp_outbox(self, p_worker: str, p_limit: int = 100, p_lease_seconds: int = 60) -> list[dict]:
+        """Renew p_worker's leases, then lease up to p_limit pending rows whose lease expired (oldest first)."""
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
+        lease = (now + timedelta(seconds=p_lease_seconds)).isoformat()
+        pending = [row for row in self.tables.get("whatsapp_outbox", []) if row["status"] == "pending"]
+        for row in pending:
+            if row.get("locked_by") == p_worker:
+                row["locked_until"] = lease
+        expired = [row for row in pending if row.get("locked_until") is None or row["locked_until"] < now_iso]
+        expired.sort(key=lambda r: (r.get("locked_until") is not None, r.get("locked_until") or "", r["created_at"]))
+        claimed = []
+        for row in expired[:p_limit]:
+            row.update(locked_by=p_worker, locked_until=lease)
+            claimed.append(dict(row))
+        return claimed
+
+    async def close(self) -> None:
+        return None
+
+
+_store: SupabaseStore | MemoryStore | None = None
+
+
+def get_store() -> SupabaseStore | MemoryStore | None:
+    """Return the app-wide store, or None when no database is configured."""
+    return _store
+
+
+def set_store(store: SupabaseStore | MemoryStore | None) -> None:
+    """Inject a store (e.g. MemoryStore in tests). Replaces the one opened at startup."""
+    global _store
+    _store = store
+
+
+async def open_store(url: str | None, key: str | None) -> SupabaseStore | MemoryStore | None:
+    """Create the Supabase store once at startup; keeps an already injected store."""
+    global _store
+    if _store is not None:
+        return _store
+    if not url or not key:
+        return None
+    try:
+        _store = await SupabaseStore.connect(url, key)
+    except Exception as e:
+        print(f"Supabase client init failed: {e}")
+        _store = None
+    return _store
+
+
+async def close_store() -> None:
+    """Close the store's HTTP connections at shutdown."""
+    global _store
+    if _store is None:
+        return
+    try:
+        await _store.close()
+    except Exception as e:
+        print(f"Supabase client close failed: {e}")
+    _store = None
@@ -0,0 +1,92 @@
+"""
+Chunked WhatsApp delivery for streamed agent replies.
+StreamingReply collects text deltas, refreshes the typing indicator on a timer while the run is in progress (also
+for structured-output agents, which stream no text), and sends the first complete paragraph (e.g. the
+acknowledgement sentence) before the rest of the reply is finished.
+Only plain-text agents (the router answering without a handoff) stream text. Expense replies come from the Classify
+Expense Agent's structured output (ClassifyExpenseBatchOutputFormat), and greetings from the Welcome Agent's, which are
+formatted only once the run ends: those routes get the typing refresh but no early segment, their first message is the
+whole reply (streamed_early stays False).
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+STREAMING_ENABLED = os.environ.get("STREAMING_ENABLED", "1") == "1"
+TYPING_REFRESH_SECONDS = float(os.environ.get("TYPING_REFRESH_SECONDS", 15))
+STREAM_MIN_SEGMENT_CHARS = int(os.environ.get("STREAM_MIN_SEGMENT_CHARS", 12))
+
+
+class StreamingReply:
+    """
+    send(text) -> bool posts a WhatsApp message; refresh_typing() -> bool re-sends the typing indicator.
+    Run the agent inside keep_typing(), call on_delta() per chunk, then finish(full_text) once the run completes.
+    """
+
+    def __init__(
+        self,
+        send,
+        refresh_typing,
+        refresh_interval: float = TYPING_REFRESH_SECONDS,
+        min_segment_chars: int = STREAM_MIN_SEGMENT_CHARS,
+    ):
+        self.send = send
+        self.refresh_typing = refresh_typing
+        self.refresh_interval = refresh_interval
+        self.min_segment_chars = min_segment_chars
+        self.buffer = ""
+        self.sent_prefix = ""  # text already delivered as the first segment
+        self.started_at = time.monotonic()
+        self.first_sent_at: float | None = None
+        self.ok = True
+
+    async def _refresh_typing_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_typing()
+            except Exception as e:
+                print(f"Typing indicator refresh failed: {e}")
+
+    @asynccontextmanager
+    async def keep_typing(self):
+        """Re-send the typing indicator every refresh_interval seconds until the block exits."""
+        task = asyncio.create_task(self._refresh_typing_loop())
+        try:
+            yield self
+        finally:
+            task.cancel()
+
+    async def on_delta(self, delta: str) -> None:
+        self.buffer += delta
+        if self.sent_prefix:
+            return
+        # First paragraph is complete once a newline follows enough text.
+        cut = self.buffer.find("\n")
+        if cut >= self.min_segment_chars and self.buffer[cut + 1:].strip():
+            segment = self.buffer[:cut].strip()
+            self.sent_prefix = self.buffer[: cut + 1]
+            self.ok = await self.send(segment) and self.ok
+            self.first_sent_at = time.monotonic()
+
+    async def finish(self, full_text: str) -> bool:
+        """Send whatever was not delivered early. Returns True if every send succeeded."""
+        if self.sent_prefix and full_text.startswith(self.sent_prefix):
+            rest = full_text[len(self.sent_prefix):].strip()
+        else:
+            rest = full_text.strip()
+        if rest:
+            self.ok = await self.send(rest) and self.ok
+            if self.first_sent_at is None:
+                self.first_sent_at = time.monotonic()
+        return self.ok
+
+    @property
+    def streamed_early(self) -> bool:
+        """True once a segment was sent before the run finished."""
+        return bool(self.sent_prefix)
+
+    @property
+    def time_to_first_message(self) -> float | None:
+        return None if self.first_sent_at is None else self.first_sent_at - self.started_at
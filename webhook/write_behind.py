@@ -0,0 +1,165 @@
+"""
+Write-behind buffer for per-message persistence.
+Operations are queued from the reply path and flushed in batches by a background task, whenever
+max_batch operations are waiting or max_delay seconds have passed. stop() always flushes what is left.
+A batch whose flush still fails after the retries goes through fallback_fn (the per-row write path); operations that
+fail there too are appended to the spill file (JSON lines) and replayed by the next start(), so nothing is dropped.
+Off by default: it needs record_conversation_batch from supabase/migrations (without it every batch takes the
+per-row fallback).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "0") == "1"
+WRITE_BEHIND_MAX_BATCH = int(os.environ.get("WRITE_BEHIND_MAX_BATCH", 50))
+WRITE_BEHIND_MAX_DELAY = float(os.environ.get("WRITE_BEHIND_MAX_DELAY", 0.5))
+WRITE_BEHIND_RETRIES = int(os.environ.get("WRITE_BEHIND_RETRIES", 3))
+WRITE_BEHIND_SPILL_PATH = os.environ.get("WRITE_BEHIND_SPILL_PATH", "write_behind_spill.jsonl")
+
+
+class WriteBehindBuffer:
+    """
+    Buffers (kind, payload) operations; flush_fn(batch) persists a list of them in one call.
+    fallback_fn(batch) -> list of the operations it could not write, used once flush_fn has failed retries + 1 times.
+    Flushes run one at a time, in order.
+    """
+
+    def __init__(
+        self,
+        flush_fn,
+        fallback_fn=None,
+        max_batch: int = WRITE_BEHIND_MAX_BATCH,
+        max_delay: float = WRITE_BEHIND_MAX_DELAY,
+        retries: int = WRITE_BEHIND_RETRIES,
+        spill_path: str = WRITE_BEHIND_SPILL_PATH,
+    ):
+        self.flush_fn = flush_fn
+        self.fallback_fn = fallback_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.spill_path = spill_path
+        self.buffer: list[tuple[str, dict]] = []
+        self.wakeup: asyncio.Event | None = None
+        self.task: asyncio.Task | None = None
+        self.stopping = False
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.failed_ops = 0
+        self.fallback_ops = 0
+        self.spilled_ops = 0
+        self.flush_size_max = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    def start(self) -> None:
+        """Replay operations spilled by an earlier process, then start the background flush task."""
+        self._load_spill()
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run(), name="write-behind")
+
+    def add(self, kind: str, payload: dict) -> None:
+        self.buffer.append((kind, payload))
+        if len(self.buffer) >= self.max_batch and self.wakeup is not None:
+            self.wakeup.set()
+
+    async def _run(self) -> None:
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            while self.buffer:
+                await self.flush()
+
+    async def flush(self) -> None:
+        """Persist up to max_batch buffered operations, retrying with backoff, then through the fallback."""
+        batch = self.buffer[: self.max_batch]
+        del self.buffer[: len(batch)]
+        if not batch:
+            return
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                await self.flush_fn(batch)
+                break
+            except Exception as e:
+                if attempt >= self.retries:
+                    self.failed_ops += len(batch)
+                    logger.warning("Write-behind flush of %d ops failed, writing them one by one: %s", len(batch), e)
+                    await self._fall_back(batch)
+                    return
+                await asyncio.sleep(0.1 * (2 ** attempt))
+        elapsed = time.monotonic() - started
+        self.flushes += 1
+        self.flushed_ops += len(batch)
+        self.flush_size_max = max(self.flush_size_max, len(batch))
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    async def _fall_back(self, batch: list[tuple[str, dict]]) -> None:
+        failed = batch
+        if self.fallback_fn is not None:
+            try:
+                failed = await self.fallback_fn(batch)
+            except Exception as e:
+                logger.warning("Write-behind fallback failed: %s", e)
+        self.fallback_ops += len(batch) - len(failed)
+        if failed:
+            self._spill(failed)
+
+    def _spill(self, ops: list[tuple[str, dict]]) -> None:
+        if not self.spill_path:
+            logger.error("Write-behind dropped %d ops (no WRITE_BEHIND_SPILL_PATH)", len(ops))
+            return
+        try:
+            with open(self.spill_path, "a") as f:
+                for kind, payload in ops:
+                    f.write(json.dumps([kind, payload], default=str) + "\n")
+        except OSError as e:
+            logger.error("Write-behind could not spill %d ops to %s: %s", len(ops), self.spill_path, e)
+            return
+        self.spilled_ops += len(ops)
+        logger.error("Write-behind spilled %d ops to %s; they are replayed on the next start", len(ops), self.spill_path)
+
+    def _load_spill(self) -> None:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path) as f:
+            ops = [tuple(json.loads(line)) for line in f if line.strip()]
+        os.remove(self.spill_path)
+        self.buffer[:0] = ops
+        if ops:
+            logger.info("Write-behind replaying %d spilled ops from %s", len(ops), self.spill_path)
+
+    async def stop(self) -> None:
+        """Wake the background task, let it flush everything still buffered, and wait for it to exit."""
+        self.stopping = True
+        if self.task is not None:
+            self.wakeup.set()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        while self.buffer:
+            await self.flush()
+        self.stopping = False
+
+    def stats(self) -> dict:
+        return {
+            "buffer_depth": len(self.buffer),
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "failed_ops": self.failed_ops,
+            "fallback_ops": self.fallback_ops,
+            "spilled_ops": self.spilled_ops,
+            "flush_size_avg": round(self.flushed_ops / self.flushes, 2) if self.flushes else 0.0,
+            "flush_size_max": self.flush_size_max,
+            "flush_seconds_avg": round(self.flush_seconds_total / self.flushes, 4) if self.flushes else 0.0,
+            "flush_seconds_max": round(self.flush_seconds_max, 4),
+        }
@@ -0,0 +1,64 @@
+"""
+Job worker for JOB_BACKEND=postgres: claims webhook_jobs rows (FOR UPDATE SKIP LOCKED) and answers them with the
+same pipeline as main.py (main.process_claimed_messages), so ACK pods and LLM worker pods scale separately.
+
+    python worker.py                  # one process, WORKER_CONCURRENCY conversations at a time
+    python worker.py --processes 4    # one worker process per core; run on as many nodes as needed
+
+Each process opens its own clients through main.lifespan and drains in-flight batches on SIGTERM / SIGINT.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", os.environ.get("JOB_WORKERS", 8)))
+
+
+async def run_worker(concurrency: int = WORKER_CONCURRENCY) -> None:
+    import main
+    from webhook.pg_jobs import PostgresJobWorker
+    from webhook.storage import get_store
+
+    async with main.lifespan(main.app):
+        if get_store() is None:
+            print("No Supabase store configured (SUPABASE_URL / SUPABASE_KEY); nothing to claim jobs from.")
+            return
+        worker = PostgresJobWorker(get_store, main.process_claimed_messages, concurrency=concurrency)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        print(f"Job worker {worker.worker_id} started (concurrency={concurrency})")
+        await worker.run()
+        print(f"Job worker {worker.worker_id} stopped: {worker.stats()}")
+
+
+def _process_main(concurrency: int) -> None:
+    asyncio.run(run_worker(concurrency))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to start on this node")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="conversations per process")
+    args = parser.parse_args(argv)
+    os.environ["JOB_BACKEND"] = "postgres"
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+        return
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(args.concurrency,), name=f"job-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    # SIGTERM reaches only this parent (e.g. PID 1 in a container): pass it on so every worker drains.
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes if p.is_alive()])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C already reaches the whole process group
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()